@@ -492,6 +492,24 @@ function bulkInsertProperties(properties) {
     return insertMany(properties);
 }
 
+/**
+ * Mark properties as checked (last_updated = now) without touching their data.
+ * Used for listings the update scraper found unchanged.
+ */
+function touchProperties(urls) {
+    const stmt = db.prepare("UPDATE properties SET last_updated = datetime('now') WHERE url = ? OR url = ?");
+    const touchMany = db.transaction((list) => {
+        let changes = 0;
+        for (const url of list) {
+            let cleanUrl = String(url).trim().split('?')[0];
+            if (cleanUrl.endsWith('/')) cleanUrl = cleanUrl.slice(0, -1);
+            changes += stmt.run(cleanUrl, cleanUrl + '/').changes;
+        }
+        return changes;
+    });
+    return touchMany(urls);
+}
+
 /**
  * Delete a property by URL
  */
@@ -858,6 +876,41 @@ function bulkUpsertClients(clients) {
     return upsertMany(clients);
 }
 
+/**
+ * Bulk insert of new clients only (scraper deliveries).
+ * Unlike bulkUpsertClients, a phone that already exists is skipped: the
+ * scraper only has placeholder values ('Pendiente', empty email) and must not
+ * overwrite the status, notes or data entered by hand in the CRM.
+ */
+function bulkInsertNewClients(clients) {
+    const insertMany = db.transaction((clientList) => {
+        let added = 0;
+        let skipped = 0;
+
+        for (const client of clientList) {
+            try {
+                if (!client.phone) continue;
+                client.phone = String(client.phone).replace(/[^0-9+]/g, '');
+                if (!client.phone) continue;
+                if (client.name && typeof client.name === 'string') client.name = client.name.trim();
+
+                if (getClientByPhone(client.phone)) {
+                    skipped++;
+                    continue;
+                }
+                insertClient(client);
+                added++;
+            } catch (err) {
+                console.error(`❌ Error insertando cliente (${client.name || 'sin nombre'} - ${client.phone || 'sin tlf'}):`, err.message);
+            }
+        }
+
+        return { added, skipped };
+    });
+
+    return insertMany(clients);
+}
+
 /**
  * Get clients count
  */
@@ -1240,6 +1293,7 @@ module.exports = {
     getPropertyByUrl,
     upsertProperty,
     bulkInsertProperties,
+    touchProperties,
     deleteProperty,
     getPropertiesCount,
     updatePropertyById,
@@ -1253,6 +1307,7 @@ module.exports = {
     updateClient,
     deleteClient,
     bulkUpsertClients,
+    bulkInsertNewClients,
     getClientsCount,
 
     // Messages
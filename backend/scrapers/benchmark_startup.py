@@ -0,0 +1,139 @@
+# coding: utf-8
+
+"""
+Mide el tiempo de arranque (importaciones) de los puntos de entrada de los
+scrapers con `python -X importtime`.
+
+Uso:
+    python benchmark_startup.py [--repeat N] [--max-ms MS] [--top N] [--only nombre]
+
+Cada punto de entrada se importa en un intérprete nuevo, `--repeat` veces
+(3 por defecto), y se toma el mínimo. Para cada uno se muestra el tiempo
+acumulado y las dependencias directas que más tardan en cargarse.
+
+Además comprueba que los módulos que solo hacen falta en el primer uso
+(bs4 y sus backends, webdriver_manager) no se cargan en el arranque. Sale con
+código 1 si alguno se carga antes de tiempo o si algún punto de entrada
+supera `--max-ms`.
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+fotocasa_dir = os.path.join(current_dir, 'fotocasa')
+idealista_dir = os.path.join(current_dir, 'idealista')
+
+# Módulos que se importan en el primer uso y no deben aparecer en el arranque
+LAZY_MODULES = ['bs4', 'html5lib', 'lxml', 'webdriver_manager']
+
+# Clases que setup_driver importa antes de la primera navegación (Linux/macOS)
+_CHROME_DRIVER_IMPORTS = (
+    "import selenium.webdriver.chrome.webdriver, "
+    "selenium.webdriver.chrome.options, selenium.webdriver.chrome.service"
+)
+
+# (nombre, código a importar, módulos que no deben cargarse)
+ENTRY_POINTS = [
+    ('fotocasa', f"import Fotocasa_scraping_selenium; {_CHROME_DRIVER_IMPORTS}", LAZY_MODULES),
+    ('update_scraper', "import update_scraper", LAZY_MODULES + ['run_idealista_single']),
+    ('idealista_single', "import run_idealista_single", LAZY_MODULES),
+    ('idealista_scraper', "import run_idealista_scraper", LAZY_MODULES),
+    ('scraper_daemon', "import scraper_daemon", LAZY_MODULES),
+]
+
+
+def measure(code):
+    """Importa `code` en un intérprete nuevo. Retorna {módulo: (propio_us, acumulado_us, nivel)}."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([current_dir, fotocasa_dir, idealista_dir, env.get('PYTHONPATH', '')])
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, env=env, cwd=current_dir
+    )
+    if result.returncode != 0:
+        tail = result.stderr.strip().splitlines()[-1:] or ['?']
+        raise RuntimeError(f"Error importando ({tail[0]})")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            level = (len(name) - len(name.lstrip())) // 2
+            modules[name.strip()] = (int(self_us), int(cumulative_us), level)
+        except ValueError:
+            continue
+    return modules
+
+
+def total_ms(modules):
+    """Suma del tiempo acumulado de los módulos de primer nivel."""
+    base_level = min((level for _, _, level in modules.values()), default=0)
+    return sum(cum for _, cum, level in modules.values() if level == base_level) / 1000
+
+
+def heaviest_dependencies(modules, top):
+    """Módulos importados directamente por los de primer nivel, ordenados por tiempo acumulado."""
+    base_level = min((level for _, _, level in modules.values()), default=0)
+    return sorted(
+        ((cum, name) for name, (_, cum, level) in modules.items() if level == base_level + 1),
+        reverse=True
+    )[:top]
+
+
+def eager_modules(modules, forbidden):
+    return [name for name in forbidden if name in modules]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque de los scrapers")
+    parser.add_argument('--repeat', type=int, default=3, help="Mediciones por punto de entrada (se toma la mínima)")
+    parser.add_argument('--max-ms', type=float, default=None, help="Presupuesto máximo de arranque en milisegundos")
+    parser.add_argument('--top', type=int, default=5, help="Módulos más lentos a mostrar")
+    parser.add_argument('--only', action='append', help="Medir solo estos puntos de entrada")
+    args = parser.parse_args()
+
+    failures = 0
+    for name, code, forbidden in ENTRY_POINTS:
+        if args.only and name not in args.only:
+            continue
+
+        best = None
+        try:
+            for _ in range(max(1, args.repeat)):
+                modules = measure(code)
+                if best is None or total_ms(modules) < total_ms(best):
+                    best = modules
+        except RuntimeError as e:
+            print(f"❌ {name}: {e}")
+            failures += 1
+            continue
+
+        elapsed = total_ms(best)
+        top = heaviest_dependencies(best, args.top)
+
+        print(f"\n⏱️ {name}: {elapsed:.0f} ms ({len(best)} módulos)")
+        for cum, mod in top:
+            print(f"   {cum / 1000:8.1f} ms  {mod}")
+
+        eager = eager_modules(best, forbidden)
+        if eager:
+            print(f"   ❌ Cargados en el arranque: {', '.join(eager)}")
+            failures += 1
+        if args.max_ms is not None and elapsed > args.max_ms:
+            print(f"   ❌ Supera el presupuesto de {args.max_ms:.0f} ms")
+            failures += 1
+
+    if failures:
+        print(f"\n❌ {failures} comprobaciones fallidas")
+        sys.exit(1)
+    print("\n✅ Arranque dentro de lo esperado")
+
+
+if __name__ == "__main__":
+    main()
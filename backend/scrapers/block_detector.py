@@ -0,0 +1,302 @@
+# coding: utf-8
+
+"""
+Detección de bloqueos y captchas con backoff por dominio y circuit breaker.
+
+Cuando Fotocasa o Idealista sirven una página de desafío (DataDome,
+Cloudflare), un 403/429 o un listado vacío con estructura anómala, los
+scrapers seguían adelante: cada página restante costaba un navegador y sus
+esperas sin obtener nada. Ahora, tras cargar cada página:
+
+- detect_block() la clasifica con una sola llamada al navegador: estado HTTP
+  del documento (log de DevTools vía network_stats si está activo, Navigation
+  Timing si no), marcadores de desafío en el título y en páginas pequeñas, y
+  la ausencia del selector esperado sin mensaje de "sin resultados"
+- BlockGuard.report_block() aplica un backoff exponencial al dominio a través
+  del limitador compartido (rate_limit), así que afecta a todos los procesos,
+  y registra el evento en data/logs/block_events.ndjson
+- tras SCRAPER_BLOCK_TRIP detecciones seguidas se abre el circuit breaker del
+  dominio: BlockGuard.check() lanza SourceBlocked y los trabajos de esa fuente
+  se detienen (conservando su checkpoint) sin abrir más navegadores hasta que
+  pasa el enfriamiento. El primer trabajo tras el enfriamiento hace de prueba:
+  si vuelve a detectar un bloqueo el breaker se reabre con el doble de tiempo
+
+El estado del breaker se guarda en data/cache/block_state/<dominio>.json.
+
+Configuración:
+- SCRAPER_BLOCK_DETECTION: 1/0 (activa por defecto)
+- SCRAPER_BLOCK_BACKOFF_BASE: primer backoff en segundos (30), se duplica en cada detección
+- SCRAPER_BLOCK_BACKOFF_MAX: backoff máximo en segundos (900)
+- SCRAPER_BLOCK_TRIP: detecciones seguidas que abren el breaker (3)
+- SCRAPER_BLOCK_COOLDOWN_MINUTES: enfriamiento del breaker (30), se duplica en cada reapertura hasta 8 veces
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from datetime import datetime
+
+from data_paths import get_data_dir
+from rate_limit import FileLock, domain_of, get_rate_limiter
+from network_profile import network_stats
+
+DEFAULT_BACKOFF_BASE = 30.0
+DEFAULT_BACKOFF_MAX = 900.0
+DEFAULT_TRIP = 3
+DEFAULT_COOLDOWN_MINUTES = 30.0
+MAX_COOLDOWN_FACTOR = 8
+
+BLOCK_STATUSES = (403, 429)
+
+# Títulos de las páginas de desafío o bloqueo
+TITLE_MARKERS = [
+    'just a moment', 'un momento', 'attention required', 'access denied', 'acceso denegado',
+    'pardon our interruption', 'are you a robot', 'eres un robot', 'captcha',
+]
+
+# Marcadores en el HTML; solo se buscan en páginas pequeñas, porque los
+# listados reales pueden incluir los scripts anti-bot sin estar bloqueados
+BODY_MARKERS = [
+    'geo.captcha-delivery.com', 'captcha-delivery.com/captcha', 'cf-chl-', 'challenge-form',
+    'uso indebido', 'px-captcha', 'verify you are a human', 'verifica que eres humano',
+]
+SMALL_PAGE_CHARS = 150000
+
+# Mensajes de listado vacío legítimo (no es un bloqueo)
+EMPTY_RESULT_MARKERS = [
+    'No hay resultados', 'no hemos encontrado', 'No hay anuncios', 'no obtuvo resultados',
+]
+
+_PAGE_PROBE_JS = """
+var expected = arguments[0];
+var html = document.documentElement ? document.documentElement.outerHTML : '';
+var nav = (window.performance && performance.getEntriesByType) ? performance.getEntriesByType('navigation')[0] : null;
+return {
+    title: document.title || '',
+    status: nav && nav.responseStatus ? nav.responseStatus : null,
+    size: html.length,
+    html: html.length < arguments[1] ? html : '',
+    text: document.body ? document.body.innerText.slice(0, 5000) : '',
+    expected: expected ? document.querySelectorAll(expected).length : null
+};
+"""
+
+
+def detection_enabled():
+    return os.environ.get('SCRAPER_BLOCK_DETECTION', '1').lower() not in ('0', 'false', 'no')
+
+
+def _env_float(name, default):
+    try:
+        return max(0.0, float(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+class BlockDetected(Exception):
+    """La página cargada es un desafío o un bloqueo. Se reintenta tras el backoff."""
+
+    def __init__(self, url, reason):
+        super().__init__(f"Bloqueo en {domain_of(url)}: {reason}")
+        self.url = url
+        self.reason = reason
+
+
+class SourceBlocked(Exception):
+    """El circuit breaker del dominio está abierto: el trabajo debe detenerse."""
+
+    def __init__(self, domain, open_until, reason=None):
+        until = datetime.fromtimestamp(open_until).strftime('%H:%M')
+        super().__init__(f"{domain} bloqueado hasta las {until}" + (f" ({reason})" if reason else ""))
+        self.domain = domain
+        self.open_until = open_until
+        self.reason = reason
+
+
+def detect_block(driver, url, expect_selector=None):
+    """
+    Clasifica la página cargada. Retorna el motivo del bloqueo o None.
+    Con `expect_selector`, un listado sin ese selector y sin mensaje de
+    "sin resultados" se considera una estructura anómala.
+    """
+    if not detection_enabled():
+        return None
+
+    # Respuestas 403/429 del documento vistas por DevTools (perfil ligero)
+    network_stats.poll(driver)
+    for error_url, status in network_stats.take_document_errors():
+        if domain_of(error_url) == domain_of(url):
+            return f"HTTP {status}"
+
+    try:
+        probe = driver.execute_script(_PAGE_PROBE_JS, expect_selector, SMALL_PAGE_CHARS) or {}
+    except Exception:
+        return None
+
+    if probe.get('status') in BLOCK_STATUSES:
+        return f"HTTP {probe['status']}"
+
+    title = (probe.get('title') or '').lower()
+    for marker in TITLE_MARKERS:
+        if marker in title:
+            return f"desafío ({probe.get('title')})"
+
+    html = (probe.get('html') or '').lower()
+    for marker in BODY_MARKERS:
+        if marker in html:
+            return f"desafío ({marker})"
+
+    if expect_selector and not probe.get('expected'):
+        text = probe.get('text') or ''
+        if not any(m.lower() in text.lower() for m in EMPTY_RESULT_MARKERS):
+            return f"estructura anómala (sin {expect_selector}, {probe.get('size', 0)} caracteres)"
+    return None
+
+
+class BlockGuard:
+    """Backoff por dominio y circuit breaker compartidos entre procesos."""
+
+    def __init__(self, limiter=None, state_dir=None, log_path=None):
+        self.limiter = limiter or get_rate_limiter()
+        self.backoff_base = _env_float('SCRAPER_BLOCK_BACKOFF_BASE', DEFAULT_BACKOFF_BASE)
+        self.backoff_max = _env_float('SCRAPER_BLOCK_BACKOFF_MAX', DEFAULT_BACKOFF_MAX)
+        self.trip = max(1, int(_env_float('SCRAPER_BLOCK_TRIP', DEFAULT_TRIP)))
+        self.cooldown = _env_float('SCRAPER_BLOCK_COOLDOWN_MINUTES', DEFAULT_COOLDOWN_MINUTES) * 60
+        self._state_dir = state_dir
+        self._log_path = log_path
+        self._lock = threading.Lock()
+        self.events = {}  # dominio -> detecciones en este proceso
+
+    # --- Estado ---
+
+    def _paths(self, domain):
+        state_dir = self._state_dir or get_data_dir('cache', 'block_state')
+        name = domain.replace(':', '_') or 'default'
+        return os.path.join(state_dir, f'{name}.json'), os.path.join(state_dir, f'{name}.lock')
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write(path, state):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _log_event(self, event):
+        path = self._log_path or os.path.join(get_data_dir('logs'), 'block_events.ndjson')
+        try:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(event, ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"  ⚠️ No se pudo registrar el evento de bloqueo: {e}", file=sys.stderr)
+
+    # --- API pública ---
+
+    def check(self, url):
+        """Lanza SourceBlocked si el breaker del dominio está abierto."""
+        if not detection_enabled():
+            return
+        domain = domain_of(url)
+        state = self._read(self._paths(domain)[0])
+        open_until = state.get('open_until') or 0
+        if open_until > time.time():
+            raise SourceBlocked(domain, open_until, state.get('last_reason'))
+
+    def report_block(self, url, reason, source=None):
+        """
+        Registra un bloqueo: backoff exponencial del dominio y, si se alcanza el
+        umbral, apertura del breaker. Retorna los segundos de backoff aplicados.
+        """
+        domain = domain_of(url)
+        state_path, lock_path = self._paths(domain)
+        now = time.time()
+        with self._lock:
+            self.events[domain] = self.events.get(domain, 0) + 1
+            with FileLock(lock_path):
+                state = self._read(state_path)
+                strikes = state.get('strikes', 0) + 1
+                backoff = min(self.backoff_max, self.backoff_base * (2 ** (strikes - 1)))
+                state.update({'strikes': strikes, 'last_reason': reason, 'last_block': now})
+                opened = False
+                if strikes >= self.trip:
+                    trips = state.get('trips', 0) + 1
+                    factor = min(MAX_COOLDOWN_FACTOR, 2 ** (trips - 1))
+                    state.update({'trips': trips, 'open_until': now + self.cooldown * factor,
+                                  # En la prueba tras el enfriamiento basta una detección para reabrir
+                                  'strikes': self.trip - 1})
+                    opened = True
+                self._write(state_path, state)
+
+        self.limiter.penalize(url, backoff)
+        self._log_event({
+            'ts': datetime.now().isoformat(timespec='seconds'),
+            'pid': os.getpid(),
+            'source': source or domain.split('.')[0],
+            'domain': domain,
+            'url': url,
+            'reason': reason,
+            'strikes': strikes,
+            'backoff_seconds': round(backoff, 1),
+            'breaker': 'open' if opened else 'closed',
+            'open_until': datetime.fromtimestamp(state['open_until']).isoformat(timespec='seconds') if opened else None,
+        })
+        print(f"  🚧 Bloqueo en {domain} ({reason}): backoff de {backoff:.0f} s", file=sys.stderr)
+        if opened:
+            until = datetime.fromtimestamp(state['open_until']).strftime('%H:%M')
+            print(f"  ⛔ Circuit breaker abierto para {domain} hasta las {until}", file=sys.stderr)
+        return backoff
+
+    def report_success(self, url):
+        """Página correcta: se reinicia el contador de detecciones y se cierra el breaker."""
+        domain = domain_of(url)
+        state_path, lock_path = self._paths(domain)
+        state = self._read(state_path)
+        if not (state.get('strikes') or state.get('trips')):
+            return
+        with self._lock, FileLock(lock_path):
+            state = self._read(state_path)
+            if state.get('strikes') or state.get('trips'):
+                if state.get('trips'):
+                    print(f"  ✅ {domain} responde de nuevo: circuit breaker cerrado", file=sys.stderr)
+                self._write(state_path, {'strikes': 0, 'trips': 0, 'open_until': None,
+                                         'last_reason': state.get('last_reason'), 'last_block': state.get('last_block')})
+
+    def summary(self):
+        """{dominio: {'detections', 'open_until'}} de los dominios con bloqueos en este proceso."""
+        result = {}
+        for domain, count in self.events.items():
+            state = self._read(self._paths(domain)[0])
+            open_until = state.get('open_until') or 0
+            result[domain] = {
+                'detections': count,
+                'open_until': datetime.fromtimestamp(open_until).isoformat(timespec='seconds') if open_until > time.time() else None,
+            }
+        return result
+
+    def report(self):
+        """Línea de resumen para los logs (None si no hubo bloqueos)."""
+        parts = [f"{d}: {s['detections']} detecciones" + (f", breaker abierto hasta {s['open_until'][11:16]}" if s['open_until'] else "")
+                 for d, s in self.summary().items()]
+        return "🚧 Bloqueos: " + "; ".join(parts) if parts else None
+
+
+_guard = None
+_guard_lock = threading.Lock()
+
+
+def get_block_guard():
+    """BlockGuard compartido del proceso."""
+    global _guard
+    with _guard_lock:
+        if _guard is None:
+            _guard = BlockGuard()
+        return _guard
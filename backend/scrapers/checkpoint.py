@@ -0,0 +1,190 @@
+# coding: utf-8
+
+"""
+Checkpoints para reanudar scrapes largos de varias páginas.
+
+Cada trabajo (origen + URL de inicio + tipo de propiedad) tiene su fichero en
+data/checkpoints/. Al terminar cada página se registra en él:
+
+- que la página está completada
+- sus resultados: si ya se publicaron (JSON por página, segmento NDJSON o
+  SQLite) solo el número de propiedades; si no, las propiedades mismas, para
+  que el guardado final de la ejecución reanudada las incluya
+
+Si el proceso muere o se detiene desde /api/scraper/stop, la siguiente
+ejecución del mismo trabajo salta directamente a la primera página sin
+terminar. Al acabar el trabajo el checkpoint se elimina. Los checkpoints
+más antiguos que SCRAPER_CHECKPOINT_MAX_AGE_HOURS (12 por defecto) se
+descartan para no reanudar sobre un listado que ya ha cambiado.
+
+Configuración:
+- SCRAPER_RESUME: 1/0 para activar o desactivar la reanudación (activa por defecto)
+- SCRAPER_CHECKPOINT_MAX_AGE_HOURS: antigüedad máxima de un checkpoint reanudable
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+
+from data_paths import get_data_dir
+
+DEFAULT_MAX_AGE_HOURS = 12
+
+
+def resume_enabled():
+    """True salvo que SCRAPER_RESUME lo desactive."""
+    return os.environ.get('SCRAPER_RESUME', '1').lower() not in ('0', 'false', 'no')
+
+
+def max_age_hours():
+    try:
+        return max(0.0, float(os.environ.get('SCRAPER_CHECKPOINT_MAX_AGE_HOURS', DEFAULT_MAX_AGE_HOURS)))
+    except ValueError:
+        return DEFAULT_MAX_AGE_HOURS
+
+
+def job_key(source, start_url, property_type):
+    """Clave estable del trabajo."""
+    raw = f"{source}|{property_type}|{start_url}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+class ScrapeCheckpoint:
+    """Estado reanudable de un trabajo de scraping. Thread-safe."""
+
+    def __init__(self, source, start_url, property_type, max_age=None):
+        self.source = source
+        self.start_url = start_url
+        self.property_type = property_type
+        self.key = job_key(source, start_url, property_type)
+        self.path = os.path.join(get_data_dir('checkpoints'), f"{source}_{property_type}_{self.key}.json")
+        self.max_age = max_age_hours() if max_age is None else max_age
+        self._lock = threading.Lock()
+        self.state = self._load()
+        self.resumed = bool(self.state['pages'])
+
+    def _new_state(self):
+        now = time.time()
+        return {
+            'key': self.key,
+            'source': self.source,
+            'start_url': self.start_url,
+            'property_type': self.property_type,
+            'created_at': now,
+            'updated_at': now,
+            'total_pages': None,
+            'end_page': None,
+            'pages': {},
+        }
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return self._new_state()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"  ⚠️ Checkpoint ilegible, se empieza de cero: {e}", file=sys.stderr)
+            return self._new_state()
+
+        age_hours = (time.time() - state.get('created_at', 0)) / 3600
+        if state.get('key') != self.key or age_hours > self.max_age:
+            print(f"  🗑️ Checkpoint caducado ({age_hours:.1f} h), se empieza de cero", file=sys.stderr)
+            self._remove()
+            return self._new_state()
+
+        state.setdefault('pages', {})
+        return state
+
+    def _save(self):
+        self.state['updated_at'] = time.time()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    @property
+    def total_pages(self):
+        return self.state.get('total_pages')
+
+    @property
+    def end_page(self):
+        return self.state.get('end_page')
+
+    def set_total_pages(self, total_pages):
+        with self._lock:
+            if self.state.get('total_pages') != total_pages:
+                self.state['total_pages'] = total_pages
+                self._save()
+
+    def is_done(self, page_num):
+        return str(page_num) in self.state['pages']
+
+    def completed_pages(self):
+        return sorted(int(p) for p in self.state['pages'])
+
+    def first_pending(self, total_pages):
+        """Primera página sin terminar (None si no queda ninguna)."""
+        end = self.end_page or total_pages
+        for page_num in range(1, min(end, total_pages) + 1):
+            if not self.is_done(page_num):
+                return page_num
+        return None
+
+    def pending_pages(self, total_pages):
+        end = self.end_page or total_pages
+        return [p for p in range(1, min(end, total_pages) + 1) if not self.is_done(p)]
+
+    def page_done(self, page_num, properties, committed, end_of_listing=False):
+        """
+        Registra una página terminada. Con `committed` las propiedades ya se
+        publicaron y solo se guarda el recuento; si no, se guardan enteras.
+        """
+        with self._lock:
+            self.state['pages'][str(page_num)] = {
+                'count': len(properties),
+                'committed': bool(committed),
+                'properties': [] if committed else list(properties),
+            }
+            if end_of_listing and (self.state['end_page'] is None or page_num < self.state['end_page']):
+                self.state['end_page'] = page_num
+            self._save()
+
+    def uncommitted_properties(self):
+        """Propiedades de páginas anteriores que aún no se habían publicado, en orden de página."""
+        properties = []
+        end = self.end_page
+        for page_num in self.completed_pages():
+            if end is not None and page_num > end:
+                continue
+            properties.extend(self.state['pages'][str(page_num)].get('properties') or [])
+        return properties
+
+    def resume_summary(self):
+        pages = self.state['pages']
+        return (f"  ♻️ Reanudando trabajo: {len(pages)} páginas ya completadas "
+                f"({sum(p.get('count', 0) for p in pages.values())} propiedades)")
+
+    def finish(self):
+        """El trabajo ha terminado: se elimina el checkpoint."""
+        with self._lock:
+            self._remove()
+
+
+def open_checkpoint(source, start_url, property_type):
+    """Checkpoint del trabajo, o None si la reanudación está desactivada."""
+    if not resume_enabled():
+        return None
+    checkpoint = ScrapeCheckpoint(source, start_url, property_type)
+    if checkpoint.resumed:
+        print(checkpoint.resume_summary(), file=sys.stderr)
+    return checkpoint
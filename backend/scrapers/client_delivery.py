@@ -0,0 +1,205 @@
+# coding: utf-8
+
+"""
+Envío agrupado de clientes al backend.
+
+update_scraper creaba cada cliente con un `requests.post` independiente a
+/api/clients: una conexión TCP nueva y una ida y vuelta en serie por
+propiedad. ClientOutbox acumula los clientes y los envía:
+
+- con una única `requests.Session` (keep-alive, conexiones reutilizadas)
+- en lotes a /api/clients/batch-insert si el backend lo ofrece; si responde
+  404/405 se recurre a un POST por cliente a /api/clients. Ese endpoint solo
+  da de alta teléfonos nuevos: /api/clients/batch (importación) actualiza los
+  existentes y sobrescribiría el estado y las notas del CRM con los valores
+  provisionales del scraper
+- reintentando con backoff exponencial los errores de conexión y los 5xx
+
+La cola pendiente se guarda en data/cache/client_outbox.json tras cada
+cambio, así que los clientes que no se llegaron a entregar (caída del
+proceso, backend parado) se envían en la siguiente ejecución.
+
+Configuración:
+- BACKEND_API_URL: URL base del backend (http://localhost:3001)
+- CLIENT_BATCH_SIZE: clientes por lote (25)
+- CLIENT_DELIVERY_RETRIES: reintentos por envío (3)
+"""
+
+import os
+import sys
+import json
+import time
+
+from data_paths import get_data_dir
+
+DEFAULT_API_URL = "http://localhost:3001"
+DEFAULT_BATCH_SIZE = 25
+DEFAULT_RETRIES = 3
+BACKOFF_BASE = 0.5  # segundos: 0.5, 1, 2, ...
+
+# Alta de clientes nuevos: omite los teléfonos que ya están en el CRM
+BATCH_PATH = '/api/clients/batch-insert'
+
+# Respuestas que indican que el backend no tiene el endpoint de lotes
+_NO_BULK_STATUSES = (404, 405)
+
+
+def _env_int(name, default):
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+class DeliveryError(Exception):
+    """Envío fallido tras agotar los reintentos."""
+
+
+class ClientOutbox:
+    """Cola persistente de clientes pendientes de enviar al backend."""
+
+    def __init__(self, api_url=None, batch_size=None, retries=None, queue_path=None):
+        self.api_url = (api_url or os.environ.get('BACKEND_API_URL') or DEFAULT_API_URL).rstrip('/')
+        self.batch_size = batch_size or _env_int('CLIENT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.retries = retries if retries is not None else _env_int('CLIENT_DELIVERY_RETRIES', DEFAULT_RETRIES)
+        self.queue_path = queue_path or os.path.join(get_data_dir('cache'), 'client_outbox.json')
+        self.bulk_supported = None   # None: aún no se sabe
+        self._session = None
+        self.delivered = 0
+        self.added = 0
+        self.requests = 0
+        self.queue = self._load()
+        if self.queue:
+            print(f"  📬 {len(self.queue)} clientes pendientes de una ejecución anterior", file=sys.stderr)
+
+    # --- Persistencia ---
+
+    def _load(self):
+        try:
+            with open(self.queue_path, 'r', encoding='utf-8') as f:
+                queue = json.load(f)
+            return queue if isinstance(queue, list) else []
+        except (OSError, ValueError):
+            return []
+
+    def _persist(self):
+        if not self.queue:
+            try:
+                os.remove(self.queue_path)
+            except OSError:
+                pass
+            return
+        tmp_path = self.queue_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.queue, f, ensure_ascii=False)
+        os.replace(tmp_path, self.queue_path)
+
+    # --- HTTP ---
+
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            self._session = requests.Session()
+            self._session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+            self._session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        return self._session
+
+    def _post(self, path, payload):
+        """POST con reintentos y backoff. Retorna la respuesta (también 4xx) o lanza DeliveryError."""
+        import requests
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(BACKOFF_BASE * (2 ** (attempt - 1)))
+            try:
+                self.requests += 1
+                response = self.session().post(f"{self.api_url}{path}", json=payload, timeout=10)
+            except requests.exceptions.RequestException as e:
+                last_error = e
+                continue
+            if response.status_code >= 500:
+                last_error = f"HTTP {response.status_code}: {response.text[:200]}"
+                continue
+            return response
+        raise DeliveryError(last_error)
+
+    def _send_batch(self, batch):
+        """Envía un lote a /api/clients/batch-insert. Retorna False si el backend no lo soporta."""
+        response = self._post(BATCH_PATH, batch)
+        if response.status_code in _NO_BULK_STATUSES:
+            return False
+        if response.status_code != 200:
+            raise DeliveryError(f"HTTP {response.status_code}: {response.text[:200]}")
+        result = response.json()
+        added = int(result.get('count') or 0)
+        skipped = int(result.get('skippedCount') or 0)
+        if added == len(batch):
+            for client in batch:
+                self._report_added(client)
+        else:
+            # El backend solo devuelve recuentos: una línea por cliente nuevo
+            for _ in range(added):
+                print("  ✅ Nuevo cliente añadido via API (lote)", file=sys.stderr)
+            print(f"  ℹ️ Lote de {len(batch)} clientes: {added} nuevos, {skipped} ya existían", file=sys.stderr)
+        self.added += added
+        return True
+
+    def _send_one(self, client):
+        response = self._post('/api/clients', client)
+        if response.status_code != 200:
+            # Error del cliente (4xx): reintentar no lo arreglará, se descarta
+            print(f"  ⚠️ Error de API ({response.status_code}): {response.text}", file=sys.stderr)
+            return
+        self._report_added(client)
+        self.added += 1
+
+    @staticmethod
+    def _report_added(client):
+        print(f"  ✅ Nuevo cliente añadido via API: {client.get('name')} ({client.get('location')}) - Tlf: {client.get('phone')}", file=sys.stderr)
+
+    # --- Cola ---
+
+    def add(self, client):
+        """Encola un cliente y envía un lote cuando la cola alcanza el tamaño de lote."""
+        self.queue.append(client)
+        self._persist()
+        if len(self.queue) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Intenta entregar toda la cola. Lo que no se entrega queda persistido."""
+        try:
+            while self.queue:
+                batch = self.queue[:self.batch_size]
+                if self.bulk_supported is not False:
+                    sent = self._send_batch(batch)
+                    if self.bulk_supported is None:
+                        self.bulk_supported = sent
+                        if not sent:
+                            print("  ℹ️ El backend no acepta lotes de clientes, se envían uno a uno", file=sys.stderr)
+                    if not sent:
+                        continue
+                    del self.queue[:len(batch)]
+                else:
+                    self._send_one(batch[0])
+                    del self.queue[:1]
+                    batch = batch[:1]
+                self.delivered += len(batch)
+                self._persist()
+        except DeliveryError as e:
+            print(f"  ⚠️ No se pudo entregar al backend ({e}). {len(self.queue)} clientes quedan en cola para la próxima ejecución.", file=sys.stderr)
+            self._persist()
+        except Exception as e:
+            print(f"  ⚠️ Error enviando clientes: {e}", file=sys.stderr)
+            self._persist()
+
+    def close(self):
+        self.flush()
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def report(self):
+        return (f"📬 Clientes: {self.delivered} entregados ({self.added} nuevos) en {self.requests} peticiones"
+                + (f", {len(self.queue)} en cola" if self.queue else ""))
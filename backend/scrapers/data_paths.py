@@ -0,0 +1,29 @@
+# coding: utf-8
+
+"""
+Rutas de datos compartidas por los scrapers.
+
+Sigue la misma convención que el backend: si existe USER_DATA_PATH (app
+empaquetada) se usa USER_DATA_PATH/data, si no la carpeta data/ en la raíz
+del proyecto.
+"""
+
+import os
+
+
+def get_data_dir(*parts):
+    """Devuelve (y crea si hace falta) una subcarpeta dentro del directorio de datos."""
+    base_data_path = os.environ.get("USER_DATA_PATH")
+    if base_data_path:
+        data_dir = os.path.join(base_data_path, "data")
+    else:
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data")
+
+    path = os.path.abspath(os.path.join(data_dir, *parts))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_db_path():
+    """Ruta de la base de datos SQLite del backend (data/inmobiliaria.db)."""
+    return os.path.join(get_data_dir(), "inmobiliaria.db")
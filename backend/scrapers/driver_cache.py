@@ -0,0 +1,190 @@
+# coding: utf-8
+
+"""
+Caché de resolución de drivers (chromedriver / msedgedriver).
+
+`ChromeDriverManager().install()` y `EdgeChromiumDriverManager().install()`
+consultan la red y prueban versiones en cada llamada. Esta caché guarda, por
+binario de navegador, la ruta del driver resuelto junto con la versión del
+navegador detectada. Mientras el binario no cambie (tamaño/fecha) no se hace
+ninguna comprobación; si cambia, se detecta la versión y solo se vuelve a
+llamar a webdriver_manager si la versión es distinta.
+
+Si webdriver_manager falla (p.ej. sin conexión) se usa la última ruta
+conocida aunque la versión haya cambiado.
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import platform
+import threading
+import subprocess
+from datetime import datetime
+
+from data_paths import get_data_dir
+
+CACHE_FILENAME = "driver_cache.json"
+
+_lock = threading.Lock()
+
+# Ubicaciones por defecto cuando el navegador no tiene binario explícito
+DEFAULT_BINARIES = {
+    'chrome': [
+        'google-chrome', 'google-chrome-stable', 'chromium-browser', 'chromium',
+        '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+        r'C:\Program Files\Google\Chrome\Application\chrome.exe',
+        r'C:\Program Files (x86)\Google\Chrome\Application\chrome.exe',
+    ],
+    'edge': [
+        r'C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe',
+        r'C:\Program Files\Microsoft\Edge\Application\msedge.exe',
+        '/Applications/Microsoft Edge.app/Contents/MacOS/Microsoft Edge',
+        'microsoft-edge', 'microsoft-edge-stable',
+    ],
+}
+
+# Claves de registro donde Windows guarda la versión instalada
+WINDOWS_VERSION_KEYS = {
+    'chrome': r'Software\Google\Chrome\BLBeacon',
+    'edge': r'Software\Microsoft\Edge\BLBeacon',
+}
+
+
+def _cache_path():
+    return os.path.join(get_data_dir("cache"), CACHE_FILENAME)
+
+
+def _load_cache():
+    try:
+        with open(_cache_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    path = _cache_path()
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"  ⚠️ No se pudo guardar la caché de drivers: {e}", file=sys.stderr)
+
+
+def _find_default_binary(browser):
+    for candidate in DEFAULT_BINARIES.get(browser, []):
+        if os.path.isabs(candidate):
+            if os.path.exists(candidate):
+                return candidate
+        else:
+            found = shutil.which(candidate)
+            if found:
+                return found
+    return None
+
+
+def _fingerprint(binary_path):
+    """Huella barata del binario (tamaño + fecha de modificación), sin ejecutarlo."""
+    if not binary_path:
+        return None
+    try:
+        st = os.stat(binary_path)
+        return f"{st.st_size}:{int(st.st_mtime)}"
+    except OSError:
+        return None
+
+
+def detect_browser_version(browser, binary_path):
+    """Detecta la versión del navegador sin red. Devuelve None si no se puede."""
+    if platform.system() == 'Windows':
+        try:
+            import winreg
+            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, WINDOWS_VERSION_KEYS[browser]) as key:
+                return winreg.QueryValueEx(key, 'version')[0]
+        except Exception:
+            pass
+        # Fallback: la carpeta Application contiene un subdirectorio con la versión
+        if binary_path:
+            try:
+                app_dir = os.path.dirname(binary_path)
+                versions = [d for d in os.listdir(app_dir) if re.match(r'^\d+\.\d+\.\d+\.\d+$', d)]
+                if versions:
+                    return max(versions, key=lambda v: [int(x) for x in v.split('.')])
+            except OSError:
+                pass
+        return None
+
+    if not binary_path:
+        return None
+    try:
+        out = subprocess.run([binary_path, '--version'], capture_output=True, text=True, timeout=10).stdout
+        match = re.search(r'(\d+\.\d+\.\d+(?:\.\d+)?)', out or '')
+        return match.group(1) if match else None
+    except Exception:
+        return None
+
+
+def resolve_driver_path(browser, binary_path, install):
+    """
+    Devuelve la ruta del driver para `browser` ('chrome' o 'edge') y el binario indicado.
+
+    `install` es la función que resuelve el driver cuando la caché no sirve
+    (p.ej. `lambda: ChromeDriverManager().install()`).
+    """
+    binary = binary_path or _find_default_binary(browser)
+    key = f"{browser}:{binary or 'default'}"
+    fingerprint = _fingerprint(binary)
+
+    with _lock:
+        cache = _load_cache()
+        entry = cache.get(key)
+        cached_driver = entry.get('driver_path') if entry else None
+        cached_ok = bool(cached_driver and os.path.exists(cached_driver))
+
+        # 1. Binario sin cambios: cero red, cero sondeos
+        if cached_ok and fingerprint and entry.get('fingerprint') == fingerprint:
+            return cached_driver
+
+        # 2. El binario ha cambiado: comprobar si también ha cambiado la versión
+        version = detect_browser_version(browser, binary)
+        if cached_ok and version and entry.get('browser_version') == version:
+            entry['fingerprint'] = fingerprint
+            _save_cache(cache)
+            return cached_driver
+
+        # 3. Versión nueva o desconocida: resolver con webdriver_manager
+        try:
+            driver_path = install()
+        except Exception as e:
+            if cached_ok:
+                print(f"  ⚠️ No se pudo resolver el driver ({e}). Usando el último conocido: {cached_driver}", file=sys.stderr)
+                return cached_driver
+            raise
+
+        cache[key] = {
+            'driver_path': driver_path,
+            'browser_binary': binary,
+            'browser_version': version,
+            'fingerprint': fingerprint,
+            'resolved_at': datetime.now().isoformat()
+        }
+        _save_cache(cache)
+        print(f"  💾 Driver de {browser} {version or ''} cacheado: {driver_path}", file=sys.stderr)
+        return driver_path
+
+
+def install_chromedriver():
+    """`ChromeDriverManager().install()` importando webdriver_manager solo cuando hace falta."""
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
+
+def install_edgedriver():
+    """`EdgeChromiumDriverManager().install()` importando webdriver_manager solo cuando hace falta."""
+    from webdriver_manager.microsoft import EdgeChromiumDriverManager
+    return EdgeChromiumDriverManager().install()
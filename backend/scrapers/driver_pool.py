@@ -0,0 +1,243 @@
+# coding: utf-8
+
+"""
+Pool de sesiones de navegador reutilizables para los scrapers.
+
+En lugar de lanzar un navegador nuevo por cada página, el pool mantiene una o
+varias sesiones "calientes" y las recicla según la configuración:
+- tras N páginas servidas (SCRAPER_POOL_MAX_USES)
+- si el heap JS crece por encima de un umbral (SCRAPER_POOL_MAX_MEMORY_MB)
+- cuando el scraper detecta un bloqueo y marca la sesión para reciclar
+
+Entre usos se borran cookies y almacenamiento para que cada página empiece limpia.
+"""
+
+import os
+import sys
+import threading
+import queue
+import platform
+from contextlib import contextmanager
+
+
+def _env_int(name, default):
+    """Lee un entero de una variable de entorno con valor por defecto."""
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _available_memory_mb():
+    """Memoria disponible en MB (None si no se puede determinar)."""
+    try:
+        if platform.system() == 'Windows':
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                            ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                            ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                            ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                            ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return status.ullAvailPhys // (1024 * 1024)
+
+        if os.path.exists('/proc/meminfo'):
+            with open('/proc/meminfo') as f:
+                for line in f:
+                    if line.startswith('MemAvailable:'):
+                        return int(line.split()[1]) // 1024
+
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+    except Exception:
+        return None
+
+
+def max_browser_workers(requested=None):
+    """
+    Número de navegadores en paralelo que soporta la máquina.
+    Se limita por CPU (un núcleo por navegador) y por RAM disponible
+    (SCRAPER_BROWSER_RAM_MB por navegador, 600 MB por defecto).
+    """
+    if requested is None:
+        requested = _env_int('SCRAPER_WORKERS', 1)
+    requested = max(1, requested)
+
+    cpu_cap = max(1, (os.cpu_count() or 1))
+    ram_cap = requested
+    available = _available_memory_mb()
+    if available is not None:
+        ram_cap = max(1, available // max(1, _env_int('SCRAPER_BROWSER_RAM_MB', 600)))
+
+    workers = min(requested, cpu_cap, ram_cap)
+    if workers < requested:
+        print(f"  ℹ️ Workers limitados a {workers} (solicitados {requested}, CPU {cpu_cap}, RAM {ram_cap})", file=sys.stderr)
+    return workers
+
+
+class DriverPool:
+    """
+    Pool thread-safe de drivers de Selenium.
+
+    `factory` es una función sin argumentos que devuelve un driver nuevo
+    (normalmente `lambda: setup_driver(headless=False)`).
+    """
+
+    def __init__(self, factory, size=None, max_uses=None, max_memory_mb=None, reset_between_uses=True):
+        self.factory = factory
+        self.size = max(1, size if size is not None else _env_int('SCRAPER_POOL_SIZE', 1))
+        self.max_uses = max_uses if max_uses is not None else _env_int('SCRAPER_POOL_MAX_USES', 25)
+        self.max_memory_mb = max_memory_mb if max_memory_mb is not None else _env_int('SCRAPER_POOL_MAX_MEMORY_MB', 512)
+        self.reset_between_uses = reset_between_uses
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._meta = {}  # id(driver) -> {'uses': int, 'heap_baseline': int, 'recycle': bool}
+        self._closed = False
+
+        self.stats = {'launches': 0, 'reuses': 0, 'recycles': 0}
+
+    # --- Ciclo de vida de los drivers ---
+
+    def _launch(self):
+        driver = self.factory()
+        with self._lock:
+            self._meta[id(driver)] = {'uses': 0, 'heap_baseline': None, 'recycle': False}
+            self.stats['launches'] += 1
+        return driver
+
+    def _destroy(self, driver):
+        with self._lock:
+            self._meta.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"  ⚠️ Error cerrando navegador del pool: {e}", file=sys.stderr)
+
+    def _heap_mb(self, driver):
+        """Tamaño del heap JS en MB (solo Chromium). Devuelve None si no está disponible."""
+        try:
+            used = driver.execute_script("return (window.performance && performance.memory) ? performance.memory.usedJSHeapSize : null;")
+            return used / (1024 * 1024) if used else None
+        except Exception:
+            return None
+
+    def _should_recycle(self, driver):
+        meta = self._meta.get(id(driver))
+        if meta is None:
+            return True
+        if meta['recycle']:
+            return True
+        if self.max_uses and meta['uses'] >= self.max_uses:
+            return True
+        if self.max_memory_mb:
+            heap = self._heap_mb(driver)
+            if heap is not None:
+                if meta['heap_baseline'] is None:
+                    meta['heap_baseline'] = heap
+                elif heap - meta['heap_baseline'] > self.max_memory_mb:
+                    return True
+        return False
+
+    def _reset_session(self, driver):
+        """Borra cookies, almacenamiento y caché para que el siguiente uso empiece limpio."""
+        try:
+            driver.execute_script("try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}")
+        except Exception:
+            pass
+        try:
+            # CDP borra las cookies de todos los dominios, no solo del actual
+            driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        except Exception:
+            try:
+                driver.delete_all_cookies()
+            except Exception:
+                pass
+        try:
+            driver.get('about:blank')
+        except Exception:
+            pass
+
+    # --- API pública ---
+
+    def acquire(self):
+        """Obtiene un driver del pool (lanzando uno nuevo si no hay ninguno libre)."""
+        if self._closed:
+            raise RuntimeError("El pool de navegadores está cerrado")
+        self._slots.acquire()
+        try:
+            try:
+                driver = self._idle.get_nowait()
+                with self._lock:
+                    self.stats['reuses'] += 1
+            except queue.Empty:
+                driver = self._launch()
+            with self._lock:
+                self._meta[id(driver)]['uses'] += 1
+            return driver
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, driver, recycle=False):
+        """Devuelve un driver al pool. Con `recycle=True` se cierra y se lanzará uno nuevo."""
+        try:
+            if recycle:
+                self.mark_for_recycle(driver)
+            if self._closed or self._should_recycle(driver):
+                if not self._closed:
+                    with self._lock:
+                        self.stats['recycles'] += 1
+                self._destroy(driver)
+                return
+            if self.reset_between_uses:
+                self._reset_session(driver)
+            self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    def mark_for_recycle(self, driver):
+        """Marca un driver para cerrarlo al devolverlo (p.ej. tras detectar un bloqueo)."""
+        with self._lock:
+            meta = self._meta.get(id(driver))
+            if meta is not None:
+                meta['recycle'] = True
+
+    @contextmanager
+    def session(self):
+        """Context manager: `with pool.session() as driver: ...`. Recicla el driver si hay error."""
+        driver = self.acquire()
+        failed = False
+        try:
+            yield driver
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(driver, recycle=failed)
+
+    def close(self):
+        """Cierra todos los navegadores libres del pool."""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._destroy(driver)
+
+    def report(self):
+        """Resumen de uso del pool."""
+        return (f"🧰 Pool de navegadores: {self.stats['launches']} lanzamientos, "
+                f"{self.stats['reuses']} reutilizaciones, {self.stats['recycles']} reciclajes")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -4,21 +4,19 @@
 Scraper de Fotocasa usando Selenium para manejar contenido dinámico
 """
 
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.keys import Keys
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 import time
 import random
 import re
+import json
 import os
 import sys
+import threading
 
 # Configurar la salida estándar a UTF-8 para evitar errores de codificación en Windows (charmap)
 try:
@@ -27,22 +25,40 @@ try:
 except AttributeError:
     pass  # Versiones antiguas de Python o entornos sin stdout estándar
 
-from selenium.webdriver.edge.options import Options as EdgeOptions
-from selenium.webdriver.edge.service import Service as EdgeService
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
-from webdriver_manager.microsoft import EdgeChromiumDriverManager
 import platform
+from functools import lru_cache
+
+# Módulos compartidos entre scrapers (backend/scrapers)
+scrapers_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if scrapers_dir not in sys.path:
+    sys.path.insert(0, scrapers_dir)
+
+from driver_pool import DriverPool, max_browser_workers
+from rate_limit import get_rate_limiter
+from block_detector import detect_block, get_block_guard, BlockDetected, SourceBlocked
+from network_profile import lean_enabled, configure_lean_options, enable_lean_loading, network_stats
+from known_listings import incremental_enabled, load_known_urls, remember_urls, page_is_mostly_known
+from seen_index import skip_seen_enabled, drop_seen, get_seen_index
+from listing_urls import assign_listing_ids
+from ndjson_writer import NdjsonWriter, output_format
+from sqlite_ingest import SqliteIngestWriter, direct_ingest_enabled
+from checkpoint import open_checkpoint
+from driver_cache import resolve_driver_path, install_chromedriver, install_edgedriver
 
-def setup_driver(headless=True):
+# Las clases del navegador, webdriver_manager, ActionChains y bs4 se importan en
+# el primer uso: cada punto de entrada carga solo lo que necesita su plataforma
+# y su trabajo (ver benchmark_startup.py).
+
+def setup_driver(headless=True, lean=None):
     """
     Configura y retorna el driver de Selenium.
     - macOS/Linux: Chrome (con fallback a Brave/Chromium)
     - Windows: Edge (con fallback a Chrome)
     
     Incluye detección de versión del sistema para mejor compatibilidad.
+    Con `lean` (o SCRAPER_LEAN_LOADING=1) se bloquean imágenes, fuentes, media y trackers.
     """
+    lean = lean_enabled(lean)
     system = platform.system()
     machine = platform.machine()  # Detectar arquitectura (x86_64, arm64)
     
@@ -63,6 +79,9 @@ def setup_driver(headless=True):
     
     if system == 'Darwin' or system == 'Linux':
         print(f"Detectado sistema {system}. Configurando navegador...")
+        from selenium.webdriver.chrome.options import Options as ChromeOptions
+        from selenium.webdriver.chrome.service import Service as ChromeService
+        from selenium.webdriver.chrome.webdriver import WebDriver as ChromeDriver
         
         # Seleccionar User Agent apropiado según versión de macOS
         if system == 'Darwin':
@@ -107,6 +126,8 @@ def setup_driver(headless=True):
         options.add_experimental_option("excludeSwitches", ["enable-automation"])
         options.add_experimental_option('useAutomationExtension', False)
         options.add_argument(f'user-agent={user_agent}')
+        if lean:
+            configure_lean_options(options)
 
         # Lista de navegadores a intentar
         browsers_to_try = []
@@ -138,9 +159,11 @@ def setup_driver(headless=True):
                 print(f"🌐 Intentando usar {browser_name}...")
                 try:
                     options.binary_location = browser_path
-                    service = ChromeService(ChromeDriverManager().install())
-                    driver = webdriver.Chrome(service=service, options=options)
+                    service = ChromeService(resolve_driver_path('chrome', browser_path, install_chromedriver))
+                    driver = ChromeDriver(service=service, options=options)
                     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+                    if lean:
+                        enable_lean_loading(driver)
                     print(f"✅ {browser_name} iniciado correctamente")
                     return driver
                 except Exception as e:
@@ -161,10 +184,14 @@ def setup_driver(headless=True):
             options.add_experimental_option("excludeSwitches", ["enable-automation"])
             options.add_experimental_option('useAutomationExtension', False)
             options.add_argument(f'user-agent={user_agent}')
+            if lean:
+                configure_lean_options(options)
             
-            service = ChromeService(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=options)
+            service = ChromeService(resolve_driver_path('chrome', None, install_chromedriver))
+            driver = ChromeDriver(service=service, options=options)
             driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            if lean:
+                enable_lean_loading(driver)
             return driver
         except Exception as e:
             print(f"❌ Error iniciando Chrome Driver: {e}")
@@ -173,6 +200,9 @@ def setup_driver(headless=True):
     else:
         # Windows (o otros): Usar Edge (Prioridad original)
         print(f"Detectado sistema {system}. Usando Edge...")
+        from selenium.webdriver.edge.options import Options as EdgeOptions
+        from selenium.webdriver.edge.service import Service as EdgeService
+        from selenium.webdriver.edge.webdriver import WebDriver as EdgeDriver
         edge_options = EdgeOptions()
         if headless:
             edge_options.add_argument('--headless=new')
@@ -188,12 +218,14 @@ def setup_driver(headless=True):
         edge_options.add_experimental_option('useAutomationExtension', False)
         
         edge_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0')
+        if lean:
+            configure_lean_options(edge_options)
         
         try:
             # Intentar usar webdriver_manager primero
             try:
-                print("Intentando descargar EdgeDriver con webdriver_manager...")
-                service = EdgeService(EdgeChromiumDriverManager().install())
+                print("Resolviendo EdgeDriver (caché local o webdriver_manager)...")
+                service = EdgeService(resolve_driver_path('edge', None, install_edgedriver))
             except Exception as e:
                 print(f"⚠️ Falló webdriver_manager para Edge: {e}")
                 print("Intentando usar driver local...")
@@ -218,8 +250,10 @@ def setup_driver(headless=True):
             if os.name == 'nt':
                 service.creation_flags = 0x08000000 
             
-            driver = webdriver.Edge(service=service, options=edge_options)
+            driver = EdgeDriver(service=service, options=edge_options)
             driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            if lean:
+                enable_lean_loading(driver)
             return driver
             
         except Exception as e:
@@ -273,6 +307,7 @@ def human_like_mouse_move(driver):
     Simula movimientos de ratón moviendo el cursor sobre elementos reales y visibles
     de la página para evitar errores de coordenadas y parecer más humano.
     """
+    from selenium.webdriver.common.action_chains import ActionChains
     try:
         actions = ActionChains(driver)
         # Buscar una lista de elementos seguros y visibles sobre los que moverse
@@ -294,12 +329,34 @@ def human_like_mouse_move(driver):
         pass
         # print(f"  ⚠️ No se pudo simular movimiento de ratón v4: {e}")
 
-def scroll_to_bottom(driver):
+# Número de tarjetas cargadas en el listado
+COUNT_ARTICLES_JS = "var root = document.getElementById('main-content'); return root ? root.getElementsByTagName('article').length : 0;"
+AT_BOTTOM_JS = "return (window.innerHeight + window.scrollY) >= (document.body.scrollHeight - 50);"
+
+def adaptive_scroll_enabled():
+    """Scroll adaptativo activo salvo FOTOCASA_ADAPTIVE_SCROLL=0."""
+    return os.environ.get('FOTOCASA_ADAPTIVE_SCROLL', '1').lower() not in ('0', 'false', 'no')
+
+def scroll_to_bottom(driver, adaptive=False):
     """
     Hace scroll gradual y humano hasta el final de la página, con pausas,
     retrocesos y movimientos de rueda del ratón.
+
+    Con `adaptive=True` vigila el número de `article` dentro de #main-content
+    y para en cuanto deja de crecer durante una ventana de calma
+    (FOTOCASA_SCROLL_QUIET_SECONDS, 2.5 s) o se agota el presupuesto
+    (FOTOCASA_SCROLL_MAX_SECONDS, 12 s). Retorna los segundos empleados.
     """
+    started = time.monotonic()
+    if adaptive:
+        articles = _adaptive_scroll(driver)
+        elapsed = time.monotonic() - started
+        print(f"  ⏱️ Scroll adaptativo: {elapsed:.1f}s ({articles} artículos)")
+        return elapsed
+
     print("  ⬇️  Haciendo scroll (v3) para cargar todos los elementos...")
+    from selenium.webdriver.common.action_chains import ActionChains
+    from selenium.webdriver.common.keys import Keys
     actions = ActionChains(driver)
     
     # Simular varios scrolls de rueda de ratón
@@ -328,6 +385,49 @@ def scroll_to_bottom(driver):
     driver.execute_script("window.scrollTo(0, document.body.scrollHeight);") # Bajar de nuevo
     time.sleep(random.uniform(2.5, 4.0)) # Espera final más larga
 
+    elapsed = time.monotonic() - started
+    print(f"  ⏱️ Scroll: {elapsed:.1f}s")
+    return elapsed
+
+def _adaptive_scroll(driver):
+    """Scroll con jitter que termina cuando el listado deja de crecer. Retorna el nº de artículos."""
+    quiet_window = float(os.environ.get('FOTOCASA_SCROLL_QUIET_SECONDS', 2.5))
+    max_seconds = float(os.environ.get('FOTOCASA_SCROLL_MAX_SECONDS', 12))
+    from selenium.webdriver.common.action_chains import ActionChains
+    from selenium.webdriver.common.keys import Keys
+    actions = ActionChains(driver)
+
+    started = time.monotonic()
+    count = driver.execute_script(COUNT_ARTICLES_JS) or 0
+    last_growth = started
+
+    while time.monotonic() - started < max_seconds:
+        for _ in range(random.randint(1, 3)):
+            actions.send_keys(Keys.PAGE_DOWN).perform()
+            time.sleep(random.uniform(0.15, 0.4))
+        time.sleep(random.uniform(0.3, 0.8))
+
+        # Retroceso ocasional, más corto que en el modo clásico
+        if random.random() < 0.1:
+            actions.send_keys(Keys.PAGE_UP).perform()
+            time.sleep(random.uniform(0.2, 0.5))
+
+        now = time.monotonic()
+        current = driver.execute_script(COUNT_ARTICLES_JS) or 0
+        if current > count:
+            count = current
+            last_growth = now
+            continue
+
+        quiet_for = now - last_growth
+        if quiet_for >= quiet_window and (driver.execute_script(AT_BOTTOM_JS) or quiet_for >= 2 * quiet_window):
+            break
+
+    # Último empujón al final por si queda algo pendiente de lazy-load
+    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+    time.sleep(random.uniform(0.5, 1.0))
+    return max(count, driver.execute_script(COUNT_ARTICLES_JS) or 0)
+
 def GetText(element):
     """Obtiene texto de un elemento BeautifulSoup limpiando caracteres invisibles"""
     if not element:
@@ -337,159 +437,537 @@ def GetText(element):
     text = text.replace('\u200c', '').replace('\u200b', '').strip()
     return text if text else 'None'
 
-def extract_properties_from_page(html_content, property_type, sort_by):
-    """Extrae propiedades de una página HTML, filtrando solo anuncios de particulares"""
-    soup = BeautifulSoup(html_content, 'html5lib')
-    properties = []
+@lru_cache(maxsize=None)
+def main_content_strainer():
+    """Solo interesa el subárbol del listado."""
+    from bs4 import SoupStrainer
+    return SoupStrainer(id='main-content')
+
+def get_html_parser(parser=None):
+    """
+    Backend de BeautifulSoup a usar: el indicado, FOTOCASA_HTML_PARSER,
+    o lxml si está instalado (mucho más rápido) con html5lib como fallback.
+    """
+    parser = parser or os.environ.get('FOTOCASA_HTML_PARSER')
+    if parser:
+        return parser
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html5lib'
+
+def parse_listing_html(html_content, parser=None):
+    """Parsea la página restringiendo a #main-content cuando el backend lo soporta."""
+    from bs4 import BeautifulSoup
+    parser = get_html_parser(parser)
+    if parser == 'html5lib':
+        # html5lib no soporta parse_only: construye siempre el árbol completo
+        return BeautifulSoup(html_content, parser)
+    return BeautifulSoup(html_content, parser, parse_only=main_content_strainer())
+
+# Matchers precompilados para la extracción de tarjetas
+PARTICULAR_TEXT_RE = re.compile(r"Anunciante\s+particular", re.IGNORECASE)
+MUNICIPALITY_FROM_TITLE_RE = re.compile(r"\s+en\s+(.*)", re.IGNORECASE)
+LOCATION_TAGS = frozenset(('span', 'div', 'h4'))
+LOCATION_CLASS_KEYS = ('address', 'location', 'subtitle')
+
+def _class_str(tag):
+    """Clases de un tag como cadena (equivale a los matchers lambda sobre 'class')."""
+    classes = tag.attrs.get('class')
+    if not classes:
+        return ''
+    return classes if isinstance(classes, str) else ' '.join(classes)
+
+def extract_card(article):
+    """
+    Extrae una tarjeta de Fotocasa recorriendo el `article` una sola vez.
+
+    El recorrido solo guarda referencias a los nodos candidatos (primer match en
+    orden de documento, igual que `article.find`) y detecta si es particular;
+    las tarjetas de agencia se descartan antes de extraer ningún texto.
+    Retorna el dict de la propiedad o None.
+    """
+    from bs4.element import Tag
+    is_particular = False
+    price_container = h3_element = link_text = location_element = None
+    desc_element = ul_features = timeago_li = phone_link = None
+    panot_link = comprar_link = img_element = None
+
+    for node in article.descendants:
+        if not isinstance(node, Tag):
+            # ⚠️ FILTRO CRÍTICO: texto "Anunciante particular"
+            if not is_particular and PARTICULAR_TEXT_RE.search(node):
+                is_particular = True
+            continue
+
+        name = node.name
+        if name == 'img':
+            src = node.attrs.get('src')
+            if src:
+                if 'particular_user_icon.svg' in src:
+                    is_particular = True
+                if img_element is None and 'fotocasa.es' in src:
+                    img_element = node
+        elif name == 'a':
+            attrs = node.attrs
+            href = attrs.get('href')
+            if panot_link is None and attrs.get('data-panot-component') == 'link-box-link':
+                panot_link = node
+            if href:
+                if phone_link is None and href.startswith('tel:'):
+                    phone_link = node
+                if comprar_link is None and '/comprar/' in href:
+                    comprar_link = node
+            if link_text is None:
+                classes = attrs.get('class')
+                if classes and ('re-Card-title' in classes or classes == 're-Card-title'):
+                    link_text = node
+        elif name in LOCATION_TAGS or name in ('h3', 'p', 'ul', 'li'):
+            classes = _class_str(node)
+            if not classes:
+                continue
+            if name == 'div' and price_container is None and 'text-display-3' in classes:
+                price_container = node
+            if name == 'h3' and h3_element is None and 'text-subhead' in classes:
+                h3_element = node
+            if name in LOCATION_TAGS and location_element is None and any(k in classes for k in LOCATION_CLASS_KEYS):
+                location_element = node
+            if name == 'p' and desc_element is None and 'hidden' in classes:
+                desc_element = node
+            if name == 'ul' and ul_features is None and 'text-body-1' in classes:
+                ul_features = node
+            if name == 'li' and timeago_li is None and 'capitalize' in classes:
+                timeago_li = node
+
+    # Si no es particular, saltar este artículo sin extraer nada
+    if not is_particular:
+        return None
+
+    # PRECIO
+    price = GetText(price_container.find('span')) if price_container else 'None'
+
+    # TÍTULO (con fallback al enlace de la tarjeta)
+    title = GetText(h3_element) if h3_element else 'None'
+    if (title == 'None' or title == '') and link_text:
+        title = GetText(link_text)
+
+    # Solo interesan tarjetas con título y precio
+    if title == 'None' or price == 'None':
+        return None
+
+    # MUNICIPIO: elemento de dirección o, si no, lo que sigue a " en " en el título
+    municipality = 'Desconocido'
+    if location_element:
+        municipality = GetText(location_element)
+    if municipality == 'Desconocido' and title != 'None':
+        match = MUNICIPALITY_FROM_TITLE_RE.search(title)
+        if match:
+            municipality = match.group(1).strip()
+
+    # CARACTERÍSTICAS
+    hab = 'None'
+    m2 = 'None'
+    if ul_features:
+        for feature_li in ul_features.find_all('li', class_=lambda x: x and 'inline' in x):
+            text = GetText(feature_li)
+            if 'hab' in text:
+                hab = text
+            elif 'm²' in text:
+                m2 = text
+
+    # ENLACE
+    full_url = 'None'
+    link_element = panot_link or comprar_link
+    if link_element and link_element.has_attr('href'):
+        href = link_element['href']
+        full_url = 'https://www.fotocasa.es' + href if href.startswith('/') else href
+
+    return {
+        'Title': title,
+        'Description': GetText(desc_element) if desc_element else 'None',
+        'Price': price,
+        'hab': hab,
+        'm2': m2,
+        'Timeago': GetText(timeago_li) if timeago_li else 'None',
+        'Phone': phone_link['href'].replace('tel:', '') if phone_link else 'None',
+        'url': full_url,
+        'imgurl': img_element['src'] if img_element else 'None',
+        'Municipality': municipality,
+        # ANUNCIANTE (Por defecto Particular ya que filtramos por eso)
+        'Advertiser': 'Anunciante Particular'
+    }
+
+def extract_card_legacy(article):
+    """
+    Extractor original (una búsqueda `article.find` por campo).
+    Se conserva como referencia y fallback: FOTOCASA_EXTRACTOR=legacy.
+    """
+    # ⚠️ FILTRO CRÍTICO: Solo extraer anunciantes particulares
+    # Buscar el div con la imagen particular_user_icon.svg O el texto "Anunciante particular"
+    is_particular = False
+    
+    # Chequeo 1: Imagen
+    particular_img = article.find('img', {'src': lambda x: x and 'particular_user_icon.svg' in x})
+    
+    # Chequeo 2: Texto explícito
+    # Usamos raw string r"" para evitar advertencias de regex
+    particular_text = article.find(string=re.compile(r"Anunciante\s+particular", re.IGNORECASE))
+    
+    if particular_img or particular_text:
+        is_particular = True
+    
+    # Si no es particular, saltar este artículo
+    if not is_particular:
+        return None
+    
+    # PRECIO
+    price = 'None'
+    price_container = article.find('div', {'class': lambda x: x and 'text-display-3' in x})
+    if price_container:
+        price_span = price_container.find('span')
+        price = GetText(price_span)
     
-    # Buscar el contenedor principal
+    # TÍTULO
+    title = 'None'
+    h3_element = article.find('h3', {'class': lambda x: x and 'text-subhead' in x})
+    if h3_element:
+        title = GetText(h3_element)
+    
+    # Fallback Título
+    if title == 'None' or title == '':
+        link_text = article.find('a', {'class': 're-Card-title'})
+        if link_text:
+            title = GetText(link_text)
+
+    # MUNICIPIO (Intentar extraer del título o descripción si no hay campo explícito)
+    municipality = 'Desconocido'
+    
+    # Intento 1: Buscar elemento específico de dirección/ubicación
+    # Buscamos elementos que contengan 'address', 'location' o 'subtitle' en su clase
+    location_element = article.find(['span', 'div', 'h4'], {'class': lambda x: x and any(k in x for k in ['address', 'location', 'subtitle'])})
+    
+    if location_element:
+        municipality = GetText(location_element)
+    
+    # Intento 2: Extraer del título (ej: "Piso en Dénia" o "Piso en Calle X, Dénia")
+    if municipality == 'Desconocido' and title != 'None':
+        # Buscar " en " y tomar lo que sigue
+        match = re.search(r"\s+en\s+(.*)", title, re.IGNORECASE)
+        if match:
+            extracted = match.group(1).strip()
+            # Si hay comas, a veces el formato es "Calle, Municipio"
+            # Intentamos limpiar un poco
+            municipality = extracted
+    
+    # ANUNCIANTE (Por defecto Particular ya que filtramos por eso)
+    advertiser = 'Anunciante Particular'
+    
+    # DESCRIPCIÓN
+    description = 'None'
+    desc_element = article.find('p', {'class': lambda x: x and 'hidden' in x})
+    if desc_element:
+        description = GetText(desc_element)
+    
+    # CARACTERÍSTICAS
+    hab = 'None'
+    m2 = 'None'
+    ul_features = article.find('ul', {'class': lambda x: x and 'text-body-1' in x})
+    if ul_features:
+        features_list = ul_features.find_all('li', {'class': lambda x: x and 'inline' in x})
+        for feature_li in features_list:
+            text = GetText(feature_li)
+            if 'hab' in text:
+                hab = text
+            elif 'm²' in text:
+                m2 = text
+    
+    # FECHA
+    timeago = 'None'
+    timeago_li = article.find('li', {'class': lambda x: x and 'capitalize' in x})
+    if timeago_li:
+        timeago = GetText(timeago_li)
+    
+    # TELÉFONO
+    phone = 'None'
+    phone_link = article.find('a', {'href': lambda x: x and x.startswith('tel:')})
+    if phone_link:
+        phone = phone_link['href'].replace('tel:', '')
+    
+    # ENLACE
+    full_url = 'None'
+    link_element = article.find('a', {'data-panot-component': 'link-box-link'})
+    if not link_element:
+        link_element = article.find('a', {'href': lambda x: x and '/comprar/' in x})
+    
+    if link_element and link_element.has_attr('href'):
+        href = link_element['href']
+        full_url = 'https://www.fotocasa.es' + href if href.startswith('/') else href
+    
+    # IMAGEN
+    imgurl = 'None'
+    img_element = article.find('img', {'src': lambda x: x and 'fotocasa.es' in x})
+    if img_element and 'src' in img_element.attrs:
+        imgurl = img_element['src']
+    
+    # Solo añadir si tiene datos válidos
+    if title == 'None' or price == 'None':
+        return None
+
+    return {
+        'Title': title,
+        'Description': description,
+        'Price': price,
+        'hab': hab,
+        'm2': m2,
+        'Timeago': timeago,
+        'Phone': phone,
+        'url': full_url,
+        'imgurl': imgurl,
+        'Municipality': municipality,
+        'Advertiser': advertiser
+    }
+
+def find_listing_articles(soup):
+    """Retorna los `article` de #main-content (lista vacía si no existe)."""
     main_content = soup.find('section', {'id': 'main-content'})
     if not main_content:
         main_content = soup.find(id='main-content')
-    
     if not main_content:
-        # print("  ❌ No se encontró main-content")
+        return []
+    return main_content.find_all('article')
+
+def get_card_extractor(extractor=None):
+    """Extractor de tarjetas a usar: 'fast' (por defecto) o 'legacy' (FOTOCASA_EXTRACTOR)."""
+    extractor = extractor or os.environ.get('FOTOCASA_EXTRACTOR', 'fast')
+    return extract_card_legacy if extractor == 'legacy' else extract_card
+
+def skip_seen_properties(properties):
+    """Descarta los anuncios cuya URL ya está en el índice de URLs vistas."""
+    properties, skipped = drop_seen(properties)
+    if skipped:
+        print(f"  👁️ {skipped} anuncios ya vistos omitidos")
+    return properties
+
+def extract_properties_from_page(html_content, property_type, sort_by, parser=None, extractor=None, skip_seen=False):
+    """
+    Extrae propiedades de una página HTML, filtrando solo anuncios de particulares.
+    Con `skip_seen` omite también los anuncios ya vistos (seen_index).
+    """
+    soup = parse_listing_html(html_content, parser)
+    properties = []
+
+    # Buscar todos los artículos del contenedor principal
+    articles = find_listing_articles(soup)
+    if not articles:
         return properties
-    
-    # Buscar todos los artículos
-    articles = main_content.find_all('article')
     print(f"  ✅ Encontrados {len(articles)} artículos en el DOM")
-    
-    valid_count = 0
-    particular_count = 0
-    
-    for idx, article in enumerate(articles, 1):
+
+    extract = get_card_extractor(extractor)
+    for article in articles:
         try:
-            # ⚠️ FILTRO CRÍTICO: Solo extraer anunciantes particulares
-            # Buscar el div con la imagen particular_user_icon.svg O el texto "Anunciante particular"
-            is_particular = False
-            
-            # Chequeo 1: Imagen
-            particular_img = article.find('img', {'src': lambda x: x and 'particular_user_icon.svg' in x})
-            
-            # Chequeo 2: Texto explícito
-            # Usamos raw string r"" para evitar advertencias de regex
-            particular_text = article.find(string=re.compile(r"Anunciante\s+particular", re.IGNORECASE))
-            
-            if particular_img or particular_text:
-                is_particular = True
-                particular_count += 1
-            
-            # Si no es particular, saltar este artículo
-            if not is_particular:
-                continue
-            
-            # PRECIO
-            price = 'None'
-            price_container = article.find('div', {'class': lambda x: x and 'text-display-3' in x})
-            if price_container:
-                price_span = price_container.find('span')
-                price = GetText(price_span)
-            
-            # TÍTULO
-            title = 'None'
-            h3_element = article.find('h3', {'class': lambda x: x and 'text-subhead' in x})
-            if h3_element:
-                title = GetText(h3_element)
-            
-            # Fallback Título
-            if title == 'None' or title == '':
-                link_text = article.find('a', {'class': 're-Card-title'})
-                if link_text:
-                    title = GetText(link_text)
-
-            # MUNICIPIO (Intentar extraer del título o descripción si no hay campo explícito)
-            municipality = 'Desconocido'
-            
-            # Intento 1: Buscar elemento específico de dirección/ubicación
-            # Buscamos elementos que contengan 'address', 'location' o 'subtitle' en su clase
-            location_element = article.find(['span', 'div', 'h4'], {'class': lambda x: x and any(k in x for k in ['address', 'location', 'subtitle'])})
-            
-            if location_element:
-                municipality = GetText(location_element)
-            
-            # Intento 2: Extraer del título (ej: "Piso en Dénia" o "Piso en Calle X, Dénia")
-            if municipality == 'Desconocido' and title != 'None':
-                # Buscar " en " y tomar lo que sigue
-                match = re.search(r"\s+en\s+(.*)", title, re.IGNORECASE)
-                if match:
-                    extracted = match.group(1).strip()
-                    # Si hay comas, a veces el formato es "Calle, Municipio"
-                    # Intentamos limpiar un poco
-                    municipality = extracted
-            
-            # ANUNCIANTE (Por defecto Particular ya que filtramos por eso)
-            advertiser = 'Anunciante Particular'
-            
-            # DESCRIPCIÓN
-            description = 'None'
-            desc_element = article.find('p', {'class': lambda x: x and 'hidden' in x})
-            if desc_element:
-                description = GetText(desc_element)
-            
-            # CARACTERÍSTICAS
-            hab = 'None'
-            m2 = 'None'
-            ul_features = article.find('ul', {'class': lambda x: x and 'text-body-1' in x})
-            if ul_features:
-                features_list = ul_features.find_all('li', {'class': lambda x: x and 'inline' in x})
-                for feature_li in features_list:
-                    text = GetText(feature_li)
-                    if 'hab' in text:
-                        hab = text
-                    elif 'm²' in text:
-                        m2 = text
-            
-            # FECHA
-            timeago = 'None'
-            timeago_li = article.find('li', {'class': lambda x: x and 'capitalize' in x})
-            if timeago_li:
-                timeago = GetText(timeago_li)
-            
-            # TELÉFONO
-            phone = 'None'
-            phone_link = article.find('a', {'href': lambda x: x and x.startswith('tel:')})
-            if phone_link:
-                phone = phone_link['href'].replace('tel:', '')
-            
-            # ENLACE
-            full_url = 'None'
-            link_element = article.find('a', {'data-panot-component': 'link-box-link'})
-            if not link_element:
-                link_element = article.find('a', {'href': lambda x: x and '/comprar/' in x})
-            
-            if link_element and link_element.has_attr('href'):
-                href = link_element['href']
-                full_url = 'https://www.fotocasa.es' + href if href.startswith('/') else href
-            
-            # IMAGEN
-            imgurl = 'None'
-            img_element = article.find('img', {'src': lambda x: x and 'fotocasa.es' in x})
-            if img_element and 'src' in img_element.attrs:
-                imgurl = img_element['src']
-            
-            # Solo añadir si tiene datos válidos
-            if title != 'None' and price != 'None':
-                properties.append({
-                    'Title': title,
-                    'Description': description,
-                    'Price': price,
-                    'hab': hab,
-                    'm2': m2,
-                    'Timeago': timeago,
-                    'Phone': phone,
-                    'url': full_url,
-                    'imgurl': imgurl,
-                    'Municipality': municipality,
-                    'Advertiser': advertiser
-                })
-                valid_count += 1
-        
+            prop = extract(article)
         except Exception as e:
-            # print(f"  ⚠️ Error en artículo {idx}: {e}")
+            # print(f"  ⚠️ Error en artículo: {e}")
             continue
-    
-    # print(f"  ✅ {valid_count} propiedades válidas extraídas de {len(articles)} posibles")
+        if prop:
+            properties.append(prop)
+
+    if skip_seen:
+        properties = skip_seen_properties(properties)
+    return properties
+
+# --- Extracción desde el estado embebido (hidratación de la app) ---
+
+NEXT_DATA_RE = re.compile(r'<script[^>]+id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.DOTALL)
+STATE_JSON_PARSE_RE = re.compile(r'window\.(__INITIAL_PROPS__|__INITIAL_STATE__|__PRELOADED_STATE__)\s*=\s*JSON\.parse\(\s*("(?:[^"\\]|\\.)*")\s*\)', re.DOTALL)
+STATE_LITERAL_RE = re.compile(r'window\.(__INITIAL_PROPS__|__INITIAL_STATE__|__PRELOADED_STATE__)\s*=\s*(?=[{\[])')
+
+def extraction_mode():
+    """'dom' (por defecto) o 'state': intentar primero el JSON embebido (FOTOCASA_EXTRACTION_MODE)."""
+    return os.environ.get('FOTOCASA_EXTRACTION_MODE', 'dom').lower()
+
+def extract_embedded_state(html_content):
+    """Busca y decodifica el estado JSON embebido en la página. Retorna el objeto o None."""
+    match = NEXT_DATA_RE.search(html_content)
+    if match:
+        try:
+            return json.loads(match.group(1))
+        except ValueError:
+            pass
+
+    match = STATE_JSON_PARSE_RE.search(html_content)
+    if match:
+        try:
+            return json.loads(json.loads(match.group(2)))
+        except ValueError:
+            pass
+
+    match = STATE_LITERAL_RE.search(html_content)
+    if match:
+        try:
+            state, _ = json.JSONDecoder().raw_decode(html_content, match.end())
+            return state
+        except ValueError:
+            pass
+
+    return None
+
+def _looks_like_listing(item):
+    return isinstance(item, dict) and any(k in item for k in ('detail', 'url', 'detailUrl')) and \
+        any(k in item for k in ('price', 'rawPrice', 'transactions'))
+
+def find_listing_records(state):
+    """Localiza en el estado la lista más larga de objetos con pinta de anuncio."""
+    best = []
+    stack = [state]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            if node and len(node) > len(best) and all(_looks_like_listing(i) for i in node):
+                best = node
+            else:
+                stack.extend(node)
+    return best
+
+def _first(item, *keys):
+    for key in keys:
+        value = item.get(key) if isinstance(item, dict) else None
+        if value not in (None, '', [], {}):
+            return value
+    return None
+
+def _format_price(value):
+    if isinstance(value, (int, float)):
+        return f"{int(value):,}".replace(',', '.') + ' €'
+    return str(value).strip() if value else 'None'
+
+PARTICULAR_MARKERS = ('particular', 'private', 'privado')
+PROFESSIONAL_MARKERS = ('professional', 'profesional', 'agency', 'agencia', 'inmobiliaria', 'developer', 'promotor', 'company', 'empresa')
+
+def _advertiser_verdict(value):
+    """True/False según el texto del tipo de anunciante, None si no es reconocible."""
+    if not isinstance(value, str) or not value:
+        return None
+    lowered = value.lower()
+    if any(marker in lowered for marker in PARTICULAR_MARKERS):
+        return True
+    if any(marker in lowered for marker in PROFESSIONAL_MARKERS):
+        return False
+    return None
+
+def _state_is_particular(item):
+    """
+    True/False si el anuncio indica el tipo de anunciante, None si no se sabe.
+    Solo se miran claves propias del anunciante: `type`/`typeName` del anuncio
+    describen el inmueble ("Flat") y no dicen nada de quién lo publica.
+    """
+    advertiser = item.get('advertiser') if isinstance(item.get('advertiser'), dict) else {}
+    for source, keys in ((item, ('advertiserType', 'clientType')),
+                         (advertiser, ('advertiserType', 'clientType', 'type', 'typeName'))):
+        for key in ('isParticular', 'isPrivate', 'isPrivateAdvertiser'):
+            if isinstance(source.get(key), bool):
+                return source[key]
+        for key in keys:
+            verdict = _advertiser_verdict(source.get(key))
+            if verdict is not None:
+                return verdict
+    return None
+
+def map_state_listing(item):
+    """Convierte un anuncio del estado embebido al mismo registro que produce el DOM."""
+    detail = _first(item, 'detail', 'url', 'detailUrl')
+    if isinstance(detail, dict):
+        detail = _first(detail, 'es-ES', 'es', *detail.keys())
+    full_url = 'None'
+    if isinstance(detail, str) and detail:
+        full_url = 'https://www.fotocasa.es' + detail if detail.startswith('/') else detail
+
+    price = _first(item, 'price', 'rawPrice')
+    if price is None:
+        transactions = item.get('transactions') or []
+        if transactions and isinstance(transactions[0], dict):
+            values = transactions[0].get('value')
+            price = values[0] if isinstance(values, list) and values else values
+    if isinstance(price, dict):
+        price = _first(price, 'amount', 'value')
+
+    features = {}
+    for feature in item.get('features') or []:
+        if isinstance(feature, dict) and 'key' in feature:
+            value = feature.get('value')
+            features[feature['key']] = value[0] if isinstance(value, list) and value else value
+
+    address = item.get('address') if isinstance(item.get('address'), dict) else {}
+    location = address.get('location') if isinstance(address.get('location'), dict) else {}
+    municipality = _first(item, 'municipality', 'city') or _first(location, 'level5', 'level4') or \
+        _first(address, 'municipality', 'city') or 'Desconocido'
+
+    title = _first(item, 'title', 'name')
+    if not title:
+        typology = _first(item, 'buildingSubtype', 'buildingType', 'propertyType')
+        if typology and municipality != 'Desconocido':
+            title = f"{typology} en {municipality}"
+
+    advertiser = item.get('advertiser') if isinstance(item.get('advertiser'), dict) else {}
+    phone = _first(item, 'phone', 'contactPhone') or _first(advertiser, 'phone', 'contactPhone')
+
+    image = _first(item, 'image', 'imageUrl', 'mainImage')
+    for media in item.get('multimedia') or []:
+        if image:
+            break
+        if isinstance(media, dict) and media.get('src'):
+            image = media['src']
+
+    rooms = _first(features, 'rooms', 'bedrooms')
+    surface = _first(features, 'surface', 'size')
+
+    return {
+        'Title': str(title) if title else 'None',
+        'Description': str(_first(item, 'description') or 'None'),
+        'Price': _format_price(price),
+        'hab': f"{rooms} habs" if rooms is not None else 'None',
+        'm2': f"{surface} m²" if surface is not None else 'None',
+        'Timeago': str(_first(item, 'timeago', 'date', 'publicationDate') or 'None'),
+        'Phone': str(phone) if phone else 'None',
+        'url': full_url,
+        'imgurl': str(image) if image else 'None',
+        'Municipality': str(municipality),
+        'Advertiser': 'Anunciante Particular'
+    }
+
+def extract_properties_from_state(html_content):
+    """
+    Extrae los anuncios de particulares del estado JSON embebido.
+    Retorna None si no hay estado, no hay anuncios o no se puede clasificar
+    algún anuncio como de particular o profesional (en ese caso se usa el DOM).
+    """
+    state = extract_embedded_state(html_content)
+    if state is None:
+        return None
+
+    records = find_listing_records(state)
+    if not records:
+        return None
+
+    verdicts = [_state_is_particular(item) for item in records]
+    if any(v is None for v in verdicts):
+        return None
+
+    properties = []
+    for item, is_particular in zip(records, verdicts):
+        if not is_particular:
+            continue
+        try:
+            prop = map_state_listing(item)
+        except Exception:
+            continue
+        if prop['Title'] != 'None' and prop['Price'] != 'None':
+            properties.append(prop)
+
+    print(f"  ⚡ Estado embebido: {len(records)} anuncios, {len(properties)} de particulares")
     return properties
 
 def get_total_pages(driver):
@@ -578,129 +1056,472 @@ def construct_fotocasa_url(base_url, page_num, sort_by):
             return f"{base_url}/{page_num}?sortType={sort_by}"
         return f"{base_url}?sortType={sort_by}"
 
-def scrape_fotocasa_selenium(start_url, property_type, sort_by="publicationDate", max_pages=None):
+def scrape_listing_page(pool, page_url, property_type, sort_by, known_urls=None):
     """
-    Scraper principal que abre y cierra el navegador para cada página.
+    Carga una página de resultados con un navegador del pool y extrae sus propiedades.
+    Retorna (propiedades, fin_del_listado, casi_todo_conocido).
+
+    `casi_todo_conocido` solo se calcula con `known_urls` (modo incremental) y
+    se evalúa antes de omitir los anuncios ya vistos (SCRAPER_SKIP_SEEN).
+
+    Lanza SourceBlocked si el circuit breaker de Fotocasa está abierto y
+    BlockDetected si la página es un desafío o un bloqueo (el navegador se
+    recicla al salir de la sesión con error).
     """
-    all_properties = []
-    total_pages = 1
-    
-    # --- Fase 1: Obtener el número total de páginas ---
-    print(f"Iniciando scraping para: {property_type}...")
-    
-    driver = None
-    try:
-        driver = setup_driver(headless=False)  # Modo visible (necesario para detectar paginación)
-        
-        # Usar constructor de URL robusto
-        initial_url = construct_fotocasa_url(start_url, 1, sort_by)
-        
-        print(f"  🔍 Accediendo a: {initial_url}")
-        driver.get(initial_url)
+    guard = get_block_guard()
+    guard.check(page_url)
+    with pool.session() as driver:
+        wait = WebDriverWait(driver, 20)
+
+        driver.get(page_url)
         time.sleep(2)
+
+        # Siempre intentamos manejar cookies/modales (la sesión se limpia entre usos)
         handle_cookies(driver)
         handle_push_alert_modal(driver)
-        scroll_to_bottom(driver)
-        
-        # GUARDAR HTML PARA DEBUG EN RUTA SEGURA
-        import tempfile
-        debug_path = os.path.join(tempfile.gettempdir(), "fotocasa_debug_page.html")
-        try:
-            with open(debug_path, "w", encoding="utf-8") as f:
-                f.write(driver.page_source)
-            print(f"  🔍 HTML guardado en {debug_path} para revisión")
-        except Exception as e:
-            print(f"  ⚠️ No se pudo guardar HTML de debug: {e}")
-        
-        total_pages = get_total_pages(driver)
-        if max_pages and max_pages < total_pages:
-            total_pages = max_pages
-        print(f"Total de páginas a procesar: {total_pages}")
-        
-    except Exception as e:
-        print(f"Error en Fase 1: {e}")
-    finally:
-        if driver:
-            print("  🛑 Cerrando navegador (Fase 1)...")
-            try:
-                driver.quit()
-                print("  ✅ Navegador cerrado.")
-            except Exception as e:
-                print(f"  ⚠️ Error cerrando navegador: {e}")
 
-    # --- Fase 2: Scrapear cada página individualmente ---
-    
-    for page_num in range(1, total_pages + 1):
-        driver = None
-        try:
-            # Construcción de URL robusta
-            page_url = construct_fotocasa_url(start_url, page_num, sort_by)
-                
-            print(f"Procesando página {page_num}/{total_pages}...")
-            print(f"  🔗 URL: {page_url}")
+        reason = detect_block(driver, page_url)
+        if reason:
+            guard.report_block(page_url, reason, source='fotocasa')
+            raise BlockDetected(page_url, reason)
 
-            driver = setup_driver(headless=False)  # Modo visible
-            wait = WebDriverWait(driver, 20)
-            
-            driver.get(page_url)
-            time.sleep(2)
-            
-            # Siempre intentamos manejar cookies/modales por si acaso
-            handle_cookies(driver)
-            handle_push_alert_modal(driver)
+        # El estado embebido está completo antes del lazy-render: sin scroll ni esperas
+        properties = None
+        if extraction_mode() == 'state':
+            html_content = driver.page_source
+            if "No hay resultados" in html_content and len(driver.find_elements(By.TAG_NAME, "article")) == 0:
+                guard.report_success(page_url)
+                return [], True, False
+            properties = extract_properties_from_state(html_content)
+            if properties is not None:
+                network_stats.poll(driver)
+
+        if properties is None:
+            scroll_to_bottom(driver, adaptive=adaptive_scroll_enabled())
 
-            scroll_to_bottom(driver)
-            
             try:
                 wait.until(EC.presence_of_element_located((By.ID, "main-content")))
             except TimeoutException:
-                # print(f"  ⚠️ Timeout esperando contenido en página {page_num}.")
-                continue
+                # Sin contenido: posible bloqueo, reciclar la sesión
+                pool.mark_for_recycle(driver)
+                reason = detect_block(driver, page_url, expect_selector='#main-content')
+                if reason:
+                    guard.report_block(page_url, reason, source='fotocasa')
+                    raise BlockDetected(page_url, reason)
+                return [], False, False
 
             human_like_mouse_move(driver)
-            time.sleep(random.uniform(1, 3))
-            
+
             html_content = driver.page_source
-            
+            network_stats.poll(driver)
+
             if "No hay resultados" in html_content and len(driver.find_elements(By.TAG_NAME, "article")) == 0:
-                print("Fin del listado.")
-                break
-                
-            page_properties = extract_properties_from_page(html_content, property_type, sort_by)
-            
-            if page_properties:
-                all_properties.extend(page_properties)
-                print(f"Propiedades encontradas hasta ahora: {len(all_properties)}")
-            
-        except Exception as e:
-            print(f"Error procesando la página {page_num}: {e}")
-        finally:
-            if driver:
-                # print("  🛑 Cerrando navegador (Fase 2)...")
+                guard.report_success(page_url)
+                return [], True, False
+
+    if properties is None:
+        properties = extract_properties_from_page(html_content, property_type, sort_by)
+
+    guard.report_success(page_url)
+    mostly_known = known_urls is not None and page_is_mostly_known([p['url'] for p in properties], known_urls)
+    if skip_seen_enabled():
+        properties = skip_seen_properties(properties)
+    return properties, False, mostly_known
+
+def scrape_listing_page_retrying(pool, page_url, property_type, sort_by, known_urls, limiter):
+    """
+    scrape_listing_page esperando antes su turno en el limitador. Tras un
+    bloqueo se repite la página una vez (el limitador ya incluye el backoff);
+    si vuelve a bloquearse se lanza BlockDetected y la página queda pendiente.
+    """
+    for attempt in range(2):
+        limiter.wait(page_url)
+        try:
+            return scrape_listing_page(pool, page_url, property_type, sort_by, known_urls)
+        except BlockDetected as e:
+            if attempt > 0:
+                raise
+            print(f"  🚧 {e}; se reintenta la página una vez tras el backoff")
+
+def scrape_pages_concurrently(pool, start_url, total_pages, property_type, sort_by, workers, limiter=None, known_urls=None, writer=None, checkpoint=None):
+    """
+    Reparte las páginas 1..total_pages entre `workers` navegadores del pool.
+    Todos comparten el limitador por dominio, así que el ritmo de peticiones
+    no aumenta con el número de workers. Los resultados se unen en orden de página.
+
+    Con `known_urls` (modo incremental) una página formada casi solo por
+    anuncios conocidos se trata como el final del listado. Con `writer`
+    (NdjsonWriter o SqliteIngestWriter) cada página se publica en cuanto termina.
+    Con `checkpoint` se saltan las páginas ya completadas en una ejecución
+    anterior y cada página terminada queda registrada.
+
+    Las páginas se publican (writer y checkpoint) en orden de página, así que
+    las que quedan más allá del final del listado se descartan. Retorna
+    (propiedades, completo); `completo` es falso si alguna página quedó
+    pendiente, y entonces el checkpoint no debe cerrarse.
+
+    Si el circuit breaker de Fotocasa se abre, los workers se detienen y se
+    lanza SourceBlocked con las propiedades obtenidas en `properties`. Una
+    cancelación del trabajo (JobCancelled) detiene a todos los workers y se
+    relanza tras esperarlos.
+    """
+    if limiter is None:
+        limiter = get_rate_limiter()
+
+    pages = checkpoint.pending_pages(total_pages) if checkpoint else list(range(1, total_pages + 1))
+    pending = pages[::-1]  # pop() devuelve las páginas en orden
+    results = {}
+    failed = set()
+    state = {'end_page': None, 'blocked': None, 'error': None, 'next': 0}
+    all_properties = []
+    lock = threading.Lock()
+
+    def beyond_end(page_num):
+        return state['end_page'] is not None and page_num > state['end_page']
+
+    def publish(page_num):
+        page_properties, end_of_listing, mostly_known = results[page_num]
+        if writer is not None and page_properties:
+            writer.write(page_properties)
+            commit_page(writer, page_properties)
+        if checkpoint is not None:
+            checkpoint.page_done(page_num, page_properties, committed=writer is not None,
+                                 end_of_listing=end_of_listing or mostly_known)
+        all_properties.extend(page_properties)
+
+    def publish_ready():
+        # Se publica en orden de página y solo el tramo contiguo ya resuelto: así
+        # una página posterior al final del listado (que se conoce tarde) nunca
+        # llega al writer ni al checkpoint. Se llama con `lock` tomado.
+        while state['next'] < len(pages):
+            page_num = pages[state['next']]
+            if beyond_end(page_num) or (page_num not in results and page_num not in failed):
+                return
+            if page_num in results:
+                publish(page_num)
+            state['next'] += 1
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                page_num = pending.pop()
+                if beyond_end(page_num):
+                    return
+
+            page_url = construct_fotocasa_url(start_url, page_num, sort_by)
+            print(f"Procesando página {page_num}/{total_pages} ({threading.current_thread().name})...")
+            try:
+                outcome = scrape_listing_page_retrying(pool, page_url, property_type, sort_by, known_urls, limiter)
+            except SourceBlocked as e:
+                # Breaker abierto: ningún worker sigue; las páginas pendientes quedan en el checkpoint
+                with lock:
+                    state['blocked'] = e
+                    pending.clear()
+                return
+            except BlockDetected as e:
+                print(f"  🚧 {e}: la página {page_num} queda pendiente")
+                with lock:
+                    failed.add(page_num)
+                    publish_ready()
+                continue
+            except Exception as e:
+                print(f"Error procesando la página {page_num}: {e}")
+                with lock:
+                    failed.add(page_num)
+                    publish_ready()
+                continue
+            except BaseException as e:
+                # Cancelación del trabajo (JobCancelled) o interrupción: se detienen
+                # todos los workers y se relanza desde el hilo que los espera
+                with lock:
+                    state['error'] = e
+                    pending.clear()
+                return
+
+            page_properties, end_of_listing, mostly_known = outcome
+            with lock:
+                results[page_num] = outcome
+                if end_of_listing or mostly_known:
+                    if mostly_known:
+                        print(f"  ⏹️ Página {page_num} casi sin anuncios nuevos: fin del modo incremental.")
+                    else:
+                        print(f"Fin del listado en página {page_num}.")
+                    if state['end_page'] is None or page_num < state['end_page']:
+                        state['end_page'] = page_num
+                publish_ready()
+
+    threads = [threading.Thread(target=worker, name=f"worker-{i + 1}", daemon=True) for i in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if state['error'] is not None:
+        raise state['error']
+
+    # Las páginas que quedan tras un hueco (página fallida o no procesada por un
+    # bloqueo) se publican igualmente; el hueco sigue pendiente en el checkpoint.
+    with lock:
+        for page_num in pages[state['next']:]:
+            if page_num in results and not beyond_end(page_num):
+                publish(page_num)
+    complete = state['blocked'] is None and all(
+        page_num in results for page_num in pages if not beyond_end(page_num))
+
+    if state['blocked'] is not None:
+        # Lo extraído antes del bloqueo viaja con la excepción
+        state['blocked'].properties = all_properties
+        raise state['blocked']
+    return all_properties, complete
+
+def scrape_fotocasa_selenium(start_url, property_type, sort_by="publicationDate", max_pages=None, pool=None, workers=None, incremental=None, writer=None, resume=True, limiter=None):
+    """
+    Scraper principal. Reutiliza sesiones de navegador a través de un DriverPool
+    en lugar de abrir y cerrar el navegador para cada página.
+    Si no se pasa `pool`, se crea uno propio que se cierra al terminar.
+
+    Con `workers` > 1 (o SCRAPER_WORKERS) las páginas se reparten entre varios
+    navegadores en paralelo, limitado por CPU/RAM y por el tamaño del pool.
+
+    Con `incremental` y orden por fecha de publicación se deja de paginar en
+    cuanto una página está formada casi solo por anuncios ya conocidos (ver
+    known_listings). SCRAPER_INCREMENTAL, si está definida, tiene prioridad.
+
+    Con `writer` (ver open_results_writer) las propiedades de cada página se
+    publican al terminarla (segmento NDJSON o transacción en SQLite), sin
+    esperar al final.
+
+    Con `resume` (ver checkpoint, SCRAPER_RESUME) cada página terminada se
+    registra en un checkpoint del trabajo y, si una ejecución anterior quedó a
+    medias, se continúa desde la primera página sin terminar. Las propiedades
+    de esas páginas que no se habían publicado se incluyen en el resultado.
+
+    Todas las navegaciones pasan por el limitador por dominio (`limiter` o el
+    compartido del proceso, ver rate_limit) en lugar de pausas fijas entre
+    páginas, así que varios trabajos respetan un único ritmo por dominio.
+
+    Las páginas de desafío o bloqueo se detectan (ver block_detector) y se
+    reintentan una vez tras el backoff; si siguen bloqueadas quedan pendientes
+    en el checkpoint. Si el circuit breaker de Fotocasa se abre el trabajo se
+    detiene conservando el checkpoint y retorna lo obtenido.
+    """
+    if limiter is None:
+        limiter = get_rate_limiter()
+    checkpoint = open_checkpoint('fotocasa', start_url, property_type) if resume else None
+    all_properties = checkpoint.uncommitted_properties() if checkpoint else []
+    total_pages = 1
+
+    incremental = incremental_enabled(default=bool(incremental))
+    known_urls = load_known_urls('fotocasa.es') if incremental and sort_by == "publicationDate" else None
+
+    workers = max_browser_workers(workers)
+    network_stats.reset()
+    own_pool = pool is None
+    if own_pool:
+        pool = DriverPool(lambda: setup_driver(headless=False), size=workers)  # Modo visible (necesario para detectar paginación)
+    workers = min(workers, pool.size)
+
+    try:
+        # --- Fase 1: Obtener el número total de páginas ---
+        print(f"Iniciando scraping para: {property_type}...")
+
+        try:
+            # Usar constructor de URL robusto
+            initial_url = construct_fotocasa_url(start_url, 1, sort_by)
+            get_block_guard().check(initial_url)
+            with pool.session() as driver:
+                print(f"  🔍 Accediendo a: {initial_url}")
+                limiter.wait(initial_url)
+                driver.get(initial_url)
+                time.sleep(2)
+                handle_cookies(driver)
+                handle_push_alert_modal(driver)
+
+                reason = detect_block(driver, initial_url)
+                if reason:
+                    get_block_guard().report_block(initial_url, reason, source='fotocasa')
+                    raise BlockDetected(initial_url, reason)
+
+                scroll_to_bottom(driver, adaptive=adaptive_scroll_enabled())
+
+                # GUARDAR HTML PARA DEBUG EN RUTA SEGURA
+                import tempfile
+                debug_path = os.path.join(tempfile.gettempdir(), "fotocasa_debug_page.html")
                 try:
-                    driver.quit()
-                    # print("  ✅ Navegador cerrado.")
+                    with open(debug_path, "w", encoding="utf-8") as f:
+                        f.write(driver.page_source)
+                    print(f"  🔍 HTML guardado en {debug_path} para revisión")
                 except Exception as e:
-                    print(f"  ⚠️ Error cerrando navegador en Fase 2: {e}")
-            
-            # Pausa entre solicitudes
-            time.sleep(random.uniform(5, 10))
-            
+                    print(f"  ⚠️ No se pudo guardar HTML de debug: {e}")
+
+                total_pages = get_total_pages(driver)
+                if max_pages and max_pages < total_pages:
+                    total_pages = max_pages
+                print(f"Total de páginas a procesar: {total_pages}")
+
+        except SourceBlocked:
+            raise
+        except Exception as e:
+            print(f"Error en Fase 1: {e}")
+            if checkpoint and checkpoint.total_pages:
+                total_pages = checkpoint.total_pages
+
+        if checkpoint:
+            checkpoint.set_total_pages(total_pages)
+            first_pending = checkpoint.first_pending(total_pages)
+            if checkpoint.resumed and first_pending:
+                print(f"  ♻️ Continuando desde la página {first_pending}/{total_pages}")
+
+        # --- Fase 2: Scrapear cada página reutilizando el navegador ---
+
+        if workers > 1 and total_pages > 1:
+            print(f"  ⚡ Modo paralelo: {workers} navegadores")
+            page_properties, complete = scrape_pages_concurrently(pool, start_url, total_pages, property_type, sort_by, workers, limiter=limiter, known_urls=known_urls, writer=writer, checkpoint=checkpoint)
+            all_properties += page_properties
+            print(f"Propiedades encontradas: {len(all_properties)}")
+            if checkpoint and complete:
+                checkpoint.finish()
+            return all_properties
+
+        pages = checkpoint.pending_pages(total_pages) if checkpoint else range(1, total_pages + 1)
+        incomplete = False
+        for page_num in pages:
+            try:
+                # Construcción de URL robusta
+                page_url = construct_fotocasa_url(start_url, page_num, sort_by)
+
+                print(f"Procesando página {page_num}/{total_pages}...")
+                print(f"  🔗 URL: {page_url}")
+
+                page_properties, end_of_listing, mostly_known = scrape_listing_page_retrying(pool, page_url, property_type, sort_by, known_urls, limiter)
+
+                if end_of_listing:
+                    print("Fin del listado.")
+                    if checkpoint:
+                        checkpoint.page_done(page_num, [], committed=True, end_of_listing=True)
+                    break
+
+                if page_properties:
+                    all_properties.extend(page_properties)
+                    print(f"Propiedades encontradas hasta ahora: {len(all_properties)}")
+                    if writer is not None:
+                        writer.write(page_properties)
+                        commit_page(writer, page_properties)
+                if checkpoint:
+                    checkpoint.page_done(page_num, page_properties, committed=writer is not None, end_of_listing=mostly_known)
+
+                if mostly_known:
+                    print(f"  ⏹️ Página {page_num} casi sin anuncios nuevos: fin del modo incremental.")
+                    break
+
+            except SourceBlocked:
+                raise
+            except BlockDetected as e:
+                print(f"  🚧 {e}: la página {page_num} queda pendiente")
+                incomplete = True
+            except Exception as e:
+                print(f"Error procesando la página {page_num}: {e}")
+                incomplete = True
+
+        if checkpoint and not incomplete:
+            checkpoint.finish()
+
+    except SourceBlocked as e:
+        all_properties += getattr(e, 'properties', [])
+        print(f"  ⛔ {e}: trabajo detenido, se reanudará desde el checkpoint")
+
+    finally:
+        # Solo contiene las páginas ya publicadas por el writer (ver commit_page);
+        # sin writer las URLs se registran en save_results tras guardar el JSON
+        flush_seen_index()
+        if own_pool:
+            print("  🛑 Cerrando navegadores del pool...")
+            pool.close()
+        print(f"  {pool.report()}")
+        lean_report = network_stats.report()
+        if lean_report:
+            print(f"  {lean_report}")
+        rate_report = limiter.report()
+        if rate_report:
+            print(f"  {rate_report}")
+        block_report = get_block_guard().report()
+        if block_report:
+            print(f"  {block_report}")
+
     return all_properties
 
-import json
 from datetime import datetime
-import uuid
+
+def open_results_writer(property_type, location, output_dir):
+    """
+    Escritor de resultados por página: ingesta directa en SQLite si
+    SCRAPER_DIRECT_INGEST=1, NDJSON en streaming si SCRAPER_OUTPUT_FORMAT=ndjson,
+    si no None (en ese caso se guarda todo al final con save_to_json).
+    """
+    if direct_ingest_enabled():
+        return SqliteIngestWriter('fotocasa', property_type, location)
+    if output_format() != 'ndjson':
+        return None
+    timestamp = int(datetime.now().timestamp() * 1000)
+    return NdjsonWriter(output_dir, f'fotocasa_{property_type}_{location}_{timestamp}', 'fotocasa', property_type, location)
+
+def remember_saved(properties):
+    """Registra en el índice de URLs vistas (modo incremental y SCRAPER_SKIP_SEEN) propiedades ya guardadas."""
+    try:
+        remember_urls([p['url'] for p in properties], source='fotocasa')
+    except Exception as e:
+        print(f"  ⚠️ No se pudo actualizar el índice de URLs vistas: {e}")
+
+def flush_seen_index():
+    try:
+        get_seen_index().flush()
+    except Exception as e:
+        print(f"  ⚠️ No se pudo guardar el índice de URLs vistas: {e}")
+
+def commit_page(writer, page_properties):
+    """
+    Publica la página con el writer y, si se publicó, marca sus anuncios como
+    vistos. Marcarlos antes haría que SCRAPER_SKIP_SEEN los descartara para
+    siempre si el guardado falla o el trabajo se interrumpe.
+    """
+    if writer.commit() is not None:
+        remember_saved(page_properties)
+
+def save_results(properties, property_type, location, output_dir, writer=None):
+    """
+    Cierra el escritor (publicando lo pendiente) o guarda el JSON completo.
+    Lo que se guarda en JSON se marca como visto solo tras escribirlo.
+    """
+    if isinstance(writer, SqliteIngestWriter):
+        fallback = writer.close()
+        print(f"Datos insertados en SQLite ({writer.inserted} nuevas, {writer.updated} actualizadas)")
+        if fallback:
+            # Lo que no se pudo ingerir va al JSON de siempre
+            save_to_json(fallback, property_type=property_type, location=location, output_dir=output_dir)
+            remember_saved(fallback)
+            flush_seen_index()
+        return
+    if writer is not None:
+        writer.close()
+        print(f"Datos guardados en {len(writer.committed)} segmentos NDJSON ({writer.total_records} propiedades)")
+        return
+    save_to_json(properties, property_type=property_type, location=location, output_dir=output_dir)
+    remember_saved(properties)
+    flush_seen_index()
 
 def save_to_json(properties, property_type, location, output_dir):
-    """Guarda la lista de propiedades en un archivo JSON con un ID único por propiedad."""
+    """
+    Guarda la lista de propiedades en un archivo JSON. Cada propiedad recibe
+    un ID estable derivado de su URL (el mismo anuncio, el mismo ID) y los
+    duplicados dentro del lote se descartan.
+    """
     if not properties:
         print("No hay propiedades para guardar.")
         return
 
-    # Añadir un ID único a cada propiedad
-    for prop in properties:
-        prop['id'] = str(uuid.uuid4())
+    properties = assign_listing_ids(properties)
 
     # Crear estructura final
     output_data = {
@@ -0,0 +1,137 @@
+# coding: utf-8
+
+"""
+Comprueba la paridad y mide el rendimiento de la extracción de Fotocasa
+sobre páginas HTML guardadas: backends de parser y extractores de tarjetas.
+
+Uso:
+    python benchmark_extraction.py [pagina1.html pagina2.html ...] [--repeat N]
+
+Sin argumentos usa la página de debug que guarda la Fase 1 del scraper
+(fotocasa_debug_page.html en el directorio temporal).
+
+Para cada backend de BeautifulSoup disponible (html5lib, lxml, html.parser)
+compara las propiedades extraídas con las de html5lib (referencia) y muestra
+el tiempo medio por página. Después compara el extractor de tarjetas de una
+pasada (extract_card) con el original (extract_card_legacy) y muestra
+tarjetas por segundo de cada uno. Sale con código 1 si algo no coincide.
+
+La misma paridad se comprueba de forma repetible sobre una página fija en
+tests/test_fotocasa_extraction.py (python -m unittest discover -s tests).
+"""
+
+import io
+import os
+import sys
+import time
+import tempfile
+import argparse
+from contextlib import redirect_stdout
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from Fotocasa_scraping_selenium import (
+    extract_properties_from_page,
+    parse_listing_html,
+    find_listing_articles,
+    extract_card,
+    extract_card_legacy
+)
+
+REFERENCE_PARSER = 'html5lib'
+CANDIDATE_PARSERS = ['html5lib', 'lxml', 'html.parser']
+
+
+def available_parsers():
+    parsers = []
+    for parser in CANDIDATE_PARSERS:
+        try:
+            if parser == 'lxml':
+                import lxml  # noqa: F401
+            elif parser == 'html5lib':
+                import html5lib  # noqa: F401
+            parsers.append(parser)
+        except ImportError:
+            print(f"⚠️ Backend {parser} no instalado, se omite.")
+    return parsers
+
+
+def timed_extract(html, parser, repeat):
+    """Extrae `repeat` veces y retorna (propiedades, segundos por página)."""
+    properties = None
+    started = time.perf_counter()
+    for _ in range(repeat):
+        with redirect_stdout(io.StringIO()):
+            properties = extract_properties_from_page(html, 'benchmark', 'publicationDate', parser=parser)
+    return properties, (time.perf_counter() - started) / repeat
+
+
+def timed_cards(articles, extract, repeat):
+    """Aplica `extract` a todas las tarjetas `repeat` veces y retorna (resultados, tarjetas/s)."""
+    results = None
+    started = time.perf_counter()
+    for _ in range(repeat):
+        results = [extract(article) for article in articles]
+    elapsed = time.perf_counter() - started
+    return results, (len(articles) * repeat / elapsed) if elapsed else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridad y rendimiento de extract_properties_from_page")
+    parser.add_argument('pages', nargs='*', help="Ficheros HTML guardados")
+    parser.add_argument('--repeat', type=int, default=5, help="Repeticiones por página y backend")
+    args = parser.parse_args()
+
+    pages = args.pages or [os.path.join(tempfile.gettempdir(), "fotocasa_debug_page.html")]
+    pages = [p for p in pages if os.path.exists(p)]
+    if not pages:
+        print("❌ No hay páginas HTML guardadas para comparar.")
+        sys.exit(1)
+
+    parsers = available_parsers()
+    mismatches = 0
+    totals = {p: 0.0 for p in parsers}
+
+    for page in pages:
+        with open(page, 'r', encoding='utf-8') as f:
+            html = f.read()
+        print(f"\n📄 {os.path.basename(page)} ({len(html) / 1024:.0f} KB)")
+
+        reference, _ = timed_extract(html, REFERENCE_PARSER, 1)
+        for backend in parsers:
+            properties, seconds = timed_extract(html, backend, args.repeat)
+            totals[backend] += seconds
+            same = properties == reference
+            if not same:
+                mismatches += 1
+            print(f"  {'✅' if same else '❌'} {backend:<12} {seconds * 1000:8.1f} ms/página  {len(properties)} propiedades")
+
+    print("\n⏱️ Media por página:")
+    for backend in parsers:
+        print(f"  {backend:<12} {totals[backend] / len(pages) * 1000:8.1f} ms")
+
+    # Extractores de tarjetas sobre el árbol ya parseado (sin coste de parseo)
+    articles = []
+    for page in pages:
+        with open(page, 'r', encoding='utf-8') as f:
+            articles.extend(find_listing_articles(parse_listing_html(f.read())))
+    if articles:
+        legacy, legacy_rate = timed_cards(articles, extract_card_legacy, args.repeat)
+        fast, fast_rate = timed_cards(articles, extract_card, args.repeat)
+        same = legacy == fast
+        if not same:
+            mismatches += 1
+        print(f"\n🃏 Extracción de {len(articles)} tarjetas:")
+        print(f"  legacy       {legacy_rate:10.0f} tarjetas/s")
+        print(f"  una pasada   {fast_rate:10.0f} tarjetas/s  (x{fast_rate / legacy_rate if legacy_rate else 0:.1f})  {'✅' if same else '❌'}")
+
+    if mismatches:
+        print(f"\n❌ {mismatches} resultados no coinciden con la referencia")
+        sys.exit(1)
+    print("\n✅ Todos los backends y extractores producen las mismas propiedades")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# coding: utf-8
+
+"""
+Scraper automático de Fotocasa para varios tipos de propiedad a la vez.
+
+Antes el servidor lanzaba run_viviendas_auto.py, run_terrenos_auto.py y
+run_locales_auto.py uno detrás de otro, cada uno con su intérprete y su
+navegador, así que un ciclo completo tardaba la suma de los tres. Este script
+recibe una lista de trabajos y los ejecuta en paralelo en un único proceso:
+
+- un DriverPool compartido (los navegadores se reutilizan entre trabajos)
+- el limitador por dominio compartido (rate_limit): el ritmo de peticiones
+  a fotocasa.es es el mismo que con un solo trabajo, pero los tiempos de
+  carga, scroll y extracción de cada tipo se solapan con los de los demás
+- un conjunto de resultados por tipo, con los nombres de fichero de siempre
+  (fotocasa_<tipo>_varios_<timestamp>.json, segmentos NDJSON o SQLite)
+
+Uso:
+    python run_auto_scrapers.py [viviendas terrenos locales] [--max-pages N] [--jobs trabajos.json]
+
+Sin tipos se ejecutan los tres. `--jobs` acepta un JSON con una lista de
+trabajos {"property_type", "start_url"?, "max_pages"?, "location"?}.
+
+Configuración:
+- SCRAPER_AUTO_WORKERS: navegadores del pool compartido (por defecto uno por
+  trabajo, limitado por CPU/RAM como en max_browser_workers)
+- PROPERTIES_OUTPUT_DIR: directorio de salida de los JSON/NDJSON
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Asegurar que el directorio actual está en el path para importar módulos locales
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from Fotocasa_scraping_selenium import setup_driver, scrape_fotocasa_selenium, open_results_writer, save_results
+from driver_pool import DriverPool, max_browser_workers
+from rate_limit import get_rate_limiter
+
+AUTO_TYPES = ['viviendas', 'terrenos', 'locales']
+
+# Zona de búsqueda (Comunitat Valenciana) común a todos los tipos
+SEARCH_QUERY = "searchArea=0g7kjqiic9s4C-nyV0-gexk2nBlm9qB-nyV-n_d-nyV562M0-ge562M57vHnoWgwuH0tx1D1t97Blpi9Cu_5hDi3mzD6nq_TgjzzGuts1F4l71c0iv-H46g4Hvi3-H4kxvF52o4Hqk0_G543vF-osmGq_o6E4uxzD27syChgqzBqx8rEww5MktxTy31Vy9xHyn5C09xHmmqG1xwHozwRy9xH-8uzF4pwTv8mZoxlgC58kgGyrolBozwRq5rzBlhnLwm8Mx0nmCmzlBnoW9hlBp1_IzsuQ517Ikg1Owl9I9hlB_p0D01WmzlBnoW_p0D472bri6Cxo1DmmqGqxngClsnqCzwhvD0kk_Cp0quC44hkCmtnxDg10kDkp8sGtwh0dl7t0H2on-Tsv97P531D2qrsEwgiqY8-uwFoym_CuxpgCt30T482Vk5hhFnxlgC2nwiD8oxuC2nwiDwxpgCisvzBj_loBlvmegg_MskyOtn5VjhnrBz0ruBtn5Vy5_Xtn5Vy5_Xzt8Ix-x6Bzt8Iy22Dzt8Iu4zuE14zxB4nouB47g2DhtvQ4_1Os99I4nouBn8r7C9p8oEgu-wD_n6rC0hvuBskyOs99Im50D764jBt8_9Bs99I6mqas99I03sK1koZumvTl7netyysLm_puBsv5gBrxmuBysuQ6to6B2ggYvl9I0xwH_izOksy2Csv5gBjsqlhBtriex31V_izOitzVz9xH7qvyFrxmuBri4rCr91-C8663HqgyxB3k21Kpi4rCjtt_Ki1k3Q_gx-Chos6B2kjuBvjirBktzVsv5gB4z-dsv5gBvh3nCy6_qBv-mjd82nuNq_-6C3yunC3qr4N_gx-Cvll-Ms2toE1pz1Dm3zrCt7g_B7z2gBok7X417Iok7Xvl9I7lvHvl9IwrzDvl9I_ovOk-zE9uWvl9I7lvH3sujBty9Xk-zE5rsQvl9I39upB417I79rKyhW8h4pCvl9I58yEwo1D2mtSwrzDgl7sK&sortType=publicationDate&zoom=10"
+
+
+def auto_start_url(property_type):
+    """URL de inicio de la búsqueda automática de un tipo en Comunitat Valenciana."""
+    return f"https://www.fotocasa.es/es/comprar/{property_type}/comunitat-valenciana/todas-las-zonas/l?{SEARCH_QUERY}"
+
+
+def get_output_dir():
+    """Directorio de salida desde PROPERTIES_OUTPUT_DIR o data/properties del proyecto."""
+    output_dir = os.environ.get('PROPERTIES_OUTPUT_DIR')
+    if not output_dir:
+        output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "properties")
+    return output_dir
+
+
+def build_jobs(types=None, max_pages=1, jobs_file=None):
+    """Lista de trabajos a partir de los tipos indicados o de un fichero JSON de trabajos."""
+    if jobs_file:
+        with open(jobs_file, 'r', encoding='utf-8') as f:
+            specs = json.load(f)
+    else:
+        specs = [{'property_type': t} for t in (types or AUTO_TYPES)]
+
+    jobs = []
+    for spec in specs:
+        property_type = spec['property_type']
+        jobs.append({
+            'property_type': property_type,
+            'start_url': spec.get('start_url') or auto_start_url(property_type),
+            'max_pages': spec.get('max_pages', max_pages),
+            'location': spec.get('location', 'varios'),
+        })
+    return jobs
+
+
+class _TaggedOutput:
+    """
+    stdout compartido por los trabajos: cada línea se prefija con el tipo del
+    trabajo que la escribe, para que los logs en paralelo sigan siendo legibles.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def set_tag(self, tag):
+        """Prefijo de las líneas del hilo actual (None: sin prefijo). Vacía lo pendiente del anterior."""
+        pending = getattr(self._local, 'buffer', '')
+        if pending:
+            self.write('\n')
+        self._local.tag = tag
+        self._local.buffer = ''
+
+    def write(self, text):
+        tag = getattr(self._local, 'tag', None)
+        if tag is None:
+            with self._lock:
+                return self.stream.write(text)
+        self._local.buffer += text
+        *lines, self._local.buffer = self._local.buffer.split('\n')
+        if lines:
+            with self._lock:
+                for line in lines:
+                    self.stream.write(f"[{tag}] {line}\n")
+                self.stream.flush()
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def run_job(job, pool, limiter, output_dir, output=None):
+    """Ejecuta un trabajo con el pool y el limitador compartidos. Retorna el número de propiedades."""
+    property_type = job['property_type']
+    if output is not None:
+        output.set_tag(property_type)
+    try:
+        return _run_job(job, pool, limiter, output_dir)
+    finally:
+        if output is not None:
+            output.set_tag(None)
+
+
+def _run_job(job, pool, limiter, output_dir):
+    property_type = job['property_type']
+    started = time.time()
+
+    # Con SCRAPER_OUTPUT_FORMAT=ndjson cada página se publica al terminarla
+    writer = open_results_writer(property_type, job['location'], output_dir)
+    properties = scrape_fotocasa_selenium(
+        job['start_url'], property_type=property_type, sort_by="publicationDate",
+        max_pages=job['max_pages'], pool=pool, workers=1, incremental=True,
+        writer=writer, limiter=limiter
+    )
+
+    if properties:
+        try:
+            print(f"💾 Guardando {len(properties)} propiedades en: {output_dir}")
+            save_results(properties, property_type=property_type, location=job['location'], output_dir=output_dir, writer=writer)
+        except Exception as e:
+            print(f"❌ Error guardando JSON local: {e}")
+    else:
+        if writer:
+            writer.close()
+        print("No se encontraron propiedades de particulares para guardar.")
+
+    print(f"El proceso de scraping ha tardado {time.time() - started:.2f} segundos.")
+    return len(properties or [])
+
+
+def run_auto_scrapers(jobs, output_dir=None):
+    """
+    Ejecuta los trabajos en paralelo con un pool de navegadores y un limitador
+    por dominio compartidos. Retorna {tipo: propiedades encontradas o None si falló}.
+    """
+    output_dir = output_dir or get_output_dir()
+    requested = os.environ.get('SCRAPER_AUTO_WORKERS')
+    workers = max_browser_workers(int(requested) if requested and requested.isdigit() else len(jobs))
+    pool = DriverPool(lambda: setup_driver(headless=False), size=workers)  # Modo visible (necesario para detectar paginación)
+    limiter = get_rate_limiter()
+
+    output = _TaggedOutput(sys.stdout)
+    previous_stdout, sys.stdout = sys.stdout, output
+    results = {}
+    started = time.time()
+    try:
+        print(f"🚀 {len(jobs)} trabajos en paralelo con {pool.size} navegadores: {', '.join(j['property_type'] for j in jobs)}")
+        with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix='auto') as executor:
+            futures = {executor.submit(run_job, job, pool, limiter, output_dir, output): job for job in jobs}
+            for future, job in futures.items():
+                try:
+                    results[job['property_type']] = future.result()
+                except Exception as e:
+                    print(f"❌ Error en el trabajo {job['property_type']}: {e}")
+                    results[job['property_type']] = None
+    finally:
+        print("🛑 Cerrando navegadores del pool...")
+        pool.close()
+        print(pool.report())
+        sys.stdout = previous_stdout
+
+    print(f"✅ Ciclo automático completado en {time.time() - started:.2f} segundos: "
+          + ", ".join(f"{t}={'error' if n is None else n}" for t, n in results.items()))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scraper automático de Fotocasa (varios tipos en paralelo)")
+    parser.add_argument('types', nargs='*', help=f"Tipos de propiedad: {', '.join(AUTO_TYPES)} (por defecto todos)")
+    parser.add_argument('--max-pages', type=int, default=1, help="Páginas por tipo (1 por defecto)")
+    parser.add_argument('--jobs', help="Fichero JSON con la lista de trabajos")
+    args = parser.parse_args(argv)
+    unknown = [t for t in args.types if t not in AUTO_TYPES]
+    if unknown:
+        parser.error(f"tipos desconocidos: {', '.join(unknown)}")
+
+    jobs = build_jobs(args.types, args.max_pages, args.jobs)
+    if not jobs:
+        print("No hay trabajos que ejecutar.")
+        return 0
+    results = run_auto_scrapers(jobs)
+    return 1 if any(n is None for n in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
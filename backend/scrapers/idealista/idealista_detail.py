@@ -0,0 +1,270 @@
+# coding: utf-8
+
+"""
+Motor de extracción de campos de las páginas de detalle de Idealista.
+
+En lugar de probar cada selector con su propio find_element/WebDriverWait,
+un único script en el navegador recoge todos los valores candidatos (nombre
+del anunciante, precio, descripción, ubicación, imagen, fechas, botón de
+teléfono...) y las reglas de prioridad se aplican aquí en Python. La única
+ida y vuelta adicional es el clic para revelar el teléfono.
+
+Lo usan `run_idealista_scraper.extract_detail_data` y
+`run_idealista_single.scrape_single_url`.
+"""
+
+import re
+import sys
+
+NAME_SELECTORS = [
+    '.professional-name .name',
+    '.advertiser-name',
+    '.contact-data .name',
+    '.about-advertiser-name',
+    '.contact-name',
+    'div.name',
+    '.advertiser-data__name',
+    '.contact-data__name',
+    '#advertiserName',
+    'div[class*="advertiser-name"]',
+    '.advertiser-data .name',
+    '.contact-detail .name'
+]
+
+PHONE_BUTTON_SELECTORS = ["a.see-phones-btn", "button.see-phones-btn", ".phone-cta", "button.btn-phone", ".contact-phones-btn", ".more-info-phone"]
+
+# Botón localizado por texto cuando fallan los selectores CSS
+PHONE_BUTTON_XPATH = "//button[contains(., 'teléfono') or contains(., 'Call')]"
+
+TEL_SELECTOR = "a[href^='tel:']"
+
+PHONE_TEXT_SELECTORS = [
+    ".phone-number-block p",
+    ".phone",
+    ".contact-phones",
+    ".first-phone",
+    ".phone-number-block div",
+    ".phone-number-block span",
+    TEL_SELECTOR,
+    ".contact-phone",
+    ".phone-cta",
+    ".contact-phones-btn"
+]
+
+# Texto visible como lo devuelve WebElement.text ('' si el elemento no se pinta)
+_VISIBLE_TEXT_JS = """
+function visibleText(el) {
+    if (!el || !el.getClientRects().length) return '';
+    var style = window.getComputedStyle(el);
+    if (style.visibility === 'hidden' || style.display === 'none') return '';
+    return (el.innerText || '').trim();
+}
+function firstText(selector) {
+    var el = document.querySelector(selector);
+    return el ? visibleText(el) : null;
+}
+function firstAttr(selector, prop) {
+    var el = document.querySelector(selector);
+    return el ? (el[prop] || '') : null;
+}
+"""
+
+# arguments: nameSelectors, buttonSelectors, buttonXPath (o null), waitMs, callback
+COLLECT_FIELDS_JS = _VISIBLE_TEXT_JS + """
+var nameSelectors = arguments[0], buttonSelectors = arguments[1], buttonXPath = arguments[2],
+    waitMs = arguments[3], done = arguments[arguments.length - 1];
+
+var prof = document.querySelector('.professional-name');
+var profName = prof ? prof.querySelector('.name') : null;
+var professionalName = profName ? visibleText(profName) : null;
+var hasParticularText = document.documentElement.outerHTML.indexOf('Particular') !== -1;
+var isParticular = professionalName !== null
+    ? professionalName.toLowerCase().indexOf('particular') !== -1
+    : hasParticularText;
+
+function findButton() {
+    for (var i = 0; i < buttonSelectors.length; i++) {
+        var el = document.querySelector(buttonSelectors[i]);
+        if (el) return [buttonSelectors[i], el];
+    }
+    return null;
+}
+
+function collect(found) {
+    if (!found && buttonXPath) {
+        var node = document.evaluate(buttonXPath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        if (node) found = ['xpath', node];
+    }
+    window.__idealistaPhoneButton = found ? found[1] : null;
+    var userInput = document.querySelector('.particular input[name="user-name"]');
+    done({
+        professionalName: professionalName,
+        hasParticularText: hasParticularText,
+        userNameInput: userInput ? userInput.value : null,
+        names: nameSelectors.map(function (sel) {
+            return [sel, Array.from(document.querySelectorAll(sel)).map(visibleText)];
+        }),
+        documentTitle: document.title,
+        mainTitle: firstText('.main-info__title-main'),
+        price: firstText('.info-data-price span'),
+        description: firstText('.comment'),
+        location: firstText('#headerMap'),
+        mainImage: firstAttr('.main-image img', 'src'),
+        gridImage: firstAttr('img.main-image_img', 'src'),
+        dateUpdate: firstText('.details-box.date-update-block .date-update-text'),
+        stats: firstText('.stats-text'),
+        phoneButton: found ? found[0] : null
+    });
+}
+
+// En páginas de agencia no hace falta esperar al botón de teléfono
+if (!isParticular) { collect(null); return; }
+
+var started = Date.now();
+(function poll() {
+    var found = findButton();
+    if (found || Date.now() - started >= waitMs) { collect(found); return; }
+    setTimeout(poll, 250);
+})();
+"""
+
+# arguments: textSelectors, telSelector, callback
+REVEAL_PHONE_JS = _VISIBLE_TEXT_JS + """
+var textSelectors = arguments[0], telSelector = arguments[1], done = arguments[arguments.length - 1];
+var button = window.__idealistaPhoneButton;
+if (!button) { done({clicked: false, candidates: []}); return; }
+
+button.scrollIntoView(true);
+setTimeout(function () {
+    try { button.click(); } catch (e) { done({clicked: false, candidates: []}); return; }
+    // Esperar a que cargue el teléfono
+    setTimeout(function () {
+        done({
+            clicked: true,
+            candidates: textSelectors.map(function (sel) {
+                var elems = Array.from(document.querySelectorAll(sel));
+                return [sel, sel === telSelector
+                    ? elems.map(function (el) { return el.href || ''; })
+                    : elems.map(visibleText)];
+            })
+        });
+    }, 3000);
+}, 1000);
+"""
+
+
+def collect_detail_fields(driver, name_selectors=None, button_selectors=None, button_xpath=None, button_wait=3):
+    """
+    Recoge en una sola llamada todos los campos candidatos de la página de
+    detalle ya cargada. Si la página es de particular espera hasta
+    `button_wait` segundos a que aparezca el botón de teléfono.
+    """
+    return driver.execute_async_script(
+        COLLECT_FIELDS_JS,
+        name_selectors or NAME_SELECTORS,
+        button_selectors or PHONE_BUTTON_SELECTORS,
+        button_xpath,
+        int(button_wait * 1000)
+    )
+
+
+def is_particular(fields):
+    """Anuncio de particular: el nombre del anunciante lo indica o, si no hay nombre, la página lo menciona."""
+    name = fields.get('professionalName')
+    if name is not None:
+        return "particular" in name.lower()
+    return bool(fields.get('hasParticularText'))
+
+
+def resolve_contact_name(fields, verbose=False):
+    """Aplica las reglas de prioridad sobre los nombres candidatos recogidos."""
+    contact_name = "Particular"
+
+    # Si encontramos un nombre al principio que contiene "Particular", intentamos limpiarlo
+    initial_name_found = fields.get('professionalName') or ""
+    if initial_name_found and len(initial_name_found) > 10:
+        cleaned = initial_name_found.replace("Particular", "").replace("particular", "").replace("()", "").strip()
+        if len(cleaned) > 2:
+            contact_name = cleaned
+
+    # 0. Input oculto en .particular
+    val = fields.get('userNameInput')
+    if val and len(val) > 2:
+        contact_name = val.strip()
+        sys.stderr.write(f"    🔍 Nombre encontrado por input hidden: {contact_name}\n")
+
+    candidate_name = None
+    for selector, texts in fields.get('names') or []:
+        for extracted_name in texts:
+            extracted_name = (extracted_name or "").strip()
+            if not extracted_name or len(extracted_name) <= 2:
+                continue
+            if verbose:
+                sys.stderr.write(f"    🔍 Candidato nombre encontrado ({selector}): {extracted_name}\n")
+
+            # Prioridad: Nombre sin "particular"
+            if "particular" not in extracted_name.lower():
+                contact_name = extracted_name
+                break
+            elif extracted_name.lower() != "particular":
+                # Si tiene particular, guardarlo como candidato
+                candidate_name = extracted_name
+        if contact_name != "Particular":
+            break
+
+    # Si no encontramos nombre limpio pero tenemos candidato
+    if contact_name == "Particular" and candidate_name:
+        contact_name = candidate_name
+
+    # Limpieza final
+    if "particular" in contact_name.lower():
+        cleaned_final = contact_name.replace("Particular", "").replace("particular", "").strip()
+        if len(cleaned_final) > 2:
+            contact_name = cleaned_final
+
+    return contact_name
+
+
+def pick_phone(candidates, verbose=False):
+    """Primer teléfono válido según el orden de selectores ('No disponible' si no hay)."""
+    for selector, values in candidates:
+        if selector == TEL_SELECTOR:
+            for href in values:
+                if href and "tel:" in href:
+                    phone = href.replace("tel:", "").strip()
+                    if verbose:
+                        sys.stderr.write(f"    📱 Teléfono encontrado por href: {phone}\n")
+                    return phone
+        else:
+            for p_text in values:
+                p_text = (p_text or "").strip()
+                if verbose:
+                    sys.stderr.write(f"    🔍 Candidato teléfono ({selector}): {p_text}\n")
+                # Validar que parezca un teléfono (9+ dígitos)
+                if p_text and len(re.sub(r'[^\d+]', '', p_text)) >= 9:
+                    return p_text
+    return "No disponible"
+
+
+def reveal_phone(driver, fields, text_selectors=None, verbose=False):
+    """Pulsa el botón de teléfono localizado por collect_detail_fields y extrae el número."""
+    if not fields.get('phoneButton'):
+        sys.stderr.write("    ⚠️ No se encontró botón de teléfono\n")
+        return "No disponible"
+    if verbose:
+        sys.stderr.write(f"    📞 Botón encontrado: {fields['phoneButton']}\n")
+    try:
+        result = driver.execute_async_script(REVEAL_PHONE_JS, text_selectors or PHONE_TEXT_SELECTORS, TEL_SELECTOR)
+    except Exception as e:
+        sys.stderr.write(f"    ⚠️ No se pudo extraer teléfono: {e}\n")
+        return "No disponible"
+    if not result or not result.get('clicked'):
+        return "No disponible"
+    return pick_phone(result.get('candidates') or [], verbose=verbose)
+
+
+def detail_image(fields):
+    """Imagen principal del detalle, con la primera de la galería como alternativa."""
+    if fields.get('mainImage') is not None:
+        return fields['mainImage']
+    return fields.get('gridImage') or ""
@@ -12,8 +12,6 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options as ChromeOptions
 from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
-from webdriver_manager.microsoft import EdgeChromiumDriverManager
 from selenium.webdriver.edge.options import Options as EdgeOptions
 from selenium.webdriver.edge.service import Service as EdgeService
 
@@ -24,6 +22,23 @@ try:
 except AttributeError:
     pass
 
+# Módulos compartidos entre scrapers (backend/scrapers)
+scrapers_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if scrapers_dir not in sys.path:
+    sys.path.insert(0, scrapers_dir)
+
+from driver_cache import resolve_driver_path, install_chromedriver, install_edgedriver
+from network_profile import lean_enabled, configure_lean_options, enable_lean_loading, network_stats
+from idealista_detail import collect_detail_fields, is_particular, resolve_contact_name, reveal_phone, detail_image
+from seen_index import get_seen_index, skip_seen_enabled, drop_seen
+from verdict_cache import VerdictCache
+from listing_urls import assign_listing_ids
+from ndjson_writer import NdjsonWriter, output_format
+from sqlite_ingest import SqliteIngestWriter, direct_ingest_enabled
+from checkpoint import open_checkpoint
+from rate_limit import get_rate_limiter
+from block_detector import detect_block, get_block_guard, BlockDetected, SourceBlocked
+
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
 # Constantes URLs
@@ -59,7 +74,8 @@ def construct_idealista_url(base_full_url, page_num):
         sys.stderr.write(f"Error construyendo URL paginada: {e}\n")
         return base_full_url
 
-def setup_driver(headless=False): # Default to visible for Idealista to reduce blocks
+def setup_driver(headless=False, lean=None): # Default to visible for Idealista to reduce blocks
+    lean = lean_enabled(lean)
     system = platform.system()
     options = None
     service = None
@@ -76,9 +92,11 @@ def setup_driver(headless=False): # Default to visible for Idealista to reduce b
         options.add_argument('--disable-blink-features=AutomationControlled')
         options.add_experimental_option("excludeSwitches", ["enable-automation"])
         options.add_experimental_option('useAutomationExtension', False)
+        if lean:
+            configure_lean_options(options)
         
         try:
-            service = EdgeService(EdgeChromiumDriverManager().install())
+            service = EdgeService(resolve_driver_path('edge', None, install_edgedriver))
             driver = webdriver.Edge(service=service, options=options)
         except Exception as e:
             # Fallback a Chrome
@@ -89,7 +107,9 @@ def setup_driver(headless=False): # Default to visible for Idealista to reduce b
             options.add_argument('--disable-blink-features=AutomationControlled')
             options.add_experimental_option("excludeSwitches", ["enable-automation"])
             options.add_experimental_option('useAutomationExtension', False)
-            service = ChromeService(ChromeDriverManager().install())
+            if lean:
+                configure_lean_options(options)
+            service = ChromeService(resolve_driver_path('chrome', None, install_chromedriver))
             driver = webdriver.Chrome(service=service, options=options)
             
     else: # Linux/Mac
@@ -119,11 +139,15 @@ def setup_driver(headless=False): # Default to visible for Idealista to reduce b
         else:
              options.add_argument('user-agent=Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
         
-        service = ChromeService(ChromeDriverManager().install())
+        if lean:
+            configure_lean_options(options)
+        service = ChromeService(resolve_driver_path('chrome', options.binary_location or None, install_chromedriver))
         driver = webdriver.Chrome(service=service, options=options)
 
     # Stealth JS
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    if lean:
+        enable_lean_loading(driver)
     return driver
 
 def extract_detail_data(driver, url, known_data=None):
@@ -133,248 +157,130 @@ def extract_detail_data(driver, url, known_data=None):
     """
     if known_data is None:
         known_data = {}
-        
-    is_particular = False
-    initial_name_found = ""
 
-    # Verificar texto "Particular" o clase professional-name
-    try:
-        prof_name = driver.find_element(By.CLASS_NAME, 'professional-name')
-        name_text = prof_name.find_element(By.CLASS_NAME, 'name').text
-        initial_name_found = name_text
-        if "Particular" in name_text or "particular" in name_text.lower():
-            is_particular = True
-    except:
-        if "Particular" in driver.page_source:
-             is_particular = True
-
-    if not is_particular:
+    # Todos los campos candidatos en una sola llamada al navegador
+    fields = collect_detail_fields(driver, button_wait=3)
+    if not is_particular(fields):
         return None
 
     sys.stderr.write("    ✅ ES PARTICULAR! Extrayendo datos...\n")
-    
-    # Extract Contact Name
-    contact_name = "Particular"
-    
-    # Si encontramos un nombre al principio que contiene "Particular", intentamos limpiarlo
-    if initial_name_found and len(initial_name_found) > 10:
-         cleaned = initial_name_found.replace("Particular", "").replace("particular", "").replace("()", "").strip()
-         if len(cleaned) > 2:
-             contact_name = cleaned
 
-    try:
-        # 0. User specific selector (Hidden input in .particular)
-        try:
-            user_name_input = driver.find_element(By.CSS_SELECTOR, '.particular input[name="user-name"]')
-            val = user_name_input.get_attribute('value')
-            if val and len(val) > 2:
-                contact_name = val.strip()
-                sys.stderr.write(f"    🔍 Nombre encontrado por input hidden: {contact_name}\n")
-        except: pass
+    contact_name = resolve_contact_name(fields)
 
-        name_selectors = [
-            '.professional-name .name',
-            '.advertiser-name', 
-            '.contact-data .name', 
-            '.about-advertiser-name',
-            '.contact-name',
-            'div.name',
-            '.advertiser-data__name',
-            '.contact-data__name',
-            '#advertiserName',
-            'div[class*="advertiser-name"]',
-            '.advertiser-data .name',
-            '.contact-detail .name'
-        ]
-        
-        candidate_name = None
-        
-        for selector in name_selectors:
-            try:
-                name_elems = driver.find_elements(By.CSS_SELECTOR, selector)
-                for name_elem in name_elems:
-                    extracted_name = name_elem.text.strip()
-                    if not extracted_name or len(extracted_name) <= 2: continue
-                    
-                    # Prioridad: Nombre sin "particular"
-                    if "particular" not in extracted_name.lower():
-                        contact_name = extracted_name
-                        break
-                    else:
-                        # Si tiene particular, guardarlo como candidato
-                        if extracted_name.lower() != "particular":
-                             candidate_name = extracted_name
-                             
-                if contact_name != "Particular": break
-            except: continue
-            
-        # Si no encontramos nombre limpio pero tenemos candidato
-        if contact_name == "Particular" and candidate_name:
-             contact_name = candidate_name
-            
-        # Limpieza final
-        if "particular" in contact_name.lower():
-             cleaned_final = contact_name.replace("Particular", "").replace("particular", "").strip()
-             if len(cleaned_final) > 2:
-                 contact_name = cleaned_final
-             
-    except Exception as e:
-        sys.stderr.write(f"    ⚠️ Error extrayendo nombre: {e}\n")
-        pass
-
-    # Intentar ver el teléfono (click en botón)
-    phone = "No disponible"
-    try:
-        # Buscar botón de teléfono (varios selectores)
-        phone_btn_selectors = ["a.see-phones-btn", "button.see-phones-btn", ".phone-cta", "button.btn-phone", ".contact-phones-btn", ".more-info-phone"]
-        phone_btn = None
-        
-        for selector in phone_btn_selectors:
-            try:
-                phone_btn = WebDriverWait(driver, 3).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                )
-                if phone_btn: break
-            except: continue
-            
-        if phone_btn:
-            driver.execute_script("arguments[0].scrollIntoView(true);", phone_btn)
-            time.sleep(1)
-            
-            clicked = False
-            try:
-                driver.execute_script("arguments[0].click();", phone_btn)
-                clicked = True
-            except:
-                try:
-                    phone_btn.click()
-                    clicked = True
-                except: pass
-            
-            if clicked:
-                time.sleep(3) # Esperar un poco más a que cargue el teléfono
-                
-                # Extraer número (varios selectores)
-                phone_text_selectors = [
-                    ".phone-number-block p", 
-                    ".phone", 
-                    ".contact-phones", 
-                    ".first-phone", 
-                    ".phone-number-block div", 
-                    ".phone-number-block span",
-                    "a[href^='tel:']",
-                    ".contact-phone",
-                    ".phone-cta",
-                    ".contact-phones-btn"
-                ]
-                
-                for selector in phone_text_selectors:
-                    try:
-                        if selector == "a[href^='tel:']":
-                            phone_elems = driver.find_elements(By.CSS_SELECTOR, selector)
-                            for elem in phone_elems:
-                                href = elem.get_attribute("href")
-                                if href and "tel:" in href:
-                                    phone = href.replace("tel:", "").strip()
-                                    break
-                        else:
-                            phone_elems = driver.find_elements(By.CSS_SELECTOR, selector)
-                            for phone_elem in phone_elems:
-                                p_text = phone_elem.text.strip()
-                                # Limpiar y validar que parezca un teléfono (números y espacios/guiones)
-                                if p_text:
-                                    # Eliminar caracteres no numéricos excepto +
-                                    import re
-                                    digits = re.sub(r'[^\d+]', '', p_text)
-                                    if len(digits) >= 9:
-                                        phone = p_text
-                                        break
-                        if phone != "No disponible": break
-                    except: continue
-        else:
-             sys.stderr.write("    ⚠️ No se encontró botón de teléfono\n")
-    except Exception as ex_phone:
-        sys.stderr.write(f"    ⚠️ No se pudo extraer teléfono: {ex_phone}\n")
-        pass
+    # Intentar ver el teléfono (única ida y vuelta extra: el clic)
+    phone = reveal_phone(driver, fields)
 
     # Construir objeto base con lo que ya sabemos
     prop_data = {
         "source": "idealista",
         "property_type": known_data.get("property_type", "viviendas"),
-        "title": known_data.get("title", driver.title),
+        "title": known_data.get("title", fields.get('documentTitle')),
         "price": known_data.get("price", "0"),
         "url": url,
         "image_url": known_data.get("image_url", ""),
-        "description": "", 
+        "description": fields.get('description') or "",
         "phone": phone,
-        "location": "", 
+        "location": fields.get('location') or "",
         "advertiser": contact_name,
         "scrape_date": datetime.now().isoformat()
     }
-    
+
     # Extraer precio si no lo tenemos
-    if prop_data["price"] == "0":
-        try:
-            price_elem = driver.find_element(By.CSS_SELECTOR, '.info-data-price span')
-            prop_data["price"] = price_elem.text
-        except: pass
+    if prop_data["price"] == "0" and fields.get('price') is not None:
+        prop_data["price"] = fields['price']
 
-    # Extraer descripción
-    try:
-        desc_elem = driver.find_element(By.CSS_SELECTOR, '.comment')
-        prop_data["description"] = desc_elem.text
-    except: pass
-    
-    # Extraer ubicación
-    try:
-        loc_elem = driver.find_element(By.ID, 'headerMap')
-        prop_data["location"] = loc_elem.text
-    except: pass
-    
     # Si no teníamos imagen del listado, intentar del detalle
     if not prop_data["image_url"]:
-        try:
-            main_img = driver.find_element(By.CSS_SELECTOR, '.main-image img')
-            prop_data["image_url"] = main_img.get_attribute('src')
-        except: 
-             try:
-                # Fallback
-                grid_img = driver.find_element(By.CSS_SELECTOR, 'img.main-image_img')
-                prop_data["image_url"] = grid_img.get_attribute('src')
-             except: pass
-             
-    # Extraer Update Date Info
-    date_update_text = ""
-    try:
-        date_elem = driver.find_element(By.CSS_SELECTOR, '.details-box.date-update-block .date-update-text')
-        date_update_text = date_elem.text.strip()
-    except: pass
+        prop_data["image_url"] = detail_image(fields)
 
-    stats_text = ""
-    try:
-        stats_elem = driver.find_element(By.CSS_SELECTOR, '.stats-text')
-        stats_text = stats_elem.text.strip()
-    except: pass
-    
     prop_data["extra_data"] = {
-        "date_update_text": date_update_text,
-        "stats_text": stats_text,
+        "date_update_text": fields.get('dateUpdate') or "",
+        "stats_text": fields.get('stats') or "",
         "advertiser": contact_name
     }
 
     return prop_data
 
-def process_page(url, property_type):
+# Lee de una vez todas las tarjetas del listado: un único comando WebDriver
+# en lugar de varios find_element/get_attribute por artículo.
+LISTING_SNAPSHOT_JS = """
+return Array.from(document.getElementsByTagName('article')).map(function (article) {
+    var link = article.querySelector('a.item-link');
+    var price = article.querySelector('span.item-price');
+    var img = article.querySelector('img');
+    return {
+        hasLogo: !!article.querySelector('.logo-branding'),
+        href: link ? link.href : null,
+        title: link ? (link.innerText || '').trim() : null,
+        price: price ? (price.innerText || '').trim() : null,
+        hasImg: !!img,
+        src: img ? img.src : null,
+        dataSrc: img ? img.getAttribute('data-src') : null
+    };
+});
+"""
+
+def _legacy_command_count(card):
+    """Comandos WebDriver que costaba una tarjeta con find_element/get_attribute."""
+    if card.get('hasLogo'):
+        return 1                                  # logo
+    if card.get('href') is None:
+        return 2                                  # logo + link (falla)
+    if card.get('price') is None:
+        return 5                                  # logo + link, href, text + precio (falla)
+    return 7 + (2 if card.get('hasImg') else 0)   # ... + precio.text + img (+ src, data-src)
+
+def snapshot_listing_candidates(driver, property_type):
+    """
+    Extrae los candidatos (tarjetas sin logo de agencia) del listado con un
+    solo execute_script. Produce los mismos diccionarios que la lectura por
+    elementos y muestra los comandos WebDriver ahorrados.
+    """
+    cards = driver.execute_script(LISTING_SNAPSHOT_JS) or []
+    sys.stderr.write(f"  Encontrados {len(cards)} artículos.\n")
+
+    candidates = []
+    for card in cards:
+        # 1. Filtrar por logo (Agencias); sin enlace o precio no es un anuncio
+        if card.get('hasLogo') or card.get('href') is None or card.get('price') is None:
+            continue
+        candidates.append({
+            "url": card['href'],
+            "title": card.get('title') or "",
+            "price": card['price'],
+            "image_url": card.get('dataSrc') or card.get('src') or "",
+            "property_type": property_type
+        })
+
+    legacy_commands = 1 + sum(_legacy_command_count(card) for card in cards)
+    sys.stderr.write(f"  ⚡ Listado leído con 1 comando WebDriver (~{legacy_commands - 1} ahorrados)\n")
+    return candidates
+
+def process_page(url, property_type, verdicts=None, skip_urls=None):
     """
     Procesa una página individual de Idealista: abre navegador, extrae, cierra.
+    Retorna (propiedades, urls_verificadas). Las URLs verificadas se registran
+    en el índice de vistas cuando la página se ha guardado (scrape_idealista).
+    Con `verdicts` (VerdictCache) se omiten los candidatos ya descartados como
+    agencia y se guarda el veredicto de cada detalle visitado. `skip_urls`
+    omite candidatos ya verificados en un intento anterior de la página.
+
+    Lanza SourceBlocked (sin abrir navegador) si el circuit breaker de
+    Idealista está abierto y BlockDetected si el listado o un detalle es un
+    desafío o un bloqueo; en ambos casos la excepción lleva en `.properties`
+    y `.verified` lo obtenido de la página hasta entonces.
     """
     sys.stderr.write(f"  Procesando página: {url}\n")
+    guard = get_block_guard()
+    guard.check(url)
     driver = setup_driver(headless=False)
     properties = []
+    verified = []
     
     try:
+        get_rate_limiter().wait(url)
         driver.get(url)
-        time.sleep(random.uniform(4, 7)) # Esperar carga + Cloudflare
+        time.sleep(random.uniform(1.5, 3)) # Esperar carga + Cloudflare (el ritmo lo marca el limitador)
         
         # Aceptar cookies si aparecen
         try:
@@ -384,71 +290,66 @@ def process_page(url, property_type):
         except:
             pass
 
-        # Obtener artículos
-        articles = driver.find_elements(By.TAG_NAME, 'article')
-        sys.stderr.write(f"  Encontrados {len(articles)} artículos.\n")
-        
-        candidates = []
+        network_stats.poll(driver)
+
+        reason = detect_block(driver, url, expect_selector='article')
+        if reason:
+            guard.report_block(url, reason, source='idealista')
+            raise BlockDetected(url, reason)
+        guard.report_success(url)
+
+        # Obtener artículos (una sola lectura del listado)
+        candidates = snapshot_listing_candidates(driver, property_type)
 
-        for article in articles:
-            try:
-                # 1. Filtrar por logo (Agencias)
-                try:
-                    logo = article.find_element(By.CLASS_NAME, 'logo-branding')
-                    if logo:
-                        continue
-                except:
-                    pass # No tiene logo, es candidato
-                
-                # Obtener link e imagen
-                link_elem = article.find_element(By.CSS_SELECTOR, 'a.item-link')
-                url_detail = link_elem.get_attribute('href')
-                
-                title = link_elem.text
-                price_elem = article.find_element(By.CSS_SELECTOR, 'span.item-price')
-                price = price_elem.text if price_elem else "0"
-                
-                # Intentar obtener imagen del listado
-                image_url = ""
-                try:
-                    img_elem = article.find_element(By.CSS_SELECTOR, 'img')
-                    src = img_elem.get_attribute('src')
-                    data_src = img_elem.get_attribute('data-src')
-                    image_url = data_src if data_src else src
-                except:
-                    pass
-
-                candidates.append({
-                    "url": url_detail,
-                    "title": title,
-                    "price": price,
-                    "image_url": image_url,
-                    "property_type": property_type
-                })
-                
-            except Exception as e:
-                continue
-                
         sys.stderr.write(f"  Candidatos (posibles particulares): {len(candidates)}\n")
+
+        # Omitir los ya verificados en ciclos anteriores (SCRAPER_SKIP_SEEN=1)
+        if skip_seen_enabled():
+            candidates, skipped = drop_seen(candidates)
+            if skipped:
+                sys.stderr.write(f"  👁️ {skipped} candidatos ya vistos omitidos\n")
         
+        # Omitir agencias ya verificadas (veredicto "professional" vigente)
+        if verdicts is not None:
+            candidates = [c for c in candidates if not verdicts.should_skip(c['url'])]
+        if skip_urls:
+            candidates = [c for c in candidates if c['url'] not in skip_urls]
+
         # 2. Verificar cada candidato entrando al detalle
         for cand in candidates:
             try:
                 sys.stderr.write(f"    Verificando: {cand['url']}\n")
+                guard.check(cand['url'])
+                get_rate_limiter().wait(cand['url'])
                 driver.get(cand['url'])
-                time.sleep(random.uniform(3, 5))
+                time.sleep(random.uniform(1, 2))
+
+                reason = detect_block(driver, cand['url'])
+                if reason:
+                    guard.report_block(cand['url'], reason, source='idealista')
+                    raise BlockDetected(cand['url'], reason)
                 
                 prop_data = extract_detail_data(driver, cand['url'], cand)
+                network_stats.poll(driver)
+                verified.append(cand['url'])
+                if verdicts is not None:
+                    verdicts.record(cand['url'], prop_data is not None)
                 
                 if prop_data:
                     properties.append(prop_data)
                 else:
                     sys.stderr.write("    ❌ No es particular.\n")
                     
+            except (BlockDetected, SourceBlocked):
+                raise
             except Exception as e:
                 sys.stderr.write(f"    Error verificando candidato: {e}\n")
                 continue
 
+    except (BlockDetected, SourceBlocked) as e:
+        # Lo ya verificado en la página no se pierde con el bloqueo
+        e.properties, e.verified = properties, verified
+        raise
     except Exception as e:
         sys.stderr.write(f"  ⚠️ Error en página {url}: {e}\n")
     finally:
@@ -458,18 +359,44 @@ def process_page(url, property_type):
                 driver.quit()
             except: pass
             
-    return properties
+    return properties, verified
+
+def process_page_retrying(url, property_type, verdicts=None):
+    """
+    process_page con un reintento si la página se bloquea (el limitador ya
+    incluye el backoff). El reintento no repite los detalles ya verificados
+    y conserva sus resultados. Si vuelve a bloquearse o se abre el circuit
+    breaker, la excepción lleva en `.properties` y `.verified` lo acumulado.
+    """
+    properties, verified = [], []
+    for attempt in range(2):
+        try:
+            page_props, page_verified = process_page(url, property_type, verdicts, skip_urls=set(verified))
+            return properties + page_props, verified + page_verified
+        except (BlockDetected, SourceBlocked) as e:
+            properties += getattr(e, 'properties', [])
+            verified += getattr(e, 'verified', [])
+            if isinstance(e, SourceBlocked) or attempt > 0:
+                e.properties, e.verified = properties, verified
+                raise
+            sys.stderr.write(f"  🚧 {e}; se reintenta la página una vez tras el backoff\n")
 
 def scrape_single_listing(url):
     """
     Scrapea una url individual (para alertas de correo).
     """
     sys.stderr.write(f"Scrapeando listing individual: {url}\n")
+    try:
+        get_block_guard().check(url)
+    except SourceBlocked as e:
+        sys.stderr.write(f"⛔ {e}\n")
+        return []
     driver = setup_driver(headless=False)
     result = None
     try:
+        get_rate_limiter().wait(url)
         driver.get(url)
-        time.sleep(random.uniform(3, 6))
+        time.sleep(random.uniform(1.5, 3))
         
         # Cookies
         try:
@@ -477,7 +404,12 @@ def scrape_single_listing(url):
             cookie_btn.click()
             time.sleep(1)
         except: pass
-        
+
+        reason = detect_block(driver, url)
+        if reason:
+            get_block_guard().report_block(url, reason, source='idealista')
+            return []
+
         result = extract_detail_data(driver, url)
         
     except Exception as e:
@@ -488,7 +420,21 @@ def scrape_single_listing(url):
     return [result] if result else []
 
 
-def scrape_idealista(property_type="viviendas", max_pages=3):
+def scrape_idealista(property_type="viviendas", max_pages=3, writer=None, resume=True, cancelled=None):
+    """
+    Recorre las páginas del listado y guarda cada una al terminarla: en un
+    JSON por página o, con `writer`, como segmento NDJSON o transacción en SQLite.
+
+    Con `resume` cada página guardada queda registrada en el checkpoint del
+    trabajo y una ejecución interrumpida continúa desde la primera página
+    sin terminar. `cancelled()` (servicio residente) detiene el recorrido
+    entre páginas.
+
+    Una página bloqueada se reintenta una vez tras el backoff; si vuelve a
+    bloquearse se guarda lo obtenido y queda pendiente en el checkpoint. Si
+    el circuit breaker de Idealista se abre el recorrido se detiene y el
+    checkpoint se conserva para continuar desde esa página.
+    """
     sys.stderr.write(f"Iniciando scraper Idealista para {property_type} (Max páginas: {max_pages})...\n")
     
     base_url = URLS.get(property_type)
@@ -497,30 +443,99 @@ def scrape_idealista(property_type="viviendas", max_pages=3):
         return []
         
     all_properties = []
-    
-    for page in range(1, max_pages + 1):
+    network_stats.reset()
+    verdicts = VerdictCache()
+    verdicts.purge_expired()
+
+    checkpoint = open_checkpoint('idealista', base_url, property_type) if resume else None
+    pages = checkpoint.pending_pages(max_pages) if checkpoint else list(range(1, max_pages + 1))
+    if checkpoint and checkpoint.resumed and pages:
+        sys.stderr.write(f"  ♻️ Continuando desde la página {pages[0]}/{max_pages}\n")
+
+    blocked = False
+    incomplete = False
+    seen_index = get_seen_index()
+    for page in pages:
+        if cancelled and cancelled():
+            sys.stderr.write("  ⏹️ Scrape cancelado\n")
+            break
         url = construct_idealista_url(base_url, page)
         sys.stderr.write(f"\n--- Iniciando Página {page} ---\n")
         
-        page_props = process_page(url, property_type)
+        page_complete = True
+        try:
+            page_props, verified = process_page_retrying(url, property_type, verdicts)
+        except SourceBlocked as e:
+            sys.stderr.write(f"  ⛔ {e}: scrape detenido, se reanudará desde la página {page}\n")
+            page_props, verified = e.properties, e.verified
+            page_complete = False
+            blocked = True
+        except BlockDetected as e:
+            sys.stderr.write(f"  🚧 {e}: se guarda lo obtenido y la página queda pendiente\n")
+            page_props, verified = e.properties, e.verified
+            page_complete = False
+            incomplete = True
         
         if page_props:
-            save_to_json(page_props, f"{property_type}_page{page}")
+            if writer is not None:
+                writer.write(page_props)
+                writer.commit()
+            else:
+                save_to_json(page_props, f"{property_type}_page{page}")
+        # Solo se marcan como vistas cuando la página ya se ha guardado
+        for verified_url in verified:
+            seen_index.add(verified_url, source='idealista')
+        if checkpoint and page_complete:
+            checkpoint.page_done(page, page_props, committed=True)
             
         all_properties.extend(page_props)
-        
-        # Pequeña pausa entre reinicios de navegador
-        if page < max_pages:
-            time.sleep(random.uniform(2, 4))
+        if blocked:
+            break
+
+    if checkpoint and not blocked and not incomplete and not (cancelled and cancelled()):
+        checkpoint.finish()
+
+    lean_report = network_stats.report()
+    if lean_report:
+        sys.stderr.write(f"{lean_report}\n")
+    rate_report = get_rate_limiter().report()
+    if rate_report:
+        sys.stderr.write(f"{rate_report}\n")
+    block_report = get_block_guard().report()
+    if block_report:
+        sys.stderr.write(f"{block_report}\n")
+
+    seen_index.flush()
+    sys.stderr.write(f"{seen_index.report()}\n")
+    sys.stderr.write(f"{verdicts.report()}\n")
+    verdicts.close()
             
     return all_properties
 
+def get_output_dir():
+    return os.environ.get('PROPERTIES_OUTPUT_DIR', os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'properties'))
+
+def open_results_writer(property_type):
+    """
+    Ingesta directa en SQLite si SCRAPER_DIRECT_INGEST=1, NDJSON si
+    SCRAPER_OUTPUT_FORMAT=ndjson, si no None (un JSON por página).
+    """
+    if direct_ingest_enabled():
+        return SqliteIngestWriter('idealista', property_type)
+    if output_format() != 'ndjson':
+        return None
+    timestamp = int(time.time() * 1000)
+    return NdjsonWriter(get_output_dir(), f"idealista_{timestamp}_{property_type}", 'idealista', property_type)
+
 def save_to_json(properties, suffix=""):
     if not properties:
         # print("No hay propiedades para guardar.")
         return
 
-    output_dir = os.environ.get('PROPERTIES_OUTPUT_DIR', os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'properties'))
+    # ID estable derivado del id de anuncio (mismo criterio que Fotocasa), sin duplicados
+    properties = assign_listing_ids(properties)
+
+    output_dir = get_output_dir()
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         
@@ -549,8 +564,16 @@ if __name__ == "__main__":
         except:
              pass
 
-    props = scrape_idealista(ptype)
-    # save_to_json(props) # Ya guardamos página a página
+    writer = open_results_writer(ptype)
+    try:
+        props = scrape_idealista(ptype, writer=writer)
+        # save_to_json(props) # Ya guardamos página a página
+    finally:
+        if writer:
+            fallback = writer.close()
+            if isinstance(writer, SqliteIngestWriter) and fallback:
+                # Lo que no se pudo ingerir va al JSON de siempre
+                save_to_json(fallback, f"{ptype}_fallback")
     
     # Salida JSON al final para que el backend la lea si es update
     print(json.dumps(props, ensure_ascii=False))
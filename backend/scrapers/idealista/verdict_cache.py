@@ -0,0 +1,113 @@
+# coding: utf-8
+
+"""
+Caché persistente de veredictos de anunciante para Idealista.
+
+Muchos anuncios de agencia no llevan `logo-branding` en el listado y vuelven
+a aparecer en cada ejecución: abrir su detalle solo para volver a descartarlos
+cuesta 3-5 s de espera más la carga de la página. Aquí se guarda, por id de
+anuncio (/inmueble/<id>/) o URL normalizada, si el anunciante resultó ser
+particular o profesional.
+
+Los candidatos con un veredicto "professional" vigente (IDEALISTA_VERDICT_TTL_DAYS,
+7 días por defecto) se omiten sin navegar. Los particulares siempre se vuelven
+a visitar para refrescar precio y teléfono.
+"""
+
+import os
+import sys
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from data_paths import get_data_dir
+from listing_urls import listing_key
+
+CACHE_FILENAME = "idealista_verdicts.db"
+
+PARTICULAR = 'particular'
+PROFESSIONAL = 'professional'
+
+def verdict_ttl():
+    try:
+        return timedelta(days=float(os.environ.get('IDEALISTA_VERDICT_TTL_DAYS', 7)))
+    except ValueError:
+        return timedelta(days=7)
+
+
+class VerdictCache:
+    """Veredictos particular/profesional con caducidad, thread-safe."""
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path or os.path.join(get_data_dir("cache"), CACHE_FILENAME)
+        self.ttl = ttl if ttl is not None else verdict_ttl()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS verdicts (
+                listing_key TEXT PRIMARY KEY,
+                url TEXT,
+                verdict TEXT NOT NULL,
+                checked_at TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self.stats = {'hits': 0, 'misses': 0, 'recorded': 0}
+
+    def lookup(self, url):
+        """Veredicto vigente para la URL, o None si no hay o ha caducado."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT verdict, checked_at FROM verdicts WHERE listing_key = ?", (listing_key(url),)
+            ).fetchone()
+        if not row:
+            return None
+        verdict, checked_at = row
+        try:
+            if datetime.now() - datetime.fromisoformat(checked_at) > self.ttl:
+                return None
+        except ValueError:
+            return None
+        return verdict
+
+    def should_skip(self, url):
+        """True si el candidato tiene un veredicto "professional" vigente (y cuenta acierto/fallo)."""
+        verdict = self.lookup(url)
+        with self._lock:
+            if verdict == PROFESSIONAL:
+                self.stats['hits'] += 1
+                return True
+            self.stats['misses'] += 1
+        return False
+
+    def record(self, url, is_particular):
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO verdicts (listing_key, url, verdict, checked_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(listing_key) DO UPDATE SET url = excluded.url, verdict = excluded.verdict,
+                    checked_at = excluded.checked_at
+                """,
+                (listing_key(url), url, PARTICULAR if is_particular else PROFESSIONAL, datetime.now().isoformat())
+            )
+            self._conn.commit()
+            self.stats['recorded'] += 1
+
+    def purge_expired(self):
+        """Elimina los veredictos caducados."""
+        cutoff = (datetime.now() - self.ttl).isoformat()
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM verdicts WHERE checked_at < ?", (cutoff,)).rowcount
+            self._conn.commit()
+        return removed
+
+    def report(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        ratio = self.stats['hits'] / lookups if lookups else 0.0
+        return (f"🗂️ Caché de veredictos: {self.stats['hits']} aciertos (agencias omitidas sin navegar), "
+                f"{self.stats['misses']} fallos ({ratio:.0%} de aciertos), "
+                f"{self.stats['recorded']} veredictos guardados")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
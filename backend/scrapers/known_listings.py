@@ -0,0 +1,92 @@
+# coding: utf-8
+
+"""
+Modo incremental para los scrapes ordenados por fecha de publicación.
+
+Con el listado ordenado por `publicationDate` los anuncios nuevos salen
+primero. Cuando una página está formada casi por completo por anuncios que
+ya conocemos, las siguientes también lo estarán y se puede dejar de paginar.
+
+Los anuncios conocidos se cargan de la tabla `properties` de la base SQLite
+local y se completan con el índice de URLs vistas (seen_index), que incluye
+las extraídas en ciclos anteriores que el servidor aún no haya insertado.
+
+Configuración:
+- SCRAPER_INCREMENTAL: 1/0 para activar o desactivar el modo
+- SCRAPER_INCREMENTAL_THRESHOLD: fracción de anuncios conocidos en una página
+  a partir de la cual se deja de paginar (0.8 por defecto)
+"""
+
+import os
+import sys
+import sqlite3
+
+from data_paths import get_db_path
+from listing_urls import normalize_listing_url
+from seen_index import get_seen_index
+
+
+def incremental_enabled(default=False):
+    """Resuelve si el modo incremental está activo (SCRAPER_INCREMENTAL o `default`)."""
+    value = os.environ.get('SCRAPER_INCREMENTAL')
+    if value is None or value == '':
+        return default
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def incremental_threshold():
+    try:
+        return min(1.0, max(0.0, float(os.environ.get('SCRAPER_INCREMENTAL_THRESHOLD', 0.8))))
+    except ValueError:
+        return 0.8
+
+
+def _load_from_db(domain):
+    db_path = get_db_path()
+    if not os.path.exists(db_path):
+        return set()
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5)
+        try:
+            rows = conn.execute("SELECT url FROM properties WHERE url LIKE ?", (f"%{domain}%",)).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"  ⚠️ No se pudieron leer los anuncios conocidos de SQLite: {e}", file=sys.stderr)
+        return set()
+    return {normalize_listing_url(row[0]) for row in rows if row[0]}
+
+
+def load_known_urls(domain):
+    """Conjunto de URLs normalizadas de la tabla `properties` para el dominio (p.ej. 'fotocasa.es')."""
+    known = _load_from_db(domain)
+    known.discard('')
+    print(f"  📚 Modo incremental: {len(known)} anuncios conocidos de {domain}", file=sys.stderr)
+    return known
+
+
+def remember_urls(urls, source=None):
+    """Registra en el índice de URLs vistas las extraídas en esta ejecución."""
+    get_seen_index().add(urls, source=source)
+
+
+def is_known(url, known):
+    """Conocida si está en `properties` o en el índice de URLs vistas."""
+    return url in known or get_seen_index().contains(url)
+
+
+def known_fraction(urls, known):
+    """Fracción de `urls` que ya están en `known` (None si la página no tiene anuncios)."""
+    normalized = [normalize_listing_url(u) for u in urls]
+    normalized = [u for u in normalized if u]
+    if not normalized:
+        return None
+    return sum(1 for u in normalized if is_known(u, known)) / len(normalized)
+
+
+def page_is_mostly_known(urls, known, threshold=None):
+    """True si la página supera el umbral de anuncios conocidos."""
+    if threshold is None:
+        threshold = incremental_threshold()
+    fraction = known_fraction(urls, known)
+    return fraction is not None and fraction >= threshold
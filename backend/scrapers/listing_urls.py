@@ -0,0 +1,77 @@
+# coding: utf-8
+
+"""
+Normalización e identidad de URLs de anuncios.
+
+`normalize_listing_url` sigue la misma regla que `upsertProperty` en
+db/sqlite-manager.js: sin query string y sin barra final. Así las URLs
+recién extraídas se pueden comparar con las que ya están en `properties`.
+
+`listing_id` deriva un id estable (uuid5) del id de anuncio del portal o,
+si no se reconoce, de la URL normalizada: el mismo anuncio recibe el mismo id
+en cada ejecución y en cualquier scraper.
+"""
+
+import re
+import uuid
+
+# Id de anuncio en la URL de cada portal
+AD_ID_PATTERNS = {
+    'idealista': re.compile(r'idealista\.com/(?:.*/)?inmueble/(\d+)'),
+    'fotocasa': re.compile(r'fotocasa\.es/.*?/(\d{5,})/d(?:/|$)'),
+}
+
+
+def normalize_listing_url(url):
+    """URL de anuncio normalizada ('' si no hay URL)."""
+    if not url or url == 'None':
+        return ''
+    url = url.strip().split('?')[0].split('#')[0]
+    if url.endswith('/'):
+        url = url[:-1]
+    return url
+
+
+def portal_ad_id(url):
+    """('portal', 'id') si la URL contiene un id de anuncio reconocible, si no None."""
+    normalized = normalize_listing_url(url)
+    for portal, pattern in AD_ID_PATTERNS.items():
+        match = pattern.search(normalized)
+        if match:
+            return portal, match.group(1)
+    return None
+
+
+def listing_key(url):
+    """Clave de identidad del anuncio: 'portal:id' o la URL normalizada."""
+    ad = portal_ad_id(url)
+    return f"{ad[0]}:{ad[1]}" if ad else normalize_listing_url(url)
+
+
+def listing_id(url):
+    """Id determinista (uuid5) del anuncio, o None si no hay URL."""
+    key = listing_key(url)
+    if not key:
+        return None
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+def assign_listing_ids(properties, url_key='url'):
+    """
+    Asigna a cada propiedad su id determinista y descarta duplicados dentro
+    del lote (se conserva la primera aparición). Las propiedades sin URL
+    reciben un uuid4. Retorna la lista deduplicada.
+    """
+    seen = set()
+    unique = []
+    for prop in properties:
+        prop_id = listing_id(prop.get(url_key))
+        if prop_id is None:
+            prop['id'] = str(uuid.uuid4())
+        elif prop_id in seen:
+            continue
+        else:
+            prop['id'] = prop_id
+            seen.add(prop_id)
+        unique.append(prop)
+    return unique
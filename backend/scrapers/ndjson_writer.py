@@ -0,0 +1,145 @@
+# coding: utf-8
+
+"""
+Escritura en streaming de resultados de scraping en NDJSON (un JSON por línea).
+
+En lugar de acumular todo y volcarlo al final con `indent=2`, cada página
+terminada se añade a un segmento temporal (.part, oculto para el watcher del
+servidor) y en cada punto seguro (`commit()`, normalmente al acabar una
+página) el segmento se publica con un rename atómico:
+
+    fotocasa_viviendas_varios_1718000000000_0001.ndjson
+
+Cada segmento empieza con una línea de manifiesto con el origen, tipo de
+propiedad y fecha de scraping, y es autocontenido: el servidor lo puede
+importar en cuanto aparece, y un fallo en la página 80 no pierde las 79
+anteriores. Los IDs son deterministas (listing_urls) y no se repiten entre
+segmentos de la misma ejecución.
+
+Se activa con SCRAPER_OUTPUT_FORMAT=ndjson (por defecto se sigue usando JSON).
+"""
+
+import os
+import sys
+import json
+import uuid
+import threading
+from datetime import datetime
+
+from listing_urls import listing_id
+
+MANIFEST_KEY = '_manifest'
+FORMAT_VERSION = 'ndjson/1'
+
+
+def output_format():
+    """'json' (por defecto) o 'ndjson' (SCRAPER_OUTPUT_FORMAT)."""
+    fmt = os.environ.get('SCRAPER_OUTPUT_FORMAT', 'json').lower()
+    return fmt if fmt in ('json', 'ndjson') else 'json'
+
+
+class NdjsonWriter:
+    """Escritor de segmentos NDJSON con publicación atómica. Thread-safe."""
+
+    def __init__(self, output_dir, file_prefix, source, property_type, location=None):
+        self.output_dir = output_dir
+        self.file_prefix = file_prefix
+        self.manifest = {
+            MANIFEST_KEY: True,
+            'format': FORMAT_VERSION,
+            'source': source,
+            'property_type': property_type,
+            'location': location,
+            'scrape_date': datetime.now().isoformat(),
+        }
+        self._lock = threading.Lock()
+        self._segment = 0
+        self._file = None
+        self._tmp_path = None
+        self._pending = 0
+        self._ids = set()
+        self.committed = []      # rutas publicadas
+        self.total_records = 0
+
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _segment_name(self):
+        return f"{self.file_prefix}_{self._segment:04d}.ndjson"
+
+    def _open_segment(self):
+        self._segment += 1
+        self._tmp_path = os.path.join(self.output_dir, f".{self._segment_name()}.part")
+        self._file = open(self._tmp_path, 'w', encoding='utf-8')
+        header = dict(self.manifest, segment=self._segment)
+        self._file.write(json.dumps(header, ensure_ascii=False) + '\n')
+
+    def write(self, records):
+        """Añade registros al segmento en curso (un JSON compacto por línea)."""
+        with self._lock:
+            for record in records:
+                record_id = listing_id(record.get('url')) or str(uuid.uuid4())
+                if record_id in self._ids:
+                    continue
+                self._ids.add(record_id)
+                record['id'] = record_id
+                if self._file is None:
+                    self._open_segment()
+                self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+                self._pending += 1
+            if self._file is not None:
+                self._file.flush()
+
+    def commit(self):
+        """Publica el segmento en curso con un rename atómico. Retorna la ruta o None."""
+        with self._lock:
+            if self._file is None or not self._pending:
+                return None
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            final_path = os.path.join(self.output_dir, self._segment_name())
+            os.replace(self._tmp_path, final_path)
+            self.committed.append(final_path)
+            self.total_records += self._pending
+            print(f"  💾 Segmento publicado ({self._pending} propiedades): {final_path}", file=sys.stderr)
+            self._file = None
+            self._tmp_path = None
+            self._pending = 0
+            return final_path
+
+    def close(self):
+        """Publica lo pendiente y retorna las rutas publicadas."""
+        self.commit()
+        with self._lock:
+            # Segmento abierto sin registros: se descarta
+            if self._file is not None:
+                self._file.close()
+                try:
+                    os.remove(self._tmp_path)
+                except OSError:
+                    pass
+                self._file = None
+        return self.committed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_ndjson(path):
+    """Lee un segmento NDJSON. Retorna (manifiesto, registros)."""
+    manifest = {}
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if item.get(MANIFEST_KEY):
+                manifest = item
+            else:
+                records.append(item)
+    return manifest, records
@@ -0,0 +1,271 @@
+# coding: utf-8
+
+"""
+Perfil de carga "ligero" para los navegadores de los scrapers.
+
+Los scrapers solo necesitan el DOM: imágenes, fuentes, vídeo y trackers de
+terceros se bloquean con el dominio Fetch del DevTools Protocol. Se activa
+con SCRAPER_LEAN_LOADING=1 o pasando lean=True a setup_driver.
+
+Fetch.enable pausa las peticiones de esos tipos de recurso (Image, Font,
+Media, sea cual sea su extensión) y las de hosts de trackers; un hilo por
+navegador (RequestInterceptor, sobre la conexión DevTools del propio Chrome
+o Edge) decide cada una con Fetch.failRequest o Fetch.continueRequest. Antes
+de bloquear, la URL de la petición se compara con la allow-list: los
+recursos imprescindibles (icono de particular, banner de cookies, anti-bot)
+siempre se cargan. Se pueden añadir más patrones permitidos con
+SCRAPER_LEAN_ALLOW (separados por comas; comodines de fnmatch o, sin
+comodines, un fragmento de la URL).
+
+`network_stats` acumula por ejecución las peticiones bloqueadas y estima los
+bytes ahorrados; del log de rendimiento de Chromium lee lo descargado y los
+documentos servidos con 403/429, que usa block_detector.
+"""
+
+import os
+import sys
+import json
+import threading
+from fnmatch import fnmatch
+
+# Tipos de recurso (Network.ResourceType) que se bloquean
+BLOCKED_RESOURCE_TYPES = ('Image', 'Font', 'Media')
+
+# Hosts de trackers y publicidad: se bloquean sea cual sea el tipo de recurso
+TRACKER_PATTERNS = [
+    '*google-analytics.com*', '*googletagmanager.com*', '*googlesyndication.com*',
+    '*doubleclick.net*', '*connect.facebook.net*', '*hotjar.com*', '*criteo.*',
+    '*adnxs.com*', '*scorecardresearch.com*', '*taboola.com*', '*outbrain.com*',
+    '*bat.bing.com*', '*analytics.tiktok.com*', '*clarity.ms*', '*adform.net*',
+    '*smartadserver.com*', '*pubmatic.com*', '*rubiconproject.com*', '*amazon-adsystem.com*',
+]
+
+# Nunca bloquear: necesarios para el render de las tarjetas, cookies o anti-bot
+DEFAULT_ALLOW = [
+    '*particular_user_icon*',
+    '*privacy-center.org*',     # Didomi (banner de cookies)
+    '*captcha-delivery.com*',   # DataDome (Idealista)
+]
+
+# Tamaño medio aproximado por tipo, para estimar bytes ahorrados
+AVERAGE_BYTES = {
+    'Image': 60 * 1024,
+    'Font': 40 * 1024,
+    'Media': 500 * 1024,
+    'Script': 30 * 1024,
+    'Tracker': 30 * 1024,
+    'Other': 20 * 1024,
+}
+
+
+def lean_enabled(lean=None):
+    """Resuelve si el perfil ligero está activo (argumento explícito o SCRAPER_LEAN_LOADING)."""
+    if lean is not None:
+        return bool(lean)
+    return os.environ.get('SCRAPER_LEAN_LOADING', '0').lower() in ('1', 'true', 'yes')
+
+
+def allow_patterns():
+    extra = [p.strip() for p in os.environ.get('SCRAPER_LEAN_ALLOW', '').split(',') if p.strip()]
+    return DEFAULT_ALLOW + extra
+
+
+def is_allowed(url, allowed=None):
+    """True si la URL de la petición coincide con algún patrón de la allow-list."""
+    for pattern in allow_patterns() if allowed is None else allowed:
+        if any(c in pattern for c in '*?['):
+            if fnmatch(url, pattern):
+                return True
+        elif pattern in url:
+            return True
+    return False
+
+
+def blocked_kind(url, resource_type, allowed=None):
+    """Categoría con la que se bloquea la petición ('Image', 'Tracker'...) o None si se deja pasar."""
+    if is_allowed(url, allowed):
+        return None
+    if any(fnmatch(url, pattern) for pattern in TRACKER_PATTERNS):
+        return 'Tracker'
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return resource_type
+    return None
+
+
+def fetch_patterns():
+    """Patrones de Fetch.enable: los tipos de recurso bloqueados y los hosts de trackers."""
+    patterns = [{'urlPattern': '*', 'resourceType': t, 'requestStage': 'Request'} for t in BLOCKED_RESOURCE_TYPES]
+    patterns += [{'urlPattern': p, 'requestStage': 'Request'} for p in TRACKER_PATTERNS]
+    return patterns
+
+
+class RequestInterceptor:
+    """
+    Atiende los eventos Fetch.requestPaused de un navegador sobre una conexión
+    DevTools (websocket) propia, en un hilo daemon. `sock` solo necesita
+    send(str), recv() -> str y close().
+    """
+
+    def __init__(self, sock, stats=None, allowed=None):
+        self.sock = sock
+        self.stats = stats
+        self.allowed = allow_patterns() if allowed is None else allowed
+        self._next_id = 0
+        self._send_lock = threading.Lock()
+        self._thread = None
+
+    def _send(self, method, params):
+        with self._send_lock:
+            self._next_id += 1
+            self.sock.send(json.dumps({'id': self._next_id, 'method': method, 'params': params}))
+
+    def start(self):
+        self._send('Fetch.enable', {'patterns': fetch_patterns()})
+        self._thread = threading.Thread(target=self.run, name='lean-interceptor', daemon=True)
+        self._thread.start()
+        return self
+
+    def handle(self, params):
+        request = params.get('request', {})
+        kind = blocked_kind(request.get('url', ''), params.get('resourceType'), self.allowed)
+        if kind:
+            self._send('Fetch.failRequest', {'requestId': params['requestId'], 'errorReason': 'BlockedByClient'})
+            if self.stats is not None:
+                self.stats.record_blocked(kind)
+        else:
+            self._send('Fetch.continueRequest', {'requestId': params['requestId']})
+
+    def run(self):
+        """Bucle de eventos; termina cuando el navegador cierra la conexión."""
+        while True:
+            try:
+                raw = self.sock.recv()
+            except Exception:
+                return
+            if not raw:
+                return
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                continue
+            if message.get('method') != 'Fetch.requestPaused':
+                continue
+            try:
+                self.handle(message.get('params', {}))
+            except Exception:
+                return
+
+    def close(self):
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
+
+def _devtools_address(driver):
+    capabilities = getattr(driver, 'capabilities', None) or {}
+    for key in ('goog:chromeOptions', 'ms:edgeOptions'):
+        address = (capabilities.get(key) or {}).get('debuggerAddress')
+        if address:
+            return address
+    return None
+
+
+def connect_interceptor(driver, stats=None):
+    """Abre una conexión DevTools a la pestaña del driver y arranca su RequestInterceptor."""
+    import websocket  # websocket-client, dependencia de selenium
+
+    address = _devtools_address(driver)
+    if not address:
+        raise RuntimeError("el navegador no expone debuggerAddress")
+    target_id = driver.execute_cdp_cmd('Target.getTargetInfo', {})['targetInfo']['targetId']
+    # Sin cabecera Origin Chrome acepta la conexión sin --remote-allow-origins
+    sock = websocket.create_connection(f"ws://{address}/devtools/page/{target_id}", suppress_origin=True)
+    return RequestInterceptor(sock, stats).start()
+
+
+def configure_lean_options(options):
+    """Activa el log de rendimiento (necesario para contar lo bloqueado) en Chrome/Edge Options."""
+    for capability in ('goog:loggingPrefs', 'ms:loggingPrefs'):
+        try:
+            options.set_capability(capability, {'performance': 'ALL'})
+        except Exception:
+            pass
+    return options
+
+
+def enable_lean_loading(driver):
+    """Aplica el bloqueo de recursos vía CDP (dominio Fetch) sobre un driver ya creado."""
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver._lean_interceptor = connect_interceptor(driver, network_stats)
+        driver._lean_loading = True
+        print("  🪶 Perfil ligero activo: imágenes, fuentes, media y trackers bloqueados", file=sys.stderr)
+    except Exception as e:
+        print(f"  ⚠️ No se pudo activar el perfil ligero: {e}", file=sys.stderr)
+
+
+class NetworkStats:
+    """Contadores de red por ejecución, alimentados desde el log de rendimiento."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.blocked = {}          # tipo -> nº de peticiones bloqueadas
+            self.received_bytes = 0    # bytes realmente descargados
+            self.requests = 0          # peticiones completadas
+            self._document_errors = [] # (url, estado) de documentos con 403/429
+
+    def poll(self, driver):
+        """Vacía el log de rendimiento del driver y actualiza los contadores."""
+        if not getattr(driver, '_lean_loading', False):
+            return
+        try:
+            entries = driver.get_log('performance')
+        except Exception:
+            return
+
+        with self._lock:
+            for entry in entries:
+                try:
+                    message = json.loads(entry['message'])['message']
+                except (KeyError, ValueError, TypeError):
+                    continue
+                method = message.get('method')
+                params = message.get('params', {})
+                if method == 'Network.responseReceived' and params.get('type') == 'Document':
+                    status = params.get('response', {}).get('status')
+                    if status in (403, 429):
+                        self._document_errors.append((params['response'].get('url', ''), status))
+                elif method == 'Network.loadingFinished':
+                    self.requests += 1
+                    self.received_bytes += int(params.get('encodedDataLength') or 0)
+
+    def record_blocked(self, kind):
+        """Anota una petición bloqueada por RequestInterceptor."""
+        with self._lock:
+            self.blocked[kind] = self.blocked.get(kind, 0) + 1
+
+    def take_document_errors(self):
+        """Retorna y vacía los documentos servidos con 403/429 desde la última llamada."""
+        with self._lock:
+            errors, self._document_errors = self._document_errors, []
+            return errors
+
+    def report(self):
+        with self._lock:
+            blocked_total = sum(self.blocked.values())
+            if not blocked_total and not self.requests:
+                return None
+            saved = sum(AVERAGE_BYTES.get(kind, AVERAGE_BYTES['Other']) * count for kind, count in self.blocked.items())
+            detail = ', '.join(f"{kind}: {count}" for kind, count in sorted(self.blocked.items()))
+            return (f"🪶 Perfil ligero: {blocked_total} peticiones bloqueadas ({detail or '-'}), "
+                    f"~{saved / (1024 * 1024):.1f} MB ahorrados (estimado), "
+                    f"{self.received_bytes / (1024 * 1024):.1f} MB descargados en {self.requests} peticiones")
+
+
+# Contadores compartidos por la ejecución actual
+network_stats = NetworkStats()
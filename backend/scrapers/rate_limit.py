@@ -0,0 +1,291 @@
+# coding: utf-8
+
+"""
+Limitador de peticiones por dominio compartido entre hilos y procesos.
+
+Cada dominio tiene un token bucket: se repone un token cada `min_interval`
+segundos hasta un máximo de `burst`, y cada navegación consume uno. Si el
+dominio no se ha visitado recientemente la petición sale sin esperar; si no
+quedan tokens se espera al siguiente (más un jitter aleatorio), en lugar de
+las pausas fijas que había repartidas por los scrapers.
+
+El estado del bucket se guarda en data/cache/rate_limit/<dominio>.json y se
+actualiza bajo un lock de fichero, así que los procesos que se lanzan en
+paralelo (auto scrapers, actualizaciones, servicio residente) comparten el
+mismo ritmo por dominio. Si el lock no está disponible se usa solo el estado
+del proceso.
+
+Configuración:
+- SCRAPER_DOMAIN_MIN_INTERVAL: segundos entre peticiones al mismo dominio (6)
+- SCRAPER_DOMAIN_BURST: peticiones seguidas permitidas tras un periodo sin actividad (2)
+- SCRAPER_DOMAIN_LIMITS: ajustes por dominio, "idealista.com=8:1,fotocasa.es=5"
+  (intervalo[:burst])
+- SCRAPER_RATE_JITTER: jitter de las esperas como fracción del intervalo (0.3)
+- SCRAPER_RATE_SHARED: 1/0 para compartir el estado entre procesos (activo por defecto)
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import threading
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+from data_paths import get_data_dir
+
+DEFAULT_MIN_INTERVAL = 6.0
+DEFAULT_BURST = 2
+DEFAULT_JITTER = 0.3
+LOCK_TIMEOUT = 10.0  # segundos máximos esperando el lock de fichero antes de usar solo el estado local
+
+
+def domain_of(url):
+    """Dominio base de una URL (www.fotocasa.es -> fotocasa.es)."""
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+def _env_float(name, default):
+    try:
+        return max(0.0, float(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+def domain_limits():
+    """Ajustes por dominio de SCRAPER_DOMAIN_LIMITS: {dominio: (intervalo, burst o None)}."""
+    limits = {}
+    for item in os.environ.get('SCRAPER_DOMAIN_LIMITS', '').split(','):
+        if '=' not in item:
+            continue
+        domain, value = item.split('=', 1)
+        interval, _, burst = value.partition(':')
+        try:
+            limits[domain.strip().lower()] = (float(interval), int(burst) if burst else None)
+        except ValueError:
+            print(f"  ⚠️ Límite de dominio no válido: {item}", file=sys.stderr)
+    return limits
+
+
+class FileLock:
+    """Lock exclusivo sobre un fichero (fcntl en POSIX, msvcrt en Windows)."""
+
+    def __init__(self, path, timeout=LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            return self
+        # msvcrt no tiene espera bloqueante sin límite: se reintenta sin bloquear
+        # con un backoff creciente hasta `timeout` y entonces se lanza OSError
+        deadline = time.monotonic() + self.timeout
+        pause = 0.01
+        while True:
+            try:
+                msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+                return self
+            except OSError:
+                if time.monotonic() >= deadline:
+                    os.close(self._fd)
+                    self._fd = None
+                    raise
+                time.sleep(pause)
+                pause = min(pause * 2, 0.2)
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class DomainRateLimiter:
+    """Token bucket por dominio, thread-safe y compartido entre procesos."""
+
+    def __init__(self, min_interval=None, jitter=None, burst=None, shared=None, state_dir=None):
+        self.min_interval = _env_float('SCRAPER_DOMAIN_MIN_INTERVAL', DEFAULT_MIN_INTERVAL) if min_interval is None else min_interval
+        self.jitter = _env_float('SCRAPER_RATE_JITTER', DEFAULT_JITTER) if jitter is None else jitter
+        if burst is None:
+            try:
+                burst = int(os.environ.get('SCRAPER_DOMAIN_BURST', DEFAULT_BURST))
+            except ValueError:
+                burst = DEFAULT_BURST
+        self.burst = max(1, burst)
+        self.limits = domain_limits()
+        if shared is None:
+            shared = os.environ.get('SCRAPER_RATE_SHARED', '1').lower() not in ('0', 'false', 'no')
+        self.shared = shared and (fcntl is not None or msvcrt is not None)
+        self._state_dir = state_dir
+        self._lock = threading.Lock()
+        self._buckets = {}  # dominio -> {'tokens': float, 'updated': float} (sin estado compartido)
+        self.stats = {}     # dominio -> {'requests', 'throttled', 'waited', 'first', 'last'}
+        self._local = threading.local()  # segundos esperados por cada hilo
+
+    def limits_for(self, domain):
+        """(intervalo, burst) del dominio."""
+        interval, burst = self.limits.get(domain, (None, None))
+        return (self.min_interval if interval is None else interval,
+                self.burst if burst is None else max(1, burst))
+
+    # --- Estado del bucket ---
+
+    def _state_paths(self, domain):
+        state_dir = self._state_dir or get_data_dir('cache', 'rate_limit')
+        name = domain.replace(':', '_') or 'default'
+        return os.path.join(state_dir, f'{name}.json'), os.path.join(state_dir, f'{name}.lock')
+
+    @staticmethod
+    def _read_state(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_state(path, state):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _take(state, now, interval, burst):
+        """Repone tokens hasta `now`, consume uno y retorna los segundos hasta poder usarlo."""
+        # Durante un backoff (penalize) no se reponen tokens hasta `not_before`
+        start = max(now, state.get('not_before', 0))
+        if interval <= 0:
+            return start - now
+        tokens = state.get('tokens', burst)
+        elapsed = max(0.0, start - state.get('updated', start))
+        tokens = min(burst, tokens + elapsed / interval)
+        # Con tokens negativos la petición reserva el siguiente hueco libre
+        delay = (start - now) + (0.0 if tokens >= 1 else (1 - tokens) * interval)
+        state['tokens'] = tokens - 1
+        state['updated'] = start
+        return delay
+
+    def _update(self, domain, apply):
+        """
+        Aplica `apply(state)` al bucket del dominio y retorna su resultado.
+        Con estado compartido solo se toma el lock de fichero (que también
+        ordena a los hilos de este proceso, cada uno con su descriptor): el lock
+        del proceso no se mantiene mientras se espera a otros procesos.
+        """
+        if self.shared:
+            try:
+                state_path, lock_path = self._state_paths(domain)
+                with FileLock(lock_path):
+                    state = self._read_state(state_path) or {}
+                    result = apply(state)
+                    self._write_state(state_path, state)
+                return result
+            except OSError as e:
+                with self._lock:
+                    if self.shared:
+                        print(f"  ⚠️ Ritmo compartido no disponible ({e}), se usa solo el de este proceso", file=sys.stderr)
+                        self.shared = False
+        with self._lock:
+            return apply(self._buckets.setdefault(domain, {}))
+
+    def _reserve(self, domain):
+        interval, burst = self.limits_for(domain)
+        delay = self._update(domain, lambda state: self._take(state, time.time(), interval, burst))
+        return delay, interval
+
+    # --- API pública ---
+
+    def penalize(self, url, seconds):
+        """
+        Aplaza las peticiones al dominio `seconds` segundos (backoff tras un
+        bloqueo). Con estado compartido afecta también a los demás procesos.
+        """
+        not_before = time.time() + seconds
+
+        def apply(state):
+            if not_before > state.get('not_before', 0):
+                state['not_before'] = not_before
+                state['updated'] = not_before
+                state['tokens'] = 1
+
+        self._update(domain_of(url), apply)
+
+    def wait(self, url):
+        """Bloquea hasta que se pueda hacer una petición a la URL. Devuelve los segundos esperados."""
+        domain = domain_of(url)
+        delay, interval = self._reserve(domain)
+        if delay > 0:
+            delay += random.uniform(0, self.jitter * interval)
+        with self._lock:
+            stats = self.stats.setdefault(domain, {'requests': 0, 'throttled': 0, 'waited': 0.0, 'first': None, 'last': None})
+            stats['requests'] += 1
+            if delay > 0:
+                stats['throttled'] += 1
+                stats['waited'] += delay
+        if delay > 0:
+            time.sleep(delay)
+            self._local.waited = self.thread_waited() + delay
+        with self._lock:
+            now = time.monotonic()
+            stats['first'] = stats['first'] or now
+            stats['last'] = now
+        return delay
+
+    def thread_waited(self):
+        """Segundos esperados en total por el hilo actual (para descontarlos al medir costes)."""
+        return getattr(self._local, 'waited', 0.0)
+
+    def summary(self):
+        """{dominio: {'requests', 'throttled', 'waited_seconds', 'per_minute'}} de este proceso."""
+        with self._lock:
+            result = {}
+            for domain, stats in self.stats.items():
+                span = (stats['last'] or 0) - (stats['first'] or 0)
+                per_minute = (stats['requests'] - 1) * 60 / span if span > 0 and stats['requests'] > 1 else None
+                result[domain] = {
+                    'requests': stats['requests'],
+                    'throttled': stats['throttled'],
+                    'waited_seconds': round(stats['waited'], 1),
+                    'per_minute': round(per_minute, 1) if per_minute else None,
+                }
+            return result
+
+    def report(self):
+        """Línea de resumen para los logs (None si no se ha hecho ninguna petición)."""
+        parts = []
+        for domain, s in self.summary().items():
+            rate = f", {s['per_minute']}/min" if s['per_minute'] else ""
+            parts.append(f"{domain}: {s['requests']} peticiones{rate}, {s['throttled']} esperas ({s['waited_seconds']} s)")
+        return "🚦 Ritmo por dominio: " + "; ".join(parts) if parts else None
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Limitador compartido del proceso (todos los scrapers usan el mismo)."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = DomainRateLimiter()
+        return _limiter
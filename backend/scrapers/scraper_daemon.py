@@ -0,0 +1,552 @@
+# coding: utf-8
+
+"""
+Servicio residente de scraping con un canal de control JSON-RPC 2.0.
+
+En lugar de lanzar un intérprete de Python (y un navegador) por cada
+ejecución, el servidor arranca este proceso una vez y le envía trabajos como
+líneas JSON por stdin. Las importaciones (selenium, bs4, webdriver_manager,
+los módulos de Fotocasa e Idealista) y los navegadores del pool se mantienen
+vivos entre trabajos, así que la comprobación de una URL suelta cuesta lo
+que tarda en cargar la página.
+
+Protocolo (una línea JSON por mensaje; stdout es exclusivo del canal, los
+logs de los scrapers van a stderr):
+
+    -> {"jsonrpc": "2.0", "id": 1, "method": "scrape_single", "params": {"url": "..."}}
+    <- {"jsonrpc": "2.0", "method": "job.progress", "params": {"job": 1, ...}}
+    <- {"jsonrpc": "2.0", "id": 1, "result": {...}}
+
+Métodos de trabajo (asíncronos, se responden al terminar):
+- scrape_single {url, timeout?}: una URL de Fotocasa o Idealista
+- update_batch {urls, force?, timeout?}: lo mismo que update_scraper.py; cada
+  registro nuevo o modificado se notifica con job.progress según se obtiene y
+  las huellas se confirman cuando se ha enviado la respuesta
+- scrape_listing {source, property_type, start_url?, max_pages?, location?, timeout?}:
+  listado completo de Fotocasa (start_url) o Idealista; las páginas publicadas
+  (NDJSON o SQLite) se notifican con job.records
+
+Métodos de control (se responden al momento): ping, status, warm,
+cancel {job}, shutdown. Con shutdown, al cerrarse stdin (el servidor
+terminó) o con SIGTERM se cancelan los trabajos y se cierran los navegadores.
+
+Cada trabajo tiene un tiempo máximo (`timeout` en segundos o el valor por
+defecto del método). Al cancelarlo o agotarse se responde con error de
+inmediato y se cierran los navegadores que tenga en uso, lo que interrumpe
+cualquier espera de Selenium en curso. Si la página es un desafío o el
+circuit breaker de la fuente está abierto (block_detector), el trabajo
+responde con el error -32002.
+
+Configuración:
+- SCRAPER_DAEMON_BROWSERS: navegadores del pool residente (1)
+- SCRAPER_DAEMON_IDLE_SECONDS: se cierran los navegadores tras este tiempo sin trabajos (900)
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import threading
+import traceback
+from contextlib import contextmanager
+
+# stdout queda reservado para el canal JSON-RPC: los print() de los scrapers van a stderr
+RPC_OUT = sys.stdout
+sys.stdout = sys.stderr
+try:
+    RPC_OUT.reconfigure(encoding='utf-8')
+    sys.stdin.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+except AttributeError:
+    pass
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+for sub_dir in ('fotocasa', 'idealista'):
+    path = os.path.join(current_dir, sub_dir)
+    if path not in sys.path:
+        sys.path.append(path)
+
+from driver_pool import DriverPool
+from client_delivery import ClientOutbox
+from update_fingerprints import FingerprintStore
+from sqlite_ingest import SqliteIngestWriter
+from rate_limit import get_rate_limiter
+from block_detector import get_block_guard, BlockDetected, SourceBlocked
+import update_scraper
+from Fotocasa_scraping_selenium import setup_driver, scrape_fotocasa_selenium, open_results_writer, save_results
+from run_idealista_single import scrape_single_url as scrape_idealista_raw
+import run_idealista_scraper
+
+# Códigos de error JSON-RPC
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+JOB_CANCELLED = -32000
+JOB_TIMEOUT = -32001
+SOURCE_BLOCKED = -32002
+
+# Tiempo máximo por defecto de cada tipo de trabajo (segundos)
+DEFAULT_TIMEOUTS = {
+    'scrape_single': 180,
+    'update_batch': 120,      # por URL
+    'scrape_listing': 4 * 3600,
+}
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class JobCancelled(BaseException):
+    """
+    El trabajo se canceló o agotó su tiempo. Hereda de BaseException para
+    atravesar los `except Exception` de los bucles de páginas y cortar el
+    trabajo en lugar de pasar a la página siguiente.
+    """
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class Job:
+    """Trabajo en curso: parámetros, plazo, cancelación y navegadores en uso."""
+
+    def __init__(self, job_id, method, params, timeout, daemon):
+        self.id = job_id
+        self.method = method
+        self.params = params
+        self.timeout = timeout
+        self.daemon = daemon
+        self.started = time.monotonic()
+        self.reason = None
+        self._cancel = threading.Event()
+        self._done = False
+        self._lock = threading.Lock()
+        self.drivers = set()
+        self.on_delivered = None   # se llama tras enviar la respuesta del trabajo
+
+    @property
+    def deadline(self):
+        return self.started + self.timeout if self.timeout else None
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def finish(self):
+        """Marca el trabajo como respondido. True solo la primera vez."""
+        with self._lock:
+            if self._done:
+                return False
+            self._done = True
+            return True
+
+    def abort(self, reason):
+        """Cancela el trabajo y cierra sus navegadores para cortar cualquier espera en curso."""
+        self.reason = reason
+        self._cancel.set()
+        with self._lock:
+            drivers = list(self.drivers)
+        pool = self.daemon._pool
+        for driver in drivers:
+            if pool is not None:
+                pool.mark_for_recycle(driver)
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def notify(self, method, **params):
+        if not self._done:
+            self.daemon.notify(method, dict(params, job=self.id))
+
+    def progress(self, **params):
+        self.notify('job.progress', **params)
+
+
+class JobPool:
+    """
+    Vista del pool residente para un trabajo: registra qué navegadores tiene
+    en uso (para poder cerrarlos al cancelar) y deja de servir navegadores en
+    cuanto el trabajo se cancela.
+    """
+
+    def __init__(self, pool, job):
+        self._pool = pool
+        self._job = job
+
+    def acquire(self):
+        if self._job.cancelled():
+            raise JobCancelled(self._job.reason)
+        driver = self._pool.acquire()
+        with self._job._lock:
+            self._job.drivers.add(driver)
+        return driver
+
+    def release(self, driver, recycle=False):
+        with self._job._lock:
+            self._job.drivers.discard(driver)
+        self._pool.release(driver, recycle=recycle or self._job.cancelled())
+
+    @contextmanager
+    def session(self):
+        driver = self.acquire()
+        failed = False
+        try:
+            yield driver
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.release(driver, recycle=failed)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+class StreamingWriter:
+    """Reenvía cada página publicada por el escritor real como notificación job.records."""
+
+    def __init__(self, job, inner):
+        self.job = job
+        self.inner = inner
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def write(self, records):
+        with self._lock:
+            self._pending.extend(records)
+        self.inner.write(records)
+
+    def commit(self):
+        result = self.inner.commit()
+        with self._lock:
+            records, self._pending = self._pending, []
+        if records:
+            self.job.notify('job.records', count=len(records), records=records)
+        return result
+
+    def close(self):
+        return self.inner.close()
+
+
+class ScraperDaemon:
+
+    def __init__(self):
+        self.started = time.time()
+        self.jobs = {}
+        self._jobs_lock = threading.Lock()
+        self._out_lock = threading.Lock()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._update_lock = threading.Lock()   # la cola de clientes y las huellas no admiten lotes simultáneos
+        self.last_activity = time.monotonic()
+        self.idle_seconds = _env_int('SCRAPER_DAEMON_IDLE_SECONDS', 900)
+        self.running = True
+        self.completed = 0
+
+        self.job_handlers = {
+            'scrape_single': self.scrape_single,
+            'update_batch': self.update_batch,
+            'scrape_listing': self.scrape_listing,
+        }
+        self.control_handlers = {
+            'ping': self.ping,
+            'status': self.status,
+            'warm': self.warm,
+            'cancel': self.cancel,
+            'shutdown': self.shutdown,
+        }
+
+    # --- Canal JSON-RPC ---
+
+    def send(self, message):
+        line = json.dumps(message, ensure_ascii=False, default=str)
+        with self._out_lock:
+            RPC_OUT.write(line + '\n')
+            RPC_OUT.flush()
+
+    def notify(self, method, params):
+        self.send({'jsonrpc': '2.0', 'method': method, 'params': params})
+
+    def respond(self, request_id, result):
+        self.send({'jsonrpc': '2.0', 'id': request_id, 'result': result})
+
+    def respond_error(self, request_id, code, message):
+        self.send({'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}})
+
+    # --- Navegadores ---
+
+    def pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                size = max(1, _env_int('SCRAPER_DAEMON_BROWSERS', 1))
+                self._pool = DriverPool(lambda: setup_driver(headless=False), size=size)
+            return self._pool
+
+    def _close_pool(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+            print(f"  {pool.report()}", file=sys.stderr)
+
+    # --- Despacho ---
+
+    def handle_line(self, line):
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            self.respond_error(None, PARSE_ERROR, f"JSON inválido: {e}")
+            return
+        if not isinstance(message, dict) or not isinstance(message.get('method'), str):
+            self.respond_error(message.get('id') if isinstance(message, dict) else None, INVALID_REQUEST, "Petición inválida")
+            return
+
+        request_id = message.get('id')
+        method = message['method']
+        params = message.get('params') or {}
+        self.last_activity = time.monotonic()
+
+        if method in self.control_handlers:
+            try:
+                result = self.control_handlers[method](params)
+                if request_id is not None:
+                    self.respond(request_id, result)
+            except RpcError as e:
+                self.respond_error(request_id, e.code, e.message)
+            return
+
+        handler = self.job_handlers.get(method)
+        if handler is None:
+            self.respond_error(request_id, METHOD_NOT_FOUND, f"Método desconocido: {method}")
+            return
+        with self._jobs_lock:
+            if request_id is None or request_id in self.jobs:
+                self.respond_error(request_id, INVALID_REQUEST, "Los trabajos necesitan un id único")
+                return
+            timeout = params.get('timeout') or self._default_timeout(method, params)
+            job = Job(request_id, method, params, timeout, self)
+            self.jobs[request_id] = job
+        threading.Thread(target=self._run_job, args=(job, handler), name=f"job-{request_id}", daemon=True).start()
+
+    def _default_timeout(self, method, params):
+        timeout = DEFAULT_TIMEOUTS[method]
+        if method == 'update_batch':
+            timeout *= max(1, len(params.get('urls') or []))
+        return timeout
+
+    def _run_job(self, job, handler):
+        print(f"▶️ Trabajo {job.id}: {job.method}", file=sys.stderr)
+        try:
+            result = handler(job, job.params)
+            if job.finish():
+                self.respond(job.id, result)
+                if job.on_delivered:
+                    job.on_delivered()
+        except JobCancelled:
+            if job.finish():
+                self.respond_error(job.id, JOB_CANCELLED, "Trabajo cancelado")
+        except RpcError as e:
+            if job.finish():
+                self.respond_error(job.id, e.code, e.message)
+        except (BlockDetected, SourceBlocked) as e:
+            # Página bloqueada o circuit breaker abierto: el llamador no debe reintentar ya
+            print(f"⛔ Trabajo {job.id}: {e}", file=sys.stderr)
+            if job.finish():
+                self.respond_error(job.id, SOURCE_BLOCKED, str(e))
+        except BaseException as e:
+            traceback.print_exc(file=sys.stderr)
+            if job.finish():
+                code = JOB_TIMEOUT if job.reason == 'timeout' else JOB_CANCELLED if job.reason else INTERNAL_ERROR
+                self.respond_error(job.id, code, str(e) or e.__class__.__name__)
+        finally:
+            with self._jobs_lock:
+                self.jobs.pop(job.id, None)
+            self.completed += 1
+            self.last_activity = time.monotonic()
+            print(f"⏹️ Trabajo {job.id} terminado en {time.monotonic() - job.started:.1f}s", file=sys.stderr)
+
+    def watchdog(self):
+        """Aplica los plazos de los trabajos y cierra los navegadores inactivos."""
+        while self.running:
+            time.sleep(1)
+            now = time.monotonic()
+            with self._jobs_lock:
+                jobs = list(self.jobs.values())
+            for job in jobs:
+                if job.deadline and now > job.deadline and job.finish():
+                    print(f"⏱️ Trabajo {job.id} ({job.method}) superó {job.timeout}s", file=sys.stderr)
+                    job.abort('timeout')
+                    self.respond_error(job.id, JOB_TIMEOUT, f"Tiempo máximo superado ({job.timeout}s)")
+            if not jobs and self._pool is not None and self.idle_seconds and now - self.last_activity > self.idle_seconds:
+                print("💤 Sin trabajos: cerrando navegadores", file=sys.stderr)
+                self._close_pool()
+
+    # --- Métodos de control ---
+
+    def ping(self, params):
+        return {'pong': True, 'pid': os.getpid(), 'uptime': round(time.time() - self.started, 1)}
+
+    def status(self, params):
+        now = time.monotonic()
+        with self._jobs_lock:
+            jobs = [{'job': j.id, 'method': j.method, 'elapsed': round(now - j.started, 1), 'timeout': j.timeout}
+                    for j in self.jobs.values()]
+        pool = self._pool
+        return {
+            'jobs': jobs,
+            'completed': self.completed,
+            'browsers_warm': pool is not None,
+            'pool': pool.report() if pool else None,
+            'rate': get_rate_limiter().summary(),
+            'blocks': get_block_guard().summary(),
+        }
+
+    def warm(self, params):
+        """Abre (si hace falta) un navegador del pool para que el próximo trabajo no espere al arranque."""
+        pool = self.pool()
+        started = time.monotonic()
+        with pool.session():
+            pass
+        return {'seconds': round(time.monotonic() - started, 2), 'pool': pool.report()}
+
+    def cancel(self, params):
+        job_id = params.get('job')
+        with self._jobs_lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            raise RpcError(INVALID_PARAMS, f"No hay ningún trabajo {job_id} en curso")
+        if job.finish():
+            job.abort('cancelled')
+            self.respond_error(job.id, JOB_CANCELLED, "Trabajo cancelado")
+        return {'cancelled': job_id}
+
+    def shutdown(self, params=None):
+        self.running = False
+        with self._jobs_lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            if job.finish():
+                job.abort('cancelled')
+                self.respond_error(job.id, JOB_CANCELLED, "Servicio detenido")
+        return {'stopping': True}
+
+    # --- Trabajos ---
+
+    def scrape_single(self, job, params):
+        url = params.get('url')
+        if not url:
+            raise RpcError(INVALID_PARAMS, "Falta 'url'")
+        started = time.monotonic()
+        with JobPool(self.pool(), job).session() as driver:
+            if 'idealista.com' in url:
+                # Mismo formato de salida que run_idealista_single.py
+                data = scrape_idealista_raw(url, driver)
+            else:
+                data = update_scraper.scrape_single_url(driver, url)
+        return {'url': url, 'data': data, 'seconds': round(time.monotonic() - started, 2)}
+
+    def scrape_listing(self, job, params):
+        source = params.get('source', 'fotocasa')
+        property_type = params.get('property_type') or 'viviendas'
+        max_pages = params.get('max_pages')
+
+        if source == 'idealista':
+            inner = run_idealista_scraper.open_results_writer(property_type)
+            writer = StreamingWriter(job, inner) if inner else None
+            try:
+                properties = run_idealista_scraper.scrape_idealista(property_type, max_pages=max_pages or 3,
+                                                                    writer=writer, cancelled=job.cancelled)
+            finally:
+                if inner:
+                    fallback = inner.close()
+                    if isinstance(inner, SqliteIngestWriter) and fallback:
+                        run_idealista_scraper.save_to_json(fallback, f"{property_type}_fallback")
+            return {'source': source, 'property_type': property_type, 'count': len(properties)}
+
+        start_url = params.get('start_url')
+        if not start_url:
+            raise RpcError(INVALID_PARAMS, "Falta 'start_url'")
+        location = params.get('location') or 'varios'
+        output_dir = os.environ.get('PROPERTIES_OUTPUT_DIR', os.path.join(current_dir, '..', '..', 'data', 'properties'))
+        os.makedirs(output_dir, exist_ok=True)
+
+        inner = open_results_writer(property_type, location, output_dir)
+        writer = StreamingWriter(job, inner) if inner else None
+        properties = scrape_fotocasa_selenium(
+            start_url, property_type=property_type, sort_by=params.get('sort_by', 'publicationDate'),
+            max_pages=max_pages, pool=JobPool(self.pool(), job), incremental=params.get('incremental', True),
+            writer=writer
+        )
+        if properties:
+            save_results(properties, property_type=property_type, location=location, output_dir=output_dir, writer=inner)
+        elif inner:
+            inner.close()
+        return {'source': source, 'property_type': property_type, 'count': len(properties)}
+
+    def update_batch(self, job, params):
+        urls = params.get('urls')
+        if not isinstance(urls, list) or not urls:
+            raise RpcError(INVALID_PARAMS, "Falta 'urls'")
+
+        def progress(done, total, url, record):
+            job.progress(done=done, total=total, url=url, record=record)
+
+        with self._update_lock:
+            outbox = ClientOutbox()
+            fingerprints = FingerprintStore()
+            try:
+                results = update_scraper.process_urls(
+                    urls, force=params.get('force'), fingerprints=fingerprints, pool=JobPool(self.pool(), job),
+                    outbox=outbox, progress=progress, cancelled=job.cancelled
+                )
+            finally:
+                outbox.close()
+
+        def delivered():
+            fingerprints.commit()
+            fingerprints.save()
+
+        job.on_delivered = delivered
+        return {'results': results, 'new_clients': outbox.added}
+
+    # --- Bucle principal ---
+
+    def serve(self):
+        threading.Thread(target=self.watchdog, name='watchdog', daemon=True).start()
+        self.notify('ready', {'pid': os.getpid()})
+        print(f"🛰️ Servicio de scraping listo (pid {os.getpid()})", file=sys.stderr)
+        try:
+            for line in sys.stdin:
+                line = line.strip()
+                if line:
+                    self.handle_line(line)
+                if not self.running:
+                    break
+        finally:
+            # stdin cerrado (el servidor terminó) o shutdown
+            self.shutdown()
+            self._close_pool()
+            print("👋 Servicio de scraping detenido", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    daemon = ScraperDaemon()
+    # SIGTERM (cierre forzado desde el servidor): salir por el finally de serve() cerrando los navegadores
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if '--warm' in sys.argv[1:]:
+        try:
+            daemon.warm({})
+        except Exception as e:
+            print(f"  ⚠️ No se pudo precalentar el navegador: {e}", file=sys.stderr)
+    daemon.serve()
@@ -0,0 +1,367 @@
+# coding: utf-8
+
+"""
+Índice persistente de URLs de anuncios ya vistos, compartido por los scrapers.
+
+Combina dos estructuras en data/cache/seen_index/:
+- un filtro de Bloom compacto (seen_urls.bloom) que responde "no visto" sin
+  tocar disco en la gran mayoría de consultas
+- un almacén exacto SQLite (seen_urls.db) que confirma los positivos del
+  filtro, así que nunca se descarta un anuncio nuevo por un falso positivo
+
+Uso:
+    index = get_seen_index()
+    if not index.contains(url): ...
+    index.add([url1, url2], source='fotocasa')
+
+Con SCRAPER_SKIP_SEEN=1 los scrapers omiten los anuncios ya vistos antes de
+hacer trabajo adicional (extracción de Fotocasa y verificación de detalle en
+Idealista).
+
+Mantenimiento desde la línea de comandos:
+    python seen_index.py report
+    python seen_index.py rebuild
+    python seen_index.py compact --days 90
+"""
+
+import os
+import sys
+import math
+import time
+import atexit
+import struct
+import sqlite3
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+from data_paths import get_data_dir, get_db_path
+from listing_urls import normalize_listing_url
+
+BLOOM_FILENAME = "seen_urls.bloom"
+STORE_FILENAME = "seen_urls.db"
+
+BLOOM_MAGIC = b'SEEN1'
+BLOOM_HEADER = struct.Struct('<5sQIQ')  # magic, bits, hashes, elementos
+
+DEFAULT_CAPACITY = 200000
+DEFAULT_FPR = 0.01
+
+# Cada cuánto se comprueba si otro proceso ha actualizado el filtro en disco
+RELOAD_CHECK_SECONDS = 5
+
+
+def skip_seen_enabled():
+    """Omitir anuncios ya vistos (SCRAPER_SKIP_SEEN=1)."""
+    return os.environ.get('SCRAPER_SKIP_SEEN', '0').lower() in ('1', 'true', 'yes')
+
+
+class BloomFilter:
+    """Filtro de Bloom sobre un bytearray con doble hashing (blake2b)."""
+
+    def __init__(self, num_bits, num_hashes, bits=None, count=0):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+        self.count = count
+
+    @classmethod
+    def for_capacity(cls, capacity, fpr=DEFAULT_FPR):
+        capacity = max(1000, capacity)
+        num_bits = int(math.ceil(-capacity * math.log(fpr) / (math.log(2) ** 2)))
+        num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+        return cls(num_bits, num_hashes)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def merge(self, other):
+        """Une otro filtro con las mismas dimensiones (OR de bits)."""
+        for i, byte in enumerate(other.bits):
+            self.bits[i] |= byte
+        self.count = max(self.count, other.count)
+
+    def fill_ratio(self):
+        ones = sum(bin(byte).count('1') for byte in self.bits)
+        return ones / self.num_bits
+
+    def estimated_fpr(self):
+        """Tasa de falsos positivos teórica para el número de elementos insertados."""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def to_bytes(self):
+        return BLOOM_HEADER.pack(BLOOM_MAGIC, self.num_bits, self.num_hashes, self.count) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, num_bits, num_hashes, count = BLOOM_HEADER.unpack_from(data)
+        if magic != BLOOM_MAGIC:
+            raise ValueError("Fichero de filtro de Bloom no válido")
+        bits = bytearray(data[BLOOM_HEADER.size:])
+        if len(bits) != (num_bits + 7) // 8:
+            raise ValueError("Filtro de Bloom truncado")
+        return cls(num_bits, num_hashes, bits, count)
+
+
+class SeenIndex:
+    """Índice de URLs vistas: filtro de Bloom + almacén exacto SQLite. Thread-safe."""
+
+    def __init__(self, directory=None, capacity=DEFAULT_CAPACITY, fpr=DEFAULT_FPR):
+        self.directory = directory or get_data_dir("cache", "seen_index")
+        os.makedirs(self.directory, exist_ok=True)
+        self.bloom_path = os.path.join(self.directory, BLOOM_FILENAME)
+        self.store_path = os.path.join(self.directory, STORE_FILENAME)
+        self.capacity = capacity
+        self.fpr = fpr
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.store_path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS seen (
+                url TEXT PRIMARY KEY,
+                source TEXT,
+                first_seen TEXT,
+                last_seen TEXT
+            )
+        """)
+        self._conn.commit()
+
+        self._bloom = None
+        self._bloom_mtime = None
+        self._last_reload_check = 0.0
+        self._dirty = False
+        self.stats = {'checks': 0, 'bloom_negatives': 0, 'confirmed': 0, 'false_positives': 0, 'added': 0}
+        self._load_bloom()
+
+    # --- Filtro de Bloom en disco ---
+
+    def _read_bloom_file(self):
+        try:
+            with open(self.bloom_path, 'rb') as f:
+                return BloomFilter.from_bytes(f.read()), os.path.getmtime(self.bloom_path)
+        except (OSError, ValueError, struct.error):
+            return None, None
+
+    def _load_bloom(self):
+        bloom, mtime = self._read_bloom_file()
+        if bloom is None:
+            self.rebuild()
+        else:
+            self._bloom, self._bloom_mtime = bloom, mtime
+
+    def _maybe_reload(self):
+        """Incorpora las URLs que otros procesos hayan añadido al filtro en disco."""
+        now = time.monotonic()
+        if now - self._last_reload_check < RELOAD_CHECK_SECONDS:
+            return
+        self._last_reload_check = now
+        try:
+            mtime = os.path.getmtime(self.bloom_path)
+        except OSError:
+            return
+        if mtime != self._bloom_mtime:
+            disk, mtime = self._read_bloom_file()
+            if disk is not None and disk.num_bits == self._bloom.num_bits and disk.num_hashes == self._bloom.num_hashes:
+                self._bloom.merge(disk)
+            elif disk is not None:
+                self._bloom = disk
+            self._bloom_mtime = mtime
+
+    def _write_bloom(self):
+        tmp_path = self.bloom_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(self._bloom.to_bytes())
+            os.replace(tmp_path, self.bloom_path)
+            self._bloom_mtime = os.path.getmtime(self.bloom_path)
+            self._dirty = False
+        except OSError as e:
+            print(f"  ⚠️ No se pudo guardar el filtro de URLs vistas: {e}", file=sys.stderr)
+
+    # --- API pública ---
+
+    def contains(self, url):
+        """True si la URL ya se ha visto (el filtro descarta rápido, SQLite confirma)."""
+        url = normalize_listing_url(url)
+        if not url:
+            return False
+        with self._lock:
+            self.stats['checks'] += 1
+            self._maybe_reload()
+            if url not in self._bloom:
+                self.stats['bloom_negatives'] += 1
+                return False
+            row = self._conn.execute("SELECT 1 FROM seen WHERE url = ?", (url,)).fetchone()
+            if row:
+                self.stats['confirmed'] += 1
+                return True
+            self.stats['false_positives'] += 1
+            return False
+
+    def __contains__(self, url):
+        return self.contains(url)
+
+    def add(self, urls, source=None):
+        """Registra URLs como vistas (actualiza last_seen si ya estaban)."""
+        if isinstance(urls, str):
+            urls = [urls]
+        normalized = {normalize_listing_url(u) for u in urls}
+        normalized.discard('')
+        if not normalized:
+            return 0
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO seen (url, source, first_seen, last_seen) VALUES (?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET last_seen = excluded.last_seen
+                """,
+                [(u, source, now, now) for u in normalized]
+            )
+            self._conn.commit()
+            for url in normalized:
+                if url not in self._bloom:
+                    self._bloom.add(url)
+            self.stats['added'] += len(normalized)
+            self._dirty = True
+            # Si el filtro se ha llenado por encima de su capacidad, se redimensiona
+            # solo desde la tabla `seen` (ya sembrada al crearlo): releer la base
+            # del backend aquí bloquearía el scraping a mitad de trabajo
+            if self._bloom.count > self.capacity:
+                self.capacity *= 2
+                self.rebuild(seed_from_properties=False)
+        return len(normalized)
+
+    def flush(self):
+        """Guarda el filtro en disco (uniendo lo que otros procesos hayan añadido)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            disk, _ = self._read_bloom_file()
+            if disk is not None and disk.num_bits == self._bloom.num_bits and disk.num_hashes == self._bloom.num_hashes:
+                self._bloom.merge(disk)
+            self._write_bloom()
+
+    def rebuild(self, seed_from_properties=True):
+        """
+        Reconstruye el filtro desde el almacén exacto. Con `seed_from_properties`
+        incorpora también las URLs de la tabla `properties` del backend.
+        """
+        with self._lock:
+            if seed_from_properties:
+                self._seed_from_properties()
+            total = self._conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+            self.capacity = max(self.capacity, total * 2)
+            bloom = BloomFilter.for_capacity(self.capacity, self.fpr)
+            for (url,) in self._conn.execute("SELECT url FROM seen"):
+                bloom.add(url)
+            self._bloom = bloom
+            self._write_bloom()
+            print(f"  🧮 Índice de URLs vistas reconstruido: {total} URLs", file=sys.stderr)
+            return total
+
+    def _seed_from_properties(self):
+        db_path = get_db_path()
+        if not os.path.exists(db_path):
+            return
+        try:
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5)
+            try:
+                rows = conn.execute("SELECT url, source FROM properties WHERE url IS NOT NULL").fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"  ⚠️ No se pudieron leer las propiedades para el índice: {e}", file=sys.stderr)
+            return
+        now = datetime.now().isoformat()
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO seen (url, source, first_seen, last_seen) VALUES (?, ?, ?, ?)",
+            [(normalize_listing_url(url), source, now, now) for url, source in rows if normalize_listing_url(url)]
+        )
+        self._conn.commit()
+
+    def compact(self, max_age_days=None):
+        """Elimina las URLs no vistas en `max_age_days` días, compacta SQLite y reconstruye el filtro."""
+        with self._lock:
+            removed = 0
+            if max_age_days:
+                cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+                removed = self._conn.execute("DELETE FROM seen WHERE last_seen < ?", (cutoff,)).rowcount
+                self._conn.commit()
+            self._conn.execute("VACUUM")
+            self.capacity = DEFAULT_CAPACITY
+            self.rebuild(seed_from_properties=False)
+            return removed
+
+    def report(self):
+        """Resumen del índice y de la tasa de falsos positivos observada/estimada."""
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+            bloom_positives = self.stats['confirmed'] + self.stats['false_positives']
+            observed = self.stats['false_positives'] / bloom_positives if bloom_positives else 0.0
+            return (f"👁️ Índice de URLs vistas: {total} URLs, filtro {self._bloom.num_bits // 8 // 1024} KB "
+                    f"(ocupación {self._bloom.fill_ratio():.1%}, FPR estimada {self._bloom.estimated_fpr():.3%}), "
+                    f"{self.stats['checks']} consultas, {self.stats['bloom_negatives']} descartes rápidos, "
+                    f"{self.stats['confirmed']} ya vistas, {self.stats['false_positives']} falsos positivos "
+                    f"(FPR observada {observed:.3%})")
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_seen_index():
+    """Índice compartido por el proceso (se guarda al salir)."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SeenIndex()
+            atexit.register(_index.flush)
+        return _index
+
+
+def drop_seen(properties, url_key='url'):
+    """Filtra las propiedades cuya URL ya está en el índice. Retorna (nuevas, nº omitidas)."""
+    index = get_seen_index()
+    kept = [p for p in properties if not index.contains(p.get(url_key))]
+    return kept, len(properties) - len(kept)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento del índice de URLs vistas")
+    parser.add_argument('command', choices=['report', 'rebuild', 'compact'])
+    parser.add_argument('--days', type=int, default=None, help="compact: eliminar URLs no vistas en N días")
+    args = parser.parse_args()
+
+    index = get_seen_index()
+    if args.command == 'rebuild':
+        index.rebuild()
+    elif args.command == 'compact':
+        removed = index.compact(args.days)
+        print(f"🧹 {removed} URLs eliminadas")
+    print(index.report())
+
+
+if __name__ == "__main__":
+    main()
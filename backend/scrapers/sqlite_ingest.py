@@ -0,0 +1,336 @@
+# coding: utf-8
+
+"""
+Ingesta directa en SQLite desde los scrapers.
+
+Por defecto los resultados se escriben como JSON en data/properties y el
+servidor los importa cada 15 s (processJsonFile -> bulkInsertProperties).
+Con SCRAPER_DIRECT_INGEST=1 los scrapers hacen el upsert ellos mismos en la
+tabla `properties` de data/inmobiliaria.db:
+
+- WAL + busy_timeout para convivir con la conexión de better-sqlite3 del servidor
+- una transacción por lote con executemany
+- el mismo mapeo de campos y la misma política ON CONFLICT(url) ... COALESCE
+  que `upsertProperty` en backend/db/sqlite-manager.js, incluida la creación
+  automática del cliente a partir del teléfono del anunciante
+
+Si la base de datos no existe todavía o la escritura falla, los registros se
+devuelven al llamador para guardarlos en JSON como siempre.
+
+Configuración:
+- SCRAPER_DIRECT_INGEST: 1/0 para activar la ingesta directa
+- SCRAPER_INGEST_BUSY_TIMEOUT_MS: espera máxima por el lock de escritura (10000)
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from data_paths import get_db_path
+
+UPSERT_SQL = """
+    INSERT INTO properties (
+        url, title, price, direccion, location, habitaciones, banos, metros,
+        phone, description, property_type, source, timeago, scrape_date,
+        publication_date, last_updated, image_url, features, extra_data
+    ) VALUES (
+        :url, :title, :price, :direccion, :location, :habitaciones, :banos, :metros,
+        :phone, :description, :property_type, :source, :timeago, :scrape_date,
+        :publication_date, :last_updated, :image_url, :features, :extra_data
+    )
+    ON CONFLICT(url) DO UPDATE SET
+        title = COALESCE(excluded.title, title),
+        price = COALESCE(excluded.price, price),
+        direccion = COALESCE(excluded.direccion, direccion),
+        location = COALESCE(excluded.location, location),
+        habitaciones = COALESCE(excluded.habitaciones, habitaciones),
+        banos = COALESCE(excluded.banos, banos),
+        metros = COALESCE(excluded.metros, metros),
+        phone = COALESCE(excluded.phone, phone),
+        description = COALESCE(excluded.description, description),
+        property_type = COALESCE(excluded.property_type, property_type),
+        source = COALESCE(excluded.source, source),
+        timeago = COALESCE(excluded.timeago, timeago),
+        scrape_date = excluded.scrape_date,
+        publication_date = COALESCE(excluded.publication_date, publication_date),
+        last_updated = datetime('now'),
+        image_url = COALESCE(excluded.image_url, image_url),
+        features = COALESCE(excluded.features, features),
+        extra_data = excluded.extra_data
+"""
+
+INSERT_CLIENT_SQL = """
+    INSERT INTO clients (
+        id, name, phone, email, location, ad_link, whatsapp_link,
+        status, answered, contact_history, notes, created_at
+    ) VALUES (?, ?, ?, '', ?, ?, ?, 'Importado', 0, '[]', ?, ?)
+"""
+
+# Nombres de anunciante que se pueden sustituir por uno mejor (isGeneric en sqlite-manager.js)
+_GENERIC_NAME_RE = re.compile(r'^Cliente \d+$')
+
+# Lotes de URLs por consulta IN (...) (límite de variables de SQLite)
+_LOOKUP_CHUNK = 400
+
+
+def direct_ingest_enabled():
+    """True si SCRAPER_DIRECT_INGEST está activo."""
+    return os.environ.get('SCRAPER_DIRECT_INGEST', '').lower() in ('1', 'true', 'yes')
+
+
+def _busy_timeout_ms():
+    try:
+        return max(0, int(os.environ.get('SCRAPER_INGEST_BUSY_TIMEOUT_MS', 10000)))
+    except ValueError:
+        return 10000
+
+
+def _now_iso():
+    # Mismo formato que new Date().toISOString()
+    now = datetime.now(timezone.utc)
+    return now.strftime('%Y-%m-%dT%H:%M:%S.') + f"{now.microsecond // 1000:03d}Z"
+
+
+def _pick(prop, *keys):
+    """Primer valor "verdadero" entre las claves (equivale a a || b || c en JS)."""
+    for key in keys:
+        value = prop.get(key)
+        if value:
+            return value
+    return None
+
+
+def normalize_url(url):
+    """Normalización de upsertProperty: sin query params ni barra final."""
+    url = (url or '').strip().split('?')[0]
+    return url[:-1] if url.endswith('/') else url
+
+
+def map_property(prop, source=None, property_type=None, scrape_date=None):
+    """Convierte un registro del scraper en la fila de `properties` (mismo mapeo que upsertProperty)."""
+    extra = prop.get('extra_data')
+    if isinstance(extra, str):
+        extra_data = extra
+    else:
+        extra_data = json.dumps({
+            'Advertiser': _pick(prop, 'Advertiser', 'advertiser'),
+            'Phone': _pick(prop, 'Phone', 'phone'),
+            'imgurl': _pick(prop, 'imgurl', 'image_url'),
+            'hab': _pick(prop, 'hab', 'habitaciones'),
+            'm2': _pick(prop, 'm2', 'metros'),
+            **(extra or {})
+        }, ensure_ascii=False, separators=(',', ':'))
+
+    return {
+        'url': normalize_url(prop.get('url')),
+        'title': _pick(prop, 'title', 'Title', 'Título'),
+        'price': _pick(prop, 'price', 'Price', 'Precio'),
+        'direccion': _pick(prop, 'direccion', 'Municipality', 'Dirección'),
+        'location': _pick(prop, 'location', 'Municipality', 'Ubicación'),
+        'habitaciones': _pick(prop, 'habitaciones', 'hab', 'Habitaciones'),
+        'banos': _pick(prop, 'banos', 'Baños'),
+        'metros': _pick(prop, 'metros', 'm2', 'Metros'),
+        'phone': _pick(prop, 'phone', 'Phone', 'Teléfono'),
+        'description': _pick(prop, 'description', 'Description', 'Descripción'),
+        'property_type': prop.get('property_type') or property_type,
+        'source': prop.get('source') or source or 'Fotocasa',
+        'timeago': _pick(prop, 'timeago', 'Timeago'),
+        'scrape_date': prop.get('scrape_date') or scrape_date or _now_iso(),
+        'publication_date': _pick(prop, 'publication_date', 'publicationDate'),
+        'last_updated': _now_iso(),
+        'image_url': _pick(prop, 'image_url', 'imgurl', 'Imagen'),
+        'features': json.dumps(prop['features'], ensure_ascii=False, separators=(',', ':')) if prop.get('features') else None,
+        'extra_data': extra_data,
+        '_has_extra': bool(extra),
+    }
+
+
+def _connect():
+    db_path = get_db_path()
+    if not os.path.exists(db_path):
+        raise sqlite3.OperationalError(f"no existe la base de datos {db_path}")
+    conn = sqlite3.connect(db_path, timeout=_busy_timeout_ms() / 1000, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute(f'PRAGMA busy_timeout = {_busy_timeout_ms()}')
+    return conn
+
+
+def _existing_rows(conn, urls):
+    """{url normalizada: (url en BD, extra_data)} para las URLs que ya existen (con o sin barra final)."""
+    existing = {}
+    candidates = []
+    for url in urls:
+        candidates.extend((url, url + '/'))
+    for i in range(0, len(candidates), _LOOKUP_CHUNK):
+        chunk = candidates[i:i + _LOOKUP_CHUNK]
+        placeholders = ','.join('?' * len(chunk))
+        for db_url, extra_data in conn.execute(
+                f"SELECT url, extra_data FROM properties WHERE url IN ({placeholders})", chunk):
+            existing.setdefault(normalize_url(db_url), (db_url, extra_data))
+    return existing
+
+
+def _is_generic_name(name):
+    return not name or name in ('Particular', 'Anunciante') or bool(_GENERIC_NAME_RE.match(name)) or 'Usuario' in name
+
+
+def _advertiser_name(extra_data):
+    try:
+        extra = json.loads(extra_data) if extra_data else {}
+    except ValueError:
+        extra = {}
+    return extra.get('Advertiser') or extra.get('advertiser') or extra.get('nombre') or 'Anunciante'
+
+
+def _ensure_clients(conn, rows):
+    """Crea (o mejora el nombre de) el cliente de cada anunciante con teléfono (ensureClientFromProperty)."""
+    created = 0
+    for row in rows:
+        if not row['phone']:
+            continue
+        phone = re.sub(r'[^0-9+]', '', str(row['phone']))
+        if len(phone) < 9:
+            continue
+        name = _advertiser_name(row['extra_data'])
+        last9 = re.sub(r'\D', '', phone)[-9:]
+        client = conn.execute(
+            "SELECT id, name FROM clients WHERE REPLACE(REPLACE(REPLACE(phone, ' ', ''), '-', ''), '+', '') LIKE ?",
+            (f"%{last9}",)
+        ).fetchone()
+        if client:
+            if _is_generic_name(client[1]) and not _is_generic_name(name):
+                conn.execute("UPDATE clients SET name = ?, updated_at = ? WHERE id = ?", (name, _now_iso(), client[0]))
+            continue
+        conn.execute(INSERT_CLIENT_SQL, (
+            str(uuid.uuid4()), name, phone, row['location'] or '', row['url'],
+            f"https://wa.me/{re.sub(r'[^0-9]', '', phone)}",
+            f"Creado automáticamente desde propiedad: {row['title'] or row['url']}",
+            _now_iso()
+        ))
+        created += 1
+    return created
+
+
+def ingest_properties(properties, source=None, property_type=None, scrape_date=None):
+    """
+    Upsert de `properties` en una sola transacción. Retorna un dict con
+    inserted, updated, clients y seconds, o None si la ingesta no es posible
+    (el llamador debe recurrir al JSON).
+    """
+    started = time.time()
+    rows = {}
+    for prop in properties:
+        if not prop.get('url'):
+            continue
+        row = map_property(prop, source=source, property_type=property_type, scrape_date=scrape_date)
+        if row['url']:
+            rows[row['url']] = row   # el último registro de la URL gana, como en bulkInsertProperties
+    if not rows:
+        return {'inserted': 0, 'updated': 0, 'clients': 0, 'seconds': 0.0}
+
+    try:
+        conn = _connect()
+    except sqlite3.Error as e:
+        print(f"  ⚠️ Ingesta directa no disponible ({e}), se usará JSON", file=sys.stderr)
+        return None
+
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        existing = _existing_rows(conn, list(rows))
+        for url, row in rows.items():
+            if url in existing:
+                db_url, old_extra = existing[url]
+                # Usar la URL existente para que ON CONFLICT la encuentre
+                row['url'] = db_url
+                # Preservar extra_data si el registro no trae uno propio
+                if not row['_has_extra'] and old_extra:
+                    row['extra_data'] = old_extra
+        params = [{k: v for k, v in row.items() if not k.startswith('_')} for row in rows.values()]
+        conn.executemany(UPSERT_SQL, params)
+        clients = _ensure_clients(conn, params)
+        conn.execute('COMMIT')
+    except sqlite3.Error as e:
+        try:
+            conn.execute('ROLLBACK')
+        except sqlite3.Error:
+            pass
+        print(f"  ⚠️ Error en la ingesta directa ({e}), se usará JSON", file=sys.stderr)
+        return None
+    finally:
+        conn.close()
+
+    updated = len(existing)
+    stats = {
+        'inserted': len(rows) - updated,
+        'updated': updated,
+        'clients': clients,
+        'seconds': time.time() - started,
+    }
+    print(f"  🗄️ Ingesta directa: {stats['inserted']} insertadas, {stats['updated']} actualizadas, "
+          f"{stats['clients']} clientes nuevos en {stats['seconds'] * 1000:.0f} ms", file=sys.stderr)
+    return stats
+
+
+class SqliteIngestWriter:
+    """
+    Misma interfaz que NdjsonWriter (write/commit/close) pero cada commit es
+    una transacción en SQLite. Lo que no se pudo ingerir queda en `fallback`
+    para guardarlo en JSON. Thread-safe.
+    """
+
+    def __init__(self, source, property_type, location=None):
+        self.source = source
+        self.property_type = property_type
+        self.location = location
+        self.scrape_date = datetime.now().isoformat()
+        self._lock = threading.Lock()
+        self._pending = []
+        self.fallback = []
+        self.inserted = 0
+        self.updated = 0
+        self.seconds = 0.0
+        self.batches = 0
+
+    @property
+    def total_records(self):
+        return self.inserted + self.updated
+
+    def write(self, records):
+        with self._lock:
+            self._pending.extend(records)
+
+    def commit(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return None
+            stats = ingest_properties(pending, source=self.source, property_type=self.property_type,
+                                      scrape_date=self.scrape_date)
+            if stats is None:
+                self.fallback.extend(pending)
+                return None
+            self.inserted += stats['inserted']
+            self.updated += stats['updated']
+            self.seconds += stats['seconds']
+            self.batches += 1
+            return stats
+
+    def close(self):
+        """Ingiere lo pendiente y retorna los registros que deben ir a JSON."""
+        self.commit()
+        if self.batches:
+            print(f"  🗄️ Ingesta directa total: {self.inserted} insertadas, {self.updated} actualizadas "
+                  f"en {self.batches} lotes ({self.seconds * 1000:.0f} ms en SQLite)", file=sys.stderr)
+        return self.fallback
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,220 @@
+# coding: utf-8
+
+"""
+ClientOutbox contra un backend local de pruebas (http.server): lotes,
+fallback a un POST por cliente, reintentos, cola persistida y clientes del
+CRM que no se sobrescriben.
+
+Ejecutar desde backend/scrapers:
+    python -m unittest discover -s tests
+"""
+
+import io
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stderr
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+scrapers_dir = os.path.dirname(tests_dir)
+if scrapers_dir not in sys.path:
+    sys.path.insert(0, scrapers_dir)
+
+import client_delivery
+from client_delivery import ClientOutbox
+
+
+class StandInBackend(ThreadingHTTPServer):
+    """
+    Backend mínimo con la semántica del real (db/sqlite-manager.js):
+    /api/clients inserta, /api/clients/batch (importación) actualiza los
+    teléfonos existentes y, si `bulk`, /api/clients/batch-insert solo da de
+    alta los teléfonos nuevos.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, bulk=True, failures=0, existing=()):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.bulk = bulk
+        self.failures = failures  # respuestas 503 antes de aceptar peticiones
+        self.requests = []        # (ruta, payload) en orden de llegada
+        self.clients = []         # clientes dados de alta, en orden
+        self.crm = {c['phone']: dict(c) for c in existing}  # teléfono -> cliente guardado
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, como el backend de Express
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])) or b'null')
+        with server.lock:
+            server.requests.append((self.path, payload))
+            server.connections.add(self.client_address)
+            if server.failures:
+                server.failures -= 1
+                return self.reply(503, {'error': 'no disponible'})
+            if self.path == '/api/clients/batch-insert' and server.bulk:
+                new = [c for c in payload if c['phone'] not in server.crm]
+                for c in new:
+                    server.crm[c['phone']] = dict(c)
+                server.clients.extend(new)
+                return self.reply(200, {'count': len(new), 'skippedCount': len(payload) - len(new)})
+            if self.path == '/api/clients/batch':
+                added = 0
+                for c in payload:
+                    added += c['phone'] not in server.crm
+                    server.crm.setdefault(c['phone'], {}).update(c)
+                return self.reply(200, {'count': added, 'updatedCount': len(payload) - added})
+            if self.path == '/api/clients':
+                server.crm.setdefault(payload['phone'], dict(payload))  # fila nueva, no modifica la existente
+                server.clients.append(payload)
+                return self.reply(200, payload)
+        self.reply(404, {'error': 'no encontrado'})
+
+
+def client(n):
+    return {'name': f'Cliente {n}', 'phone': f'60000000{n}', 'location': 'Dénia',
+            'interest': 'Comprar', 'notes': f'https://www.fotocasa.es/es/comprar/vivienda/{n}/d'}
+
+
+class ClientOutboxTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.queue_path = os.path.join(self.tmp_dir, 'client_outbox.json')
+        self.servers = []
+        self._backoff = client_delivery.BACKOFF_BASE
+        client_delivery.BACKOFF_BASE = 0.01
+        self._stderr = redirect_stderr(io.StringIO())
+        self._stderr.__enter__()
+
+    def tearDown(self):
+        self._stderr.__exit__(None, None, None)
+        client_delivery.BACKOFF_BASE = self._backoff
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def start_backend(self, **kwargs):
+        server = StandInBackend(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return server
+
+    def outbox(self, api_url, **kwargs):
+        kwargs.setdefault('batch_size', 2)
+        kwargs.setdefault('retries', 2)
+        return ClientOutbox(api_url=api_url, queue_path=self.queue_path, **kwargs)
+
+    def test_batches_over_one_connection(self):
+        backend = self.start_backend()
+        outbox = self.outbox(backend.url)
+        for n in range(5):
+            outbox.add(client(n))
+        outbox.close()
+
+        self.assertEqual(backend.clients, [client(n) for n in range(5)])
+        self.assertEqual([path for path, _ in backend.requests], ['/api/clients/batch-insert'] * 3)
+        self.assertEqual(len(backend.connections), 1)
+        self.assertTrue(outbox.bulk_supported)
+        self.assertEqual((outbox.delivered, outbox.added, outbox.queue), (5, 5, []))
+        self.assertFalse(os.path.exists(self.queue_path))
+
+    def test_falls_back_to_single_posts_without_bulk_endpoint(self):
+        backend = self.start_backend(bulk=False)
+        outbox = self.outbox(backend.url)
+        for n in range(3):
+            outbox.add(client(n))
+        outbox.close()
+
+        self.assertIs(outbox.bulk_supported, False)
+        self.assertEqual(backend.clients, [client(n) for n in range(3)])
+        paths = [path for path, _ in backend.requests]
+        self.assertEqual(paths, ['/api/clients/batch-insert'] + ['/api/clients'] * 3)
+        self.assertEqual(outbox.delivered, 3)
+
+    def test_existing_crm_clients_are_not_overwritten(self):
+        worked = dict(client(1), status='Contactado', notes='Llamar el martes', email='dueno@example.com')
+        backend = self.start_backend(existing=[worked])
+        outbox = self.outbox(backend.url)
+        outbox.add(dict(client(1), status='Pendiente', notes='Cliente importado automáticamente', email=''))
+        outbox.add(client(2))
+        outbox.close()
+
+        self.assertEqual(backend.crm[worked['phone']], worked)
+        self.assertEqual(backend.clients, [client(2)])
+        self.assertNotIn('/api/clients/batch', [path for path, _ in backend.requests])
+        self.assertEqual((outbox.delivered, outbox.added), (2, 1))
+
+    def test_retries_server_errors_with_backoff(self):
+        backend = self.start_backend(failures=2)
+        outbox = self.outbox(backend.url)
+        outbox.add(client(1))
+        outbox.close()
+
+        self.assertEqual(len(backend.requests), 3)
+        self.assertEqual(backend.clients, [client(1)])
+        self.assertEqual(outbox.queue, [])
+
+    def test_queue_survives_until_backend_is_back(self):
+        backend = self.start_backend(failures=100)
+        outbox = self.outbox(backend.url, batch_size=10)
+        outbox.add(client(1))
+        outbox.add(client(2))
+        # Cola persistida antes de intentar el envío (caída del proceso)
+        with open(self.queue_path, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), [client(1), client(2)])
+
+        outbox.close()  # se agotan los reintentos: nada se pierde
+        self.assertEqual(outbox.queue, [client(1), client(2)])
+        self.assertEqual(len(backend.requests), 3)
+
+        recovered = self.start_backend()
+        retry = self.outbox(recovered.url)
+        self.assertEqual(retry.queue, [client(1), client(2)])
+        retry.close()
+        self.assertEqual(recovered.clients, [client(1), client(2)])
+        self.assertFalse(os.path.exists(self.queue_path))
+
+    def test_unreachable_backend_keeps_queue(self):
+        backend = self.start_backend()
+        url = backend.url
+        backend.shutdown()
+        backend.server_close()
+        self.servers.remove(backend)
+
+        outbox = self.outbox(url, retries=1)
+        outbox.add(client(1))
+        outbox.close()
+        self.assertEqual(outbox.queue, [client(1)])
+        with open(self.queue_path, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), [client(1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
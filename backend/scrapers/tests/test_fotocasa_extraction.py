@@ -0,0 +1,131 @@
+# coding: utf-8
+
+"""
+Paridad de la extracción de Fotocasa sobre una página guardada
+(fixtures/fotocasa_listing.html): backends de parser y extractores de tarjetas.
+
+Ejecutar desde backend/scrapers:
+    python -m unittest discover -s tests
+"""
+
+import io
+import os
+import sys
+import unittest
+from contextlib import redirect_stdout
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+fotocasa_dir = os.path.join(os.path.dirname(tests_dir), 'fotocasa')
+if fotocasa_dir not in sys.path:
+    sys.path.insert(0, fotocasa_dir)
+
+from Fotocasa_scraping_selenium import (
+    extract_properties_from_page,
+    parse_listing_html,
+    find_listing_articles,
+    extract_card,
+    extract_card_legacy
+)
+
+FIXTURE = os.path.join(tests_dir, 'fixtures', 'fotocasa_listing.html')
+REFERENCE_PARSER = 'html5lib'
+
+
+def installed(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def load_fixture():
+    with open(FIXTURE, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def extract(html, **kwargs):
+    with redirect_stdout(io.StringIO()):
+        return extract_properties_from_page(html, 'test', 'publicationDate', **kwargs)
+
+
+@unittest.skipUnless(installed('html5lib'), "html5lib no instalado (parser de referencia)")
+class ParserParityTest(unittest.TestCase):
+    """Todos los backends de parser extraen las mismas propiedades que html5lib."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.html = load_fixture()
+        cls.reference = extract(cls.html, parser=REFERENCE_PARSER)
+
+    def test_reference_extracts_particular_cards(self):
+        urls = [p['url'] for p in self.reference]
+        self.assertEqual(urls, [
+            'https://www.fotocasa.es/es/comprar/vivienda/denia/terraza/180001/d',
+            'https://www.fotocasa.es/es/comprar/vivienda/javea/180002/d',
+            'https://www.fotocasa.es/es/comprar/vivienda/ondara/180005/d',
+        ])
+        first = self.reference[0]
+        self.assertEqual(first['Price'], '245.000 €')
+        self.assertEqual(first['hab'], '3 habs')
+        self.assertEqual(first['m2'], '98 m²')
+        self.assertEqual(first['Phone'], '+34600111222')
+        self.assertEqual(first['Municipality'], 'Dénia')
+
+    def assert_parity(self, parser):
+        if parser == 'lxml' and not installed('lxml'):
+            self.skipTest("lxml no instalado")
+        self.assertEqual(extract(self.html, parser=parser), self.reference)
+
+    def test_lxml_matches_reference(self):
+        self.assert_parity('lxml')
+
+    def test_html_parser_matches_reference(self):
+        self.assert_parity('html.parser')
+
+    def test_articles_outside_main_content_are_ignored(self):
+        for parser in ('lxml', 'html.parser'):
+            if parser == 'lxml' and not installed('lxml'):
+                continue
+            titles = [p['Title'] for p in extract(self.html, parser=parser)]
+            self.assertNotIn('Anuncio fuera del listado', titles)
+
+    def test_page_without_main_content(self):
+        html = '<html><body><article><h3 class="text-subhead">X</h3></article></body></html>'
+        for parser in ('html5lib', 'html.parser'):
+            self.assertEqual(extract(html, parser=parser), [])
+
+
+class CardExtractorTest(unittest.TestCase):
+    """El extractor de una pasada produce lo mismo que el original, tarjeta a tarjeta."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.articles = find_listing_articles(parse_listing_html(load_fixture(), 'html.parser'))
+
+    def test_fixture_has_cards(self):
+        self.assertEqual(len(self.articles), 5)
+
+    def test_each_card_matches_legacy(self):
+        for index, article in enumerate(self.articles):
+            with self.subTest(card=index):
+                self.assertEqual(extract_card(article), extract_card_legacy(article))
+
+    def test_agency_and_incomplete_cards_are_skipped(self):
+        self.assertIsNone(extract_card(self.articles[2]))  # agencia
+        self.assertIsNone(extract_card(self.articles[3]))  # particular sin precio
+
+    def test_title_fallback_and_particular_text(self):
+        card = extract_card(self.articles[1])
+        self.assertEqual(card['Title'], 'Casa en Xàbia')
+        self.assertEqual(card['Municipality'], 'Xàbia')
+        self.assertEqual(card['hab'], 'None')
+
+    def test_page_extraction_matches_with_both_extractors(self):
+        html = load_fixture()
+        self.assertEqual(extract(html, parser='html.parser', extractor='fast'),
+                         extract(html, parser='html.parser', extractor='legacy'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+# coding: utf-8
+
+"""
+Perfil ligero: qué peticiones bloquea RequestInterceptor (por tipo de recurso
+y host de tracker) y cuáles deja pasar la allow-list.
+
+Ejecutar desde backend/scrapers:
+    python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import json
+import queue
+import unittest
+from unittest import mock
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+scrapers_dir = os.path.dirname(tests_dir)
+if scrapers_dir not in sys.path:
+    sys.path.insert(0, scrapers_dir)
+
+from network_profile import RequestInterceptor, NetworkStats, blocked_kind, fetch_patterns
+
+
+class FakeDevTools:
+    """Conexión DevTools simulada: entrega eventos y guarda los comandos enviados."""
+
+    def __init__(self, events):
+        self.incoming = queue.Queue()
+        for event in events:
+            self.incoming.put(json.dumps(event))
+        self.incoming.put('')  # conexión cerrada
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(json.loads(data))
+
+    def recv(self):
+        return self.incoming.get(timeout=5)
+
+    def close(self):
+        pass
+
+
+def paused(request_id, url, resource_type):
+    return {'method': 'Fetch.requestPaused', 'params': {
+        'requestId': request_id, 'request': {'url': url, 'method': 'GET'}, 'resourceType': resource_type}}
+
+
+class BlockedKindTest(unittest.TestCase):
+
+    def test_blocks_by_resource_type_without_extension(self):
+        self.assertEqual(blocked_kind('https://img.fotocasa.es/resize?id=180001', 'Image'), 'Image')
+        self.assertEqual(blocked_kind('https://fonts.example.com/f/abc', 'Font'), 'Font')
+
+    def test_lets_page_resources_through(self):
+        self.assertIsNone(blocked_kind('https://www.fotocasa.es/es/comprar/viviendas/l', 'Document'))
+        self.assertIsNone(blocked_kind('https://www.fotocasa.es/static/app.js', 'Script'))
+
+    def test_trackers_blocked_for_any_type(self):
+        self.assertEqual(blocked_kind('https://www.googletagmanager.com/gtm.js?id=GTM-1', 'Script'), 'Tracker')
+
+    def test_allow_list_matches_request_urls(self):
+        self.assertIsNone(blocked_kind('https://static.fotocasa.es/img/particular_user_icon.svg', 'Image'))
+        self.assertIsNone(blocked_kind('https://sdk.privacy-center.org/loader.js', 'Script'))
+
+    def test_env_allow_patterns(self):
+        url = 'https://cdn.example.com/logo.png'
+        self.assertEqual(blocked_kind(url, 'Image'), 'Image')
+        with mock.patch.dict(os.environ, {'SCRAPER_LEAN_ALLOW': 'cdn.example.com, *.svg*'}):
+            self.assertIsNone(blocked_kind(url, 'Image'))
+            self.assertIsNone(blocked_kind('https://other.example.com/a.svg?v=2', 'Image'))
+
+    def test_fetch_patterns_pause_resource_types(self):
+        types = {p.get('resourceType') for p in fetch_patterns()}
+        self.assertTrue({'Image', 'Font', 'Media'} <= types)
+
+
+class RequestInterceptorTest(unittest.TestCase):
+
+    def run_interceptor(self, events, allowed=None):
+        sock = FakeDevTools(events)
+        stats = NetworkStats()
+        interceptor = RequestInterceptor(sock, stats, allowed=allowed).start()
+        interceptor._thread.join(timeout=5)
+        return sock.sent, stats
+
+    def test_allowed_url_is_continued_and_others_failed(self):
+        sent, stats = self.run_interceptor([
+            paused('1', 'https://static.fotocasa.es/img/particular_user_icon.svg', 'Image'),
+            paused('2', 'https://img.fotocasa.es/resize?id=180001', 'Image'),
+            {'id': 1, 'result': {}},
+            paused('3', 'https://www.googletagmanager.com/gtm.js', 'Script'),
+        ])
+
+        self.assertEqual(sent[0]['method'], 'Fetch.enable')
+        decisions = [(m['method'], m['params']['requestId']) for m in sent[1:]]
+        self.assertEqual(decisions, [
+            ('Fetch.continueRequest', '1'),
+            ('Fetch.failRequest', '2'),
+            ('Fetch.failRequest', '3'),
+        ])
+        self.assertEqual(sent[2]['params']['errorReason'], 'BlockedByClient')
+        self.assertEqual(stats.blocked, {'Image': 1, 'Tracker': 1})
+
+    def test_custom_allow_list(self):
+        sent, stats = self.run_interceptor(
+            [paused('7', 'https://cdn.example.com/hero.webp', 'Image')],
+            allowed=['*cdn.example.com*'])
+        self.assertEqual(sent[1]['method'], 'Fetch.continueRequest')
+        self.assertEqual(stats.blocked, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# coding: utf-8
+
+"""
+Planificación de actualizaciones: las fechas de SQLite (UTC), las ISO con zona
+y las huellas antiguas (hora local) se comparan en el mismo reloj.
+
+Ejecutar desde backend/scrapers:
+    python -m unittest discover -s tests
+"""
+
+import io
+import os
+import sys
+import unittest
+from contextlib import redirect_stderr
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+scrapers_dir = os.path.dirname(tests_dir)
+if scrapers_dir not in sys.path:
+    sys.path.insert(0, scrapers_dir)
+
+import update_schedule
+from update_schedule import _parse_date, plan_update_batch
+
+URL = 'https://www.fotocasa.es/es/comprar/vivienda/denia/180001/d'
+
+
+class FixedCosts:
+    def estimate(self, url):
+        return 1.0
+
+
+class FakeFingerprints:
+    def __init__(self, checked_at=None, changed_at=None):
+        self._checked_at = checked_at
+        self._changed_at = changed_at
+
+    def checked_at(self, url):
+        return self._checked_at
+
+    def changed_at(self, url):
+        return self._changed_at
+
+
+def sqlite_time(dt):
+    """Formato de datetime('now') de SQLite (UTC, sin zona)."""
+    return dt.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ParseDateTest(unittest.TestCase):
+
+    def test_all_formats_become_aware_utc(self):
+        expected = datetime(2026, 10, 17, 10, 0, tzinfo=timezone.utc)
+        self.assertEqual(_parse_date('2026-10-17 10:00:00'), expected)
+        self.assertEqual(_parse_date('2026-10-17T10:00:00.000Z'), expected)
+        self.assertEqual(_parse_date('2026-10-17T12:00:00+02:00'), expected)
+
+    def test_naive_local_values(self):
+        local = datetime(2026, 10, 17, 12, 0)
+        self.assertEqual(_parse_date(local.isoformat(), naive_is_utc=False), local.astimezone(timezone.utc))
+
+    def test_invalid_values(self):
+        self.assertIsNone(_parse_date(None))
+        self.assertIsNone(_parse_date('ayer'))
+
+
+class PlanUpdateBatchTest(unittest.TestCase):
+
+    def plan(self, last_updated, fingerprints=None):
+        rows = ([(URL, last_updated, None, None)], {})
+        with mock.patch.object(update_schedule, '_load_rows', return_value=rows), \
+                mock.patch.dict(os.environ, {'UPDATE_BASE_INTERVAL_HOURS': '24'}), \
+                redirect_stderr(io.StringIO()):
+            return plan_update_batch(budget_seconds=60, max_urls=10, fingerprints=fingerprints, costs=FixedCosts())
+
+    def test_sqlite_time_is_compared_as_utc(self):
+        now = datetime.now(timezone.utc)
+        self.assertEqual(self.plan(sqlite_time(now - timedelta(hours=23))), [])
+        self.assertEqual(self.plan(sqlite_time(now - timedelta(hours=25))), [URL])
+
+    def test_recent_fingerprint_check_postpones_listing(self):
+        now = datetime.now(timezone.utc)
+        stale = sqlite_time(now - timedelta(hours=48))
+        checked = FakeFingerprints(checked_at=(now - timedelta(hours=2)).isoformat())
+        self.assertEqual(self.plan(stale, checked), [])
+        # Huella antigua sin zona (hora local del sistema)
+        legacy = FakeFingerprints(checked_at=(datetime.now() - timedelta(hours=2)).isoformat())
+        self.assertEqual(self.plan(stale, legacy), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+# coding: utf-8
+
+"""
+Detección de cambios para el actualizador de anuncios (update_scraper).
+
+Cada registro actualizado se resume en una huella estable (sha256) de los
+campos que importan: precio, título, descripción, teléfono y anunciante.
+Las huellas de la última ejecución se guardan en
+data/cache/update_fingerprints.json junto con los valores, de modo que en la
+siguiente se puede decir si un anuncio no ha cambiado o qué campos cambiaron.
+
+La huella nueva solo se guarda cuando el lote se ha entregado (commit): si la
+salida se pierde, la siguiente ejecución vuelve a detectar el cambio.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from data_paths import get_data_dir
+from listing_urls import normalize_listing_url
+
+STORE_FILENAME = "update_fingerprints.json"
+
+FINGERPRINT_FIELDS = ['Price', 'Title', 'Description', 'Phone', 'Advertiser']
+
+UNCHANGED = 'unchanged'
+CHANGED = 'changed'
+NEW = 'new'
+
+
+def _normalize_value(value):
+    if value is None:
+        return ''
+    return ' '.join(str(value).split())
+
+
+def fingerprint_fields(record):
+    """Valores normalizados (espacios colapsados) de los campos que forman la huella."""
+    return {field: _normalize_value(record.get(field)) for field in FINGERPRINT_FIELDS}
+
+
+def _digest(fields):
+    payload = json.dumps(fields, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def fingerprint(record):
+    """Huella estable del registro (sha256 de los campos en orden fijo)."""
+    return _digest(fingerprint_fields(record))
+
+
+class FingerprintStore:
+    """Huellas de la última ejecución, indexadas por URL normalizada."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_data_dir("cache"), STORE_FILENAME)
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        self._staged = {}    # huellas calculadas pendientes de commit()
+        self._dirty = set()  # URLs confirmadas pendientes de save()
+        self.stats = {UNCHANGED: 0, CHANGED: 0, NEW: 0}
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def compare(self, record):
+        """
+        Compara el registro con la huella anterior.
+        Retorna (estado, diff) con estado 'unchanged' | 'changed' | 'new' y
+        diff {campo: {'old': ..., 'new': ...}} para los campos modificados.
+
+        Un campo vacío en el registro (extracción parcial, p. ej. sin precio)
+        conserva el valor anterior y no cuenta como cambio. La huella nueva
+        queda pendiente hasta commit().
+        """
+        key = normalize_listing_url(record.get('url'))
+        # En UTC con zona: update_schedule la compara con las fechas de SQLite
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            previous = self._entries.get(key)
+            old_fields = (previous or {}).get('fields') or {}
+            fields = fingerprint_fields(record)
+            for field, value in fields.items():
+                if not value and old_fields.get(field):
+                    fields[field] = old_fields[field]
+            digest = _digest(fields)
+
+            if previous is None:
+                status, diff = NEW, {}
+            elif previous.get('hash') == digest:
+                status, diff = UNCHANGED, {}
+            else:
+                diff = {
+                    field: {'old': old_fields.get(field, ''), 'new': value}
+                    for field, value in fields.items() if old_fields.get(field, '') != value
+                }
+                status = CHANGED
+
+            # changed_at: última vez que la huella cambió (lo usa update_schedule)
+            changed_at = (previous.get('changed_at') or previous.get('updated_at')) if status == UNCHANGED else now
+            self._staged[key] = {'hash': digest, 'fields': fields, 'updated_at': now, 'changed_at': changed_at}
+            self.stats[status] += 1
+        return status, diff
+
+    def commit(self, urls=None):
+        """Confirma las huellas pendientes (todas o las de `urls`) una vez entregado el lote."""
+        with self._lock:
+            keys = list(self._staged) if urls is None else [normalize_listing_url(u) for u in urls]
+            for key in keys:
+                entry = self._staged.pop(key, None)
+                if entry is not None:
+                    self._entries[key] = entry
+                    self._dirty.add(key)
+
+    def changed_at(self, url):
+        """Fecha ISO del último cambio detectado en el anuncio (None si no hay historial)."""
+        entry = self._entries.get(normalize_listing_url(url))
+        return entry.get('changed_at') if entry else None
+
+    def checked_at(self, url):
+        """Fecha ISO de la última revisión confirmada del anuncio (None si no hay historial)."""
+        entry = self._entries.get(normalize_listing_url(url))
+        return entry.get('updated_at') if entry else None
+
+    def save(self):
+        """
+        Guarda las huellas confirmadas. Se mezclan con las del fichero para no
+        pisar las que haya guardado otro lote (servicio residente o proceso)
+        desde que se cargó este.
+        """
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = self._load()
+            entries.update({key: self._entries[key] for key in self._dirty})
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(entries, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+                self._entries = entries
+                self._dirty.clear()
+            except OSError as e:
+                print(f"  ⚠️ No se pudieron guardar las huellas de actualización: {e}", file=sys.stderr)
+
+    def report(self):
+        return (f"🔁 Actualización: {self.stats[UNCHANGED]} sin cambios, "
+                f"{self.stats[CHANGED]} modificados, {self.stats[NEW]} nuevos")
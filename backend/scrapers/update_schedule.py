@@ -0,0 +1,206 @@
+# coding: utf-8
+
+"""
+Planificación de actualizaciones por antigüedad y prioridad (update_scraper --schedule).
+
+En lugar de visitar todas las URLs que llegan, se elige un lote acotado a
+partir de la tabla `properties` de SQLite:
+- cada anuncio tiene un intervalo de revisión objetivo (UPDATE_BASE_INTERVAL_HOURS,
+  24 h por defecto) que se acorta si tiene un cliente activo o si cambió
+  recientemente, y se alarga si lleva mucho tiempo estable
+- la prioridad es horas desde la última revisión / intervalo objetivo;
+  solo entran los anuncios con prioridad >= 1, de mayor a menor. La última
+  revisión es la más reciente entre last_updated y la de las huellas
+  (update_fingerprints), así un anuncio revisado sin cambios no vuelve a
+  entrar hasta que le toque
+- el lote se llena hasta el presupuesto de tiempo (UPDATE_TIME_BUDGET_SECONDS,
+  30 min por defecto) usando el coste medio por URL medido en ejecuciones
+  anteriores (media móvil exponencial por dominio en data/cache/update_costs.json)
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from data_paths import get_data_dir, get_db_path
+from listing_urls import normalize_listing_url
+from rate_limit import domain_of
+
+COSTS_FILENAME = "update_costs.json"
+
+# Coste inicial estimado por URL (segundos) antes de tener mediciones
+DEFAULT_COSTS = {'fotocasa.es': 25.0, 'idealista.com': 45.0}
+DEFAULT_COST = 30.0
+COST_EMA_ALPHA = 0.3
+
+# Estados de cliente que ya no requieren seguimiento del anuncio
+INACTIVE_CLIENT_STATUSES = {'no', 'descartado', 'rechazado', 'vendido', 'cerrado'}
+
+ACTIVE_CLIENT_FACTOR = 0.5     # anuncio con cliente activo: revisar el doble de a menudo
+RECENT_CHANGE_FACTOR = 0.5     # cambió hace menos de RECENT_CHANGE_DAYS
+STABLE_FACTOR = 3.0            # sin cambios desde hace más de STABLE_DAYS
+RECENT_CHANGE_DAYS = 7
+STABLE_DAYS = 30
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _parse_date(value, naive_is_utc=True):
+    """
+    Fechas de SQLite ('YYYY-MM-DD HH:MM:SS') o ISO de JS/Python como datetime
+    con zona, en UTC, para poder compararlas entre sí. Las fechas sin zona son
+    UTC (datetime('now') de SQLite) salvo con `naive_is_utc=False`, que las
+    toma como hora local (huellas guardadas con datetime.now()).
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        if naive_is_utc:
+            return parsed.replace(tzinfo=timezone.utc)
+        return parsed.astimezone(timezone.utc)  # naive: hora local del sistema
+    return parsed.astimezone(timezone.utc)
+
+
+class UpdateCosts:
+    """Coste medio por URL y dominio (media móvil exponencial), persistido entre ejecuciones."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_data_dir("cache"), COSTS_FILENAME)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._costs = json.load(f)
+        except (OSError, ValueError):
+            self._costs = {}
+
+    def estimate(self, url):
+        domain = domain_of(url)
+        entry = self._costs.get(domain)
+        if entry:
+            return entry['ema']
+        return DEFAULT_COSTS.get(domain, DEFAULT_COST)
+
+    def record(self, url, seconds):
+        domain = domain_of(url)
+        with self._lock:
+            entry = self._costs.get(domain)
+            if entry is None:
+                entry = {'ema': seconds, 'samples': 0}
+            else:
+                entry['ema'] = COST_EMA_ALPHA * seconds + (1 - COST_EMA_ALPHA) * entry['ema']
+            entry['samples'] += 1
+            self._costs[domain] = entry
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with self._lock:
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._costs, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"  ⚠️ No se pudieron guardar los costes de actualización: {e}", file=sys.stderr)
+
+    def report(self):
+        return ', '.join(f"{domain}: {entry['ema']:.1f}s ({entry['samples']} muestras)"
+                         for domain, entry in sorted(self._costs.items())) or '-'
+
+
+def _load_rows():
+    db_path = get_db_path()
+    if not os.path.exists(db_path):
+        print("  ⚠️ No existe la base de datos, no hay nada que planificar.", file=sys.stderr)
+        return [], {}
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5)
+    try:
+        properties = conn.execute(
+            "SELECT url, last_updated, scrape_date, created_at FROM properties WHERE url IS NOT NULL"
+        ).fetchall()
+        try:
+            clients = conn.execute("SELECT ad_link, status FROM clients WHERE ad_link IS NOT NULL").fetchall()
+        except sqlite3.Error:
+            clients = []
+    finally:
+        conn.close()
+
+    client_status = {}
+    for ad_link, status in clients:
+        key = normalize_listing_url(ad_link)
+        active = (status or '').strip().lower() not in INACTIVE_CLIENT_STATUSES
+        client_status[key] = client_status.get(key, False) or active
+    return properties, client_status
+
+
+def target_interval_hours(has_active_client, changed_at, now):
+    """Intervalo de revisión objetivo para un anuncio."""
+    interval = _env_float('UPDATE_BASE_INTERVAL_HOURS', 24)
+    if has_active_client:
+        interval *= ACTIVE_CLIENT_FACTOR
+    if changed_at is not None:
+        days_since_change = (now - changed_at).total_seconds() / 86400
+        if days_since_change < RECENT_CHANGE_DAYS:
+            interval *= RECENT_CHANGE_FACTOR
+        elif days_since_change > STABLE_DAYS:
+            interval *= STABLE_FACTOR
+    return interval
+
+
+def plan_update_batch(budget_seconds=None, max_urls=None, fingerprints=None, costs=None):
+    """
+    Elige las URLs a actualizar en esta ventana. Retorna la lista ordenada por prioridad.
+    `fingerprints` (FingerprintStore) aporta la fecha de la última revisión y
+    del último cambio de cada anuncio.
+    """
+    if budget_seconds is None:
+        budget_seconds = _env_float('UPDATE_TIME_BUDGET_SECONDS', 1800)
+    if max_urls is None:
+        max_urls = int(_env_float('UPDATE_MAX_BATCH', 200))
+    costs = costs or UpdateCosts()
+
+    now = datetime.now(timezone.utc)
+    properties, client_status = _load_rows()
+
+    scored = []
+    for url, last_updated, scrape_date, created_at in properties:
+        key = normalize_listing_url(url)
+        checked_at = fingerprints.checked_at(url) if fingerprints else None
+        dates = [d for d in (_parse_date(last_updated), _parse_date(scrape_date), _parse_date(created_at),
+                             _parse_date(checked_at, naive_is_utc=False)) if d]
+        last_seen = max(dates) if dates else None
+        staleness_hours = (now - last_seen).total_seconds() / 3600 if last_seen else float('inf')
+
+        has_client = client_status.get(key, False)
+        changed_at = _parse_date(fingerprints.changed_at(url), naive_is_utc=False) if fingerprints else None
+        priority = staleness_hours / target_interval_hours(has_client, changed_at, now)
+        if priority >= 1:
+            scored.append((priority, has_client, url))
+
+    # Clientes activos primero, después por prioridad
+    scored.sort(key=lambda item: (item[1], item[0]), reverse=True)
+
+    batch = []
+    spent = 0.0
+    for priority, has_client, url in scored:
+        if len(batch) >= max_urls:
+            break
+        cost = costs.estimate(url)
+        if batch and spent + cost > budget_seconds:
+            continue
+        batch.append(url)
+        spent += cost
+
+    print(f"  🗓️ Planificación: {len(scored)} anuncios pendientes de revisión, "
+          f"{len(batch)} en este lote (~{spent / 60:.0f} min de {budget_seconds / 60:.0f} min)", file=sys.stderr)
+    return batch
@@ -3,6 +3,7 @@ import json
 import time
 import os
 import io
+import threading
 from datetime import datetime
 
 # Añadir el directorio 'fotocasa' al path para poder importar el módulo
@@ -17,9 +18,6 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException
 
-# Importar scraper de Idealista
-from run_idealista_single import scrape_single_url as scrape_idealista_raw
-
 # Importar todas las funciones necesarias del scraper principal
 from Fotocasa_scraping_selenium import (
     setup_driver, 
@@ -29,27 +27,64 @@ from Fotocasa_scraping_selenium import (
     human_like_mouse_move
 )
 
-# Clase para silenciar stdout durante la ejecución de funciones importadas que imprimen logs
+from update_fingerprints import FingerprintStore, UNCHANGED, CHANGED
+from update_schedule import UpdateCosts, plan_update_batch
+from client_delivery import ClientOutbox
+from rate_limit import get_rate_limiter
+from block_detector import detect_block, get_block_guard, BlockDetected, SourceBlocked
+
+# Salida estándar que descarta lo escrito por los hilos que la tienen silenciada.
+# Se instala una sola vez en lugar de sustituir sys.stdout en cada bloque: en el
+# daemon varios trabajos corren a la vez y un intercambio global de stdout de un
+# hilo silenciaría (o cerraría) la salida de los demás.
+class _ThreadSilencedStdout:
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def silenced(self):
+        return getattr(self._local, 'depth', 0) > 0
+
+    def enter(self):
+        self._local.depth = getattr(self._local, 'depth', 0) + 1
+
+    def exit(self):
+        self._local.depth -= 1
+
+    def write(self, text):
+        if self.silenced():
+            return len(text)
+        return self._stream.write(text)
+
+    def flush(self):
+        if not self.silenced():
+            self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+_stdout_install_lock = threading.Lock()
+
+# Clase para silenciar stdout (solo en el hilo actual) durante la ejecución de
+# funciones importadas que imprimen logs
 class SuppressStdout:
     def __enter__(self):
-        self._original_stdout = sys.stdout
-        sys.stdout = open(os.devnull, 'w', encoding='utf-8')
-    
+        with _stdout_install_lock:
+            if not isinstance(sys.stdout, _ThreadSilencedStdout):
+                sys.stdout = _ThreadSilencedStdout(sys.stdout)
+            self._stdout = sys.stdout
+        self._stdout.enter()
+
     def __exit__(self, exc_type, exc_val, exc_tb):
-        sys.stdout.close()
-        sys.stdout = self._original_stdout
+        self._stdout.exit()
 
-def save_client_from_property(property_data):
+def save_client_from_property(property_data, outbox):
     """
     Guarda un nuevo cliente a partir de los datos de la propiedad scrapeada.
-    Ahora usa la API del backend para guardar en SQLite.
+    El cliente se encola en `outbox` (ClientOutbox), que lo envía a la API del
+    backend en lotes por una conexión reutilizada.
     """
     try:
-        import requests
-        
-        # URL de la API del backend
-        api_url = "http://localhost:3001/api/clients"
-        
         url = property_data.get('url')
         phone = property_data.get('Phone') or ''
         name = property_data.get('Advertiser') or 'Particular'
@@ -87,18 +122,7 @@ def save_client_from_property(property_data):
             "notes": f"Cliente importado automáticamente: {title}"
         }
         
-        # Hacer petición POST a la API
-        try:
-            response = requests.post(api_url, json=new_client, timeout=10)
-            if response.status_code == 200:
-                result = response.json()
-                print(f"  ✅ Nuevo cliente añadido via API: {name} ({location}) - Tlf: {phone_clean}", file=sys.stderr)
-            else:
-                print(f"  ⚠️ Error de API ({response.status_code}): {response.text}", file=sys.stderr)
-        except requests.exceptions.ConnectionError:
-            print(f"  ⚠️ No se pudo conectar al backend. Asegúrate de que está corriendo.", file=sys.stderr)
-        except Exception as e:
-            print(f"  ⚠️ Error en petición API: {e}", file=sys.stderr)
+        outbox.add(new_client)
         
     except Exception as e:
         print(f"  ⚠️ Error al guardar cliente: {e}", file=sys.stderr)
@@ -116,14 +140,16 @@ def scrape_single_url(driver, url):
     Scrapea una URL usando un driver existente.
     Retorna un diccionario con los datos o None si falla.
     Soporta Fotocasa e Idealista.
+    Lanza BlockDetected si la página es un desafío o un bloqueo.
     """
     try:
         # --- LÓGICA IDEALISTA ---
         if "idealista.com" in url:
             print(f"  ℹ️ Detectada URL de Idealista: {url}", file=sys.stderr)
             
-            # Usar la función importada de Idealista
+            # Usar la función de Idealista (se importa solo si el lote tiene URLs de Idealista)
             # Nota: run_idealista_single ya tiene lógica de espera y cookies
+            from run_idealista_single import scrape_single_url as scrape_idealista_raw
             raw_data = scrape_idealista_raw(url, driver)
             
             if not raw_data:
@@ -142,18 +168,23 @@ def scrape_single_url(driver, url):
                 "Description": raw_data.get("extra_data", {}).get("stats_text", "")
             }
             
-            # Guardar cliente
-            save_client_from_property(updated_details)
             return updated_details
 
         # --- LÓGICA FOTOCASA (Original) ---
+        get_rate_limiter().wait(url)
         driver.get(url)
         
         # Ejecutar las funciones de navegación y anti-detección silenciando su salida
         with SuppressStdout():
             handle_cookies(driver)
             handle_push_alert_modal(driver)
-            
+
+        reason = detect_block(driver, url)
+        if reason:
+            get_block_guard().report_block(url, reason, source='fotocasa')
+            raise BlockDetected(url, reason)
+
+        with SuppressStdout():
             # Esperar a que cargue el título
             WebDriverWait(driver, 30).until(
                 EC.presence_of_element_located((By.TAG_NAME, "h1"))
@@ -284,12 +315,11 @@ def scrape_single_url(driver, url):
         updated_details["Advertiser"] = advertiser
         if reference: updated_details["Reference"] = reference
         if phone: updated_details["Phone"] = phone
-        
-        # Guardar cliente automáticamente
-        save_client_from_property(updated_details)
 
         return updated_details
 
+    except BlockDetected:
+        raise
     except Exception as e:
         # Guardar HTML para depuración
         try:
@@ -317,33 +347,117 @@ def scrape_single_url(driver, url):
         print(f"Error inesperado al scrapear {url}: {e}", file=sys.stderr)
         return None
 
-def process_urls(urls):
+def process_urls(urls, force=None, fingerprints=None, pool=None, outbox=None, progress=None, cancelled=None):
+    """
+    Actualiza cada URL y retorna los registros nuevos o modificados completos.
+    Los anuncios sin cambios respecto a la última ejecución (misma huella de
+    precio, título, descripción, teléfono y anunciante) no generan cliente y
+    se devuelven como {"url", "Unchanged": true}, para que el servidor solo
+    marque la revisión (last_updated). Con `force` (o SCRAPER_UPDATE_FORCE=1)
+    se devuelven todos completos.
+
+    Las huellas nuevas quedan pendientes: el llamador hace `fingerprints.commit()`
+    y `save()` cuando el lote se ha entregado, así un lote perdido se vuelve a
+    detectar como cambio en la siguiente ejecución.
+
+    El tiempo de cada URL se registra para estimar el tamaño de los próximos
+    lotes planificados (update_schedule). Los clientes se envían al backend
+    agrupados al final (o cada CLIENT_BATCH_SIZE) a través de ClientOutbox.
+
+    Desde el servicio residente (scraper_daemon) se pasan además un `pool` de
+    navegadores ya abiertos en lugar de lanzar uno por URL, la `outbox` del
+    servicio, un callback `progress(i, total, url, record)` y `cancelled()`,
+    que detiene el lote entre URLs.
+
+    Con el circuit breaker de un dominio abierto (block_detector) sus URLs se
+    omiten sin abrir navegador; una página bloqueada recicla el navegador y se
+    reintenta una vez tras el backoff.
+    """
+    if force is None:
+        force = os.environ.get('SCRAPER_UPDATE_FORCE', '0').lower() in ('1', 'true', 'yes')
+
     results = []
+    fingerprints = fingerprints or FingerprintStore()
+    costs = UpdateCosts()
+    own_outbox = outbox is None
+    if own_outbox:
+        outbox = ClientOutbox()
     
     for i, url in enumerate(urls):
+        if cancelled and cancelled():
+            print("  ⏹️ Lote cancelado", file=sys.stderr)
+            break
         print(f"Procesando {i+1}/{len(urls)}: {url}", file=sys.stderr)
-        driver = None
-        try:
-            # Abrir navegador para CADA propiedad
-            driver = setup_driver(headless=False)
-            
-            data = scrape_single_url(driver, url)
-            if data:
-                results.append(data)
-            
-            # Pequeña pausa antes de cerrar para asegurar que todo se procesó
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"Error procesando URL {url}: {e}", file=sys.stderr)
-        finally:
-            # Cerrar navegador después de CADA propiedad
-            if driver:
-                with SuppressStdout():
-                    driver.quit()
-            # Pausa entre reinicios de navegador
-            if i < len(urls) - 1:
-                time.sleep(2)
+        started = time.monotonic()
+        waited_before = get_rate_limiter().thread_waited()
+        record = None  # registro devuelto (nuevo o modificado)
+        skipped = False
+        # Una página bloqueada se reintenta una vez, tras el backoff y con otro navegador
+        for attempt in range(2):
+            driver = None
+            blocked = False
+            try:
+                # Con el circuit breaker abierto no se abre navegador
+                get_block_guard().check(url)
+
+                # Abrir navegador para CADA propiedad (o tomar uno caliente del pool)
+                driver = pool.acquire() if pool else setup_driver(headless=False)
+                
+                data = scrape_single_url(driver, url)
+                if data:
+                    status, diff = fingerprints.compare(data)
+                    if status == UNCHANGED and not force:
+                        print(f"  ⏸️ Sin cambios: {url}", file=sys.stderr)
+                        results.append({"url": url, "Unchanged": True})
+                    else:
+                        if status == CHANGED:
+                            data["Changes"] = diff
+                            print(f"  ✏️ Cambios en {', '.join(diff)}: {url}", file=sys.stderr)
+                        # Guardar cliente automáticamente (solo si hay algo nuevo)
+                        save_client_from_property(data, outbox)
+                        results.append(data)
+                        record = data
+                
+            except SourceBlocked as e:
+                skipped = True
+                print(f"  ⛔ {e}: se omite {url}", file=sys.stderr)
+            except BlockDetected as e:
+                blocked = True
+                retry = attempt == 0 and not (cancelled and cancelled())
+                print(f"  🚧 {e}" + ("; se reintenta tras el backoff" if retry else ""), file=sys.stderr)
+            except Exception as e:
+                print(f"Error procesando URL {url}: {e}", file=sys.stderr)
+            finally:
+                # Cerrar navegador después de CADA propiedad (reciclándolo si estaba bloqueado)
+                if driver and pool:
+                    pool.release(driver, recycle=blocked)
+                elif driver:
+                    with SuppressStdout():
+                        driver.quit()
+            if not blocked or (cancelled and cancelled()):
+                break
+
+        if not skipped:
+            # El coste no incluye las esperas del limitador ni el backoff tras un bloqueo
+            waited = get_rate_limiter().thread_waited() - waited_before
+            costs.record(url, max(0.0, time.monotonic() - started - waited))
+        if progress:
+            progress(i + 1, len(urls), url, record)
+
+    if own_outbox:
+        outbox.close()
+    else:
+        outbox.flush()
+    print(outbox.report(), file=sys.stderr)
+    costs.save()
+    print(fingerprints.report(), file=sys.stderr)
+    print(f"⏱️ Coste medio por URL: {costs.report()}", file=sys.stderr)
+    rate_report = get_rate_limiter().report()
+    if rate_report:
+        print(rate_report, file=sys.stderr)
+    block_report = get_block_guard().report()
+    if block_report:
+        print(block_report, file=sys.stderr)
     
     return results
 
@@ -351,9 +465,19 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         arg = sys.argv[1]
         urls_to_scrape = []
+        fingerprints = FingerprintStore()
+
+        # Modo planificado: elegir el lote por antigüedad y prioridad desde SQLite
+        # Uso: update_scraper.py --schedule [presupuesto_en_segundos]
+        if arg == '--schedule':
+            budget = float(sys.argv[2]) if len(sys.argv) > 2 else None
+            urls_to_scrape = plan_update_batch(budget_seconds=budget, fingerprints=fingerprints)
+            if not urls_to_scrape:
+                print("[]")
+                sys.exit(0)
 
         # Comprobar si es un archivo
-        if os.path.exists(arg) and (arg.endswith('.json') or arg.endswith('.txt')):
+        elif os.path.exists(arg) and (arg.endswith('.json') or arg.endswith('.txt')):
             try:
                 with open(arg, 'r', encoding='utf-8') as f:
                     content = f.read()
@@ -378,10 +502,12 @@ if __name__ == "__main__":
             print("No se encontraron URLs para procesar.", file=sys.stderr)
             sys.exit(1)
 
-        scraped_results = process_urls(urls_to_scrape)
-        
+        scraped_results = process_urls(urls_to_scrape, fingerprints=fingerprints)
+        # Los anuncios sin cambios solo van en la salida (marcan la revisión), no en el archivo
+        changed_results = [r for r in scraped_results if not r.get("Unchanged")]
+
         if scraped_results:
-            # 1. Guardar UN SOLO archivo en data/update con todos los resultados
+            # 1. Guardar UN SOLO archivo en data/update con los registros nuevos o modificados
             try:
                 update_dir = os.path.join(current_dir, "../../data/update")
                 if not os.path.exists(update_dir):
@@ -391,17 +517,22 @@ if __name__ == "__main__":
                 filename = f"update_batch_{timestamp}.json"
                 filepath = os.path.join(update_dir, filename)
                 
-                with open(filepath, "w", encoding="utf-8") as f:
-                    json.dump(scraped_results, f, ensure_ascii=False, indent=2)
-                
-                print(f"Resultados guardados en {filepath}", file=sys.stderr)
+                if changed_results:
+                    with open(filepath, "w", encoding="utf-8") as f:
+                        json.dump(changed_results, f, ensure_ascii=False, indent=2)
+                    print(f"Resultados guardados en {filepath}", file=sys.stderr)
             except Exception as e:
                 print(f"Error guardando archivo temporal: {e}", file=sys.stderr)
 
             # 2. Imprimir el JSON final en stdout para que server.js lo consuma
             print(json.dumps(scraped_results, ensure_ascii=False))
+            sys.stdout.flush()
         else:
             print("[]") # Retornar array vacío si no hubo resultados
+
+        # 3. Confirmar las huellas solo cuando la salida se ha entregado
+        fingerprints.commit()
+        fingerprints.save()
     else:
         print("Error: No se proporcionó una URL o archivo de URLs.", file=sys.stderr)
         sys.exit(1)
@@ -50,6 +50,7 @@ const fs = require('fs');
 const sqliteManager = require('./db/sqlite-manager');
 const whatsappScripts = require('./templates/whatsappScripts');
 const emailService = require('./services/emailService');
+const scraperDaemon = require('./services/scraperDaemon');
 const { spawn, exec, execSync } = require('child_process');
 
 // DEBUG: Loguear inicio
@@ -1599,6 +1600,23 @@ app.get('/api/stats', (req, res) => {
     }
 });
 
+// Convierte un segmento NDJSON de los scrapers a la estructura { source, property_type, scrape_date, properties }
+const parseNdjson = (content) => {
+    const data = { properties: [] };
+    for (const line of content.split('\n')) {
+        if (!line.trim()) continue;
+        const item = JSON.parse(line);
+        if (item._manifest) {
+            data.source = item.source;
+            data.property_type = item.property_type;
+            data.scrape_date = item.scrape_date;
+        } else {
+            data.properties.push(item);
+        }
+    }
+    return data;
+};
+
 // Función para procesar un archivo JSON de propiedades de forma segura (evitando condiciones de carrera)
 const processJsonFile = (filePath) => {
     const fileName = path.basename(filePath);
@@ -1622,7 +1640,8 @@ const processJsonFile = (filePath) => {
             return { inserted: 0, updated: 0, error: 'Archivo vacío' };
         }
 
-        const data = JSON.parse(content);
+        // NDJSON: primera línea con el manifiesto (_manifest) y una propiedad por línea
+        const data = fileName.endsWith('.ndjson') ? parseNdjson(content) : JSON.parse(content);
 
         // Normalizar estructura
         let propertiesArray = [];
@@ -1683,7 +1702,7 @@ const consolidatePropertiesFolder = () => {
     if (!fs.existsSync(PROPERTIES_DIR)) return { inserted: 0, updated: 0, filesProcessed: 0 };
 
     const files = fs.readdirSync(PROPERTIES_DIR)
-        .filter(file => file.endsWith('.json') && (file.startsWith('fotocasa') || file.startsWith('idealista')));
+        .filter(file => (file.endsWith('.json') || file.endsWith('.ndjson')) && (file.startsWith('fotocasa') || file.startsWith('idealista')));
 
     let totalInserted = 0;
     let totalUpdated = 0;
@@ -1953,6 +1972,15 @@ app.post('/api/scraper/stop', async (req, res) => {
         return res.status(400).json({ error: 'Nombre del scraper requerido' });
     }
 
+    // Trabajos del servicio residente (no tienen proceso propio): se cancelan por JSON-RPC
+    if (!activeScrapers.has(name)) {
+        const cancelled = await scraperDaemon.cancelJobs(name);
+        if (cancelled.length > 0) {
+            console.log(`🛑 Cancelados ${cancelled.length} trabajos '${name}' del servicio de scraping`);
+            return res.json({ success: true, message: `Scraper ${name} detenido.`, cancelled });
+        }
+    }
+
     const processInfo = activeScrapers.get(name);
     if (processInfo && processInfo.process) {
         console.log(`🛑 Deteniendo scraper manual: ${name}`);
@@ -2088,6 +2116,74 @@ const UPDATE_SCRAPER = path.join(__dirname, 'scrapers/update_scraper.py');
 // ... (el resto de las constantes)
 
 const IDEALISTA_SCRAPER_SINGLE = path.join(__dirname, 'scrapers/idealista/run_idealista_single.py');
+const SCRAPER_DAEMON_SCRIPT = path.join(__dirname, 'scrapers/scraper_daemon.py');
+
+// Servicio residente de scraping (services/scraperDaemon.js): mantiene Python y los navegadores
+// abiertos entre trabajos. Si no está disponible se lanza un proceso por trabajo como antes.
+const ensureScraperDaemon = (pythonExecutable) => {
+    if (!scraperDaemon.isEnabled()) return false;
+    if (!scraperDaemon.isRunning()) {
+        scraperDaemon.configure({
+            pythonExecutable,
+            scriptPath: SCRAPER_DAEMON_SCRIPT,
+            env: { ...process.env, USER_DATA_PATH: BASE_PATH }
+        });
+    }
+    return true;
+};
+
+// Nombre de los trabajos de actualización en el servicio residente (se detienen con /api/scraper/stop { name: 'update' })
+const DAEMON_UPDATE_JOB = 'update';
+const DAEMON_JOB_CANCELLED = -32000;
+
+// Una URL de Idealista en el servicio residente. handled=false si hay que recurrir a run_idealista_single.py
+async function scrapeSingleViaDaemon(pythonExecutable, url) {
+    if (!ensureScraperDaemon(pythonExecutable)) return { handled: false };
+    try {
+        const result = await scraperDaemon.call('scrape_single', { url }, { name: DAEMON_UPDATE_JOB });
+        console.log(`   ⚡ [Daemon] ${url} en ${result.seconds}s`);
+        return { handled: true, data: result.data && !result.data.error ? result.data : null };
+    } catch (e) {
+        if (e.daemonUnavailable) {
+            console.warn(`⚠️ Servicio de scraping no disponible (${e.message}), usando proceso independiente`);
+            return { handled: false };
+        }
+        console.error(`❌ [Daemon] ${url}: ${e.message}`);
+        return { handled: true, data: null, cancelled: e.code === DAEMON_JOB_CANCELLED };
+    }
+}
+
+// Lote de update_scraper en el servicio residente. handled=false si hay que recurrir a update_scraper.py
+async function updateBatchViaDaemon(pythonExecutable, urls) {
+    if (!ensureScraperDaemon(pythonExecutable)) return { handled: false };
+    try {
+        const result = await scraperDaemon.call('update_batch', { urls }, {
+            name: DAEMON_UPDATE_JOB,
+            onNotification: (method, params) => {
+                if (method === 'job.progress') console.log(`   ⚡ [Daemon] ${params.done}/${params.total}: ${params.url}`);
+            }
+        });
+        return { handled: true, results: result.results || [], newClients: result.new_clients || 0 };
+    } catch (e) {
+        if (e.daemonUnavailable) {
+            console.warn(`⚠️ Servicio de scraping no disponible (${e.message}), usando proceso independiente`);
+            return { handled: false };
+        }
+        console.error(`❌ [Daemon] Lote de actualización: ${e.message}`);
+        return { handled: true, results: [], newClients: 0 };
+    }
+}
+
+// Los anuncios sin cambios llegan de update_scraper como { url, Unchanged: true }: solo se marca
+// la revisión (last_updated) y se excluyen del upsert y de los archivos. Retorna el resto.
+function applyUnchangedUpdates(updatedProperties) {
+    const unchangedUrls = updatedProperties.filter(p => p && p.Unchanged).map(p => p.url);
+    if (unchangedUrls.length > 0) {
+        const touched = sqliteManager.touchProperties(unchangedUrls);
+        console.log(`   ⏸️ ${unchangedUrls.length} propiedades sin cambios (${touched} revisiones registradas)`);
+    }
+    return updatedProperties.filter(p => p && !p.Unchanged);
+}
 
 // Función helper para procesar actualizaciones de propiedades
 async function processPropertyUpdates(urls) {
@@ -2102,12 +2198,23 @@ async function processPropertyUpdates(urls) {
     const pythonExecutable = getPythonExecutable();
     let updatedProperties = [];
     let combinedErrorData = '';
+    let daemonNewClients = 0;
+    let updateCancelled = false; // detenida desde /api/scraper/stop
 
     try {
         // --- 1. PROCESAR IDEALISTA (Uno a uno) ---
         if (idealistaUrls.length > 0) {
             console.log(`🔎 Procesando ${idealistaUrls.length} propiedades de Idealista...`);
             for (const url of idealistaUrls) {
+                const viaDaemon = await scrapeSingleViaDaemon(pythonExecutable, url);
+                if (viaDaemon.cancelled) {
+                    updateCancelled = true;
+                    break;
+                }
+                if (viaDaemon.handled) {
+                    if (viaDaemon.data) updatedProperties.push(viaDaemon.data);
+                    continue;
+                }
                 try {
                     const result = await new Promise((resolve) => {
                         const proc = spawn(pythonExecutable, [IDEALISTA_SCRAPER_SINGLE, url], {
@@ -2155,7 +2262,13 @@ async function processPropertyUpdates(urls) {
         }
 
         // --- 2. PROCESAR OTROS (Fotocasa - Batch) ---
-        if (otherUrls.length > 0) {
+        const daemonBatch = otherUrls.length > 0 && !updateCancelled ? await updateBatchViaDaemon(pythonExecutable, otherUrls) : null;
+        if (updateCancelled) {
+            console.log('🛑 Actualización detenida: no se procesan las URLs de Fotocasa/Otros');
+        } else if (daemonBatch && daemonBatch.handled) {
+            updatedProperties = [...updatedProperties, ...daemonBatch.results];
+            daemonNewClients += daemonBatch.newClients;
+        } else if (otherUrls.length > 0) {
             console.log(`🔎 Procesando ${otherUrls.length} propiedades de Fotocasa/Otros...`);
             
             // Crear archivo temporal
@@ -2206,11 +2319,14 @@ async function processPropertyUpdates(urls) {
             });
         }
 
+        const checkedCount = updatedProperties.length;
+        updatedProperties = applyUnchangedUpdates(updatedProperties);
+
         if (updatedProperties.length === 0) {
              if (combinedErrorData) {
                  console.warn("⚠️ No se obtuvieron propiedades, pero hubo logs:", combinedErrorData.substring(0, 200));
              }
-             return { success: true, updatedCount: 0, message: "No se obtuvieron datos actualizados.", newClientsCount: 0 };
+             return { success: true, updatedCount: 0, message: checkedCount > 0 ? "Sin cambios en las propiedades revisadas." : "No se obtuvieron datos actualizados.", newClientsCount: 0, totalProcessed: checkedCount };
         }
 
         console.log(`💾 Guardando ${updatedProperties.length} propiedades actualizadas en SQLite...`);
@@ -2280,6 +2396,7 @@ async function processPropertyUpdates(urls) {
             const newClientMatches = combinedErrorData.match(/Nuevo cliente añadido/g);
             if (newClientMatches) newClientsCount = newClientMatches.length;
         } catch (e) {}
+        newClientsCount += daemonNewClients;
 
         // Usamos updatedProperties.length como la cuenta real de éxito (propiedades scrapeadas y guardadas en DB)
         const totalProcessed = updatedProperties.length;
@@ -2309,12 +2426,23 @@ app.post('/api/properties/update', async (req, res) => {
     const pythonExecutable = getPythonExecutable();
     let updatedProperties = [];
     let combinedErrorData = '';
+    let daemonNewClients = 0;
+    let updateCancelled = false; // detenida desde /api/scraper/stop
 
     try {
         // --- 1. PROCESAR IDEALISTA (Uno a uno) ---
         if (idealistaUrls.length > 0) {
             console.log(`� Procesando ${idealistaUrls.length} propiedades de Idealista...`);
             for (const url of idealistaUrls) {
+                const viaDaemon = await scrapeSingleViaDaemon(pythonExecutable, url);
+                if (viaDaemon.cancelled) {
+                    updateCancelled = true;
+                    break;
+                }
+                if (viaDaemon.handled) {
+                    if (viaDaemon.data) updatedProperties.push(viaDaemon.data);
+                    continue;
+                }
                 try {
                     const result = await new Promise((resolve) => {
                         const proc = spawn(pythonExecutable, [IDEALISTA_SCRAPER_SINGLE, url], {
@@ -2364,7 +2492,13 @@ app.post('/api/properties/update', async (req, res) => {
         }
 
         // --- 2. PROCESAR OTROS (Fotocasa - Batch) ---
-        if (otherUrls.length > 0) {
+        const daemonBatch = otherUrls.length > 0 && !updateCancelled ? await updateBatchViaDaemon(pythonExecutable, otherUrls) : null;
+        if (updateCancelled) {
+            console.log('🛑 Actualización detenida: no se procesan las URLs de Fotocasa/Otros');
+        } else if (daemonBatch && daemonBatch.handled) {
+            updatedProperties = [...updatedProperties, ...daemonBatch.results];
+            daemonNewClients += daemonBatch.newClients;
+        } else if (otherUrls.length > 0) {
             console.log(`🔎 Procesando ${otherUrls.length} propiedades de Fotocasa/Otros...`);
             
             // Crear archivo temporal
@@ -2417,13 +2551,16 @@ app.post('/api/properties/update', async (req, res) => {
             });
         }
 
+        const checkedCount = updatedProperties.length;
+        updatedProperties = applyUnchangedUpdates(updatedProperties);
+
         if (updatedProperties.length === 0) {
              // Si falló todo, devolver error o mensaje vacío
              if (combinedErrorData) {
                  // Si hubo error data y no hay propiedades, quizás falló todo
                  console.warn("⚠️ No se obtuvieron propiedades, pero hubo logs:", combinedErrorData.substring(0, 200));
              }
-             return res.json({ success: true, updatedCount: 0, message: "No se obtuvieron datos actualizados.", newClientsCount: 0 });
+             return res.json({ success: true, updatedCount: 0, message: checkedCount > 0 ? "Sin cambios en las propiedades revisadas." : "No se obtuvieron datos actualizados.", newClientsCount: 0 });
         }
 
         // 3. Actualizar Base de Datos SQLite (CRÍTICO: La fuente de verdad)
@@ -2511,6 +2648,7 @@ app.post('/api/properties/update', async (req, res) => {
             const newClientMatches = combinedErrorData.match(/Nuevo cliente añadido/g);
             if (newClientMatches) newClientsCount = newClientMatches.length;
         } catch (e) {}
+        newClientsCount += daemonNewClients;
 
         // Usamos updatedProperties.length como la cuenta real de éxito (propiedades scrapeadas y guardadas en DB)
         // Fallback a dbStats si por alguna razón updatedProperties estuviera vacío pero dbStats no (raro)
@@ -2677,6 +2815,30 @@ app.post('/api/clients/batch', (req, res) => {
     }
 });
 
+// Alta masiva de clientes nuevos (scrapers): los teléfonos ya existentes se omiten
+// para no sobrescribir el estado ni las notas del CRM
+app.post('/api/clients/batch-insert', (req, res) => {
+    try {
+        const newClients = req.body;
+
+        if (!Array.isArray(newClients)) {
+            return res.status(400).json({ error: 'El cuerpo debe ser un array de clientes' });
+        }
+
+        const result = sqliteManager.bulkInsertNewClients(newClients);
+
+        res.json({
+            success: true,
+            count: result.added,
+            skippedCount: result.skipped,
+            message: `Alta: ${result.added} nuevos, ${result.skipped} ya existentes.`
+        });
+    } catch (error) {
+        console.error('Error dando de alta clientes:', error);
+        res.status(500).json({ error: 'Error dando de alta clientes' });
+    }
+});
+
 // Actualizar un cliente
 app.put('/api/clients/:id', (req, res) => {
     try {
@@ -3170,46 +3332,46 @@ const runAutoScrapers = async () => {
     // Usar la función centralizada para obtener el ejecutable de Python
     let pythonExecutable = getPythonExecutable();
 
+    // Un único proceso ejecuta los tres tipos en paralelo (pool de navegadores
+    // y limitador por dominio compartidos); cada tipo sigue generando su propio archivo
     const types = ['viviendas', 'terrenos', 'locales'];
-    for (const type of types) {
-        const scraperScript = `run_${type}_auto.py`;
-        const scraperPath = path.join(__dirname, `scrapers/fotocasa/${scraperScript}`);
-        if (fs.existsSync(scraperPath)) {
-            console.log(`   ▶ Running ${scraperScript}...`);
-            // We use a promise wrapper around spawn to await completion
-            await new Promise((resolve) => {
-                const spawnScraper = (execPath, isRetry = false) => {
-                    const child = spawn(execPath, [scraperPath], {
-                        env: {
-                            ...process.env,
-                            PROPERTIES_OUTPUT_DIR: PROPERTIES_DIR
-                        },
-                        shell: false
-                    });
+    const scraperPath = path.join(__dirname, 'scrapers/fotocasa/run_auto_scrapers.py');
+    if (fs.existsSync(scraperPath)) {
+        console.log(`   ▶ Running run_auto_scrapers.py (${types.join(', ')})...`);
+        // We use a promise wrapper around spawn to await completion
+        await new Promise((resolve) => {
+            const spawnScraper = (execPath, isRetry = false) => {
+                const child = spawn(execPath, [scraperPath, ...types], {
+                    env: {
+                        ...process.env,
+                        PROPERTIES_OUTPUT_DIR: PROPERTIES_DIR
+                    },
+                    shell: false
+                });
 
-                    child.on('error', (err) => {
-                        console.error(`[${type}] Error spawn:`, err);
-                        // Fallback strategy for macOS architecture mismatch (Error -86) or missing binary
-                        if (!isRetry && (err.message.includes('-86') || err.code === 'BAD_CPU_TYPE' || err.code === 'ENOENT')) {
-                            console.warn(`[${type}] ⚠️ Detectado error de binario/arquitectura. Reintentando con 'python3' del sistema...`);
-                            spawnScraper('python3', true);
-                        } else {
-                            resolve(); // Resolve anyway to continue with next scraper
-                        }
-                    });
+                child.on('error', (err) => {
+                    console.error('[auto] Error spawn:', err);
+                    // Fallback strategy for macOS architecture mismatch (Error -86) or missing binary
+                    if (!isRetry && (err.message.includes('-86') || err.code === 'BAD_CPU_TYPE' || err.code === 'ENOENT')) {
+                        console.warn("[auto] ⚠️ Detectado error de binario/arquitectura. Reintentando con 'python3' del sistema...");
+                        spawnScraper('python3', true);
+                    } else {
+                        resolve(); // Resolve anyway to continue with consolidation
+                    }
+                });
 
-                    child.stdout.on('data', (data) => console.log(`[${type}] ${data}`));
-                    child.stderr.on('data', (data) => console.error(`[${type} ERROR] ${data}`));
-                    
-                    child.on('close', (code) => {
-                        console.log(`[${type}] Finished with code ${code}`);
-                        resolve();
-                    });
-                };
+                // Las líneas ya llegan prefijadas con el tipo ([viviendas], [terrenos], ...)
+                child.stdout.on('data', (data) => console.log(`${data}`.trimEnd()));
+                child.stderr.on('data', (data) => console.error(`[auto ERROR] ${data}`));
 
-                spawnScraper(pythonExecutable);
-            }).catch(e => console.error(`[${type}] Unexpected promise error:`, e));
-        }
+                child.on('close', (code) => {
+                    console.log(`[auto] Finished with code ${code}`);
+                    resolve();
+                });
+            };
+
+            spawnScraper(pythonExecutable);
+        }).catch(e => console.error('[auto] Unexpected promise error:', e));
     }
     console.log("✅ Auto scrapers cycle completed.");
 
@@ -3251,11 +3413,104 @@ const setupAutoScraper = () => {
     } else {
         console.log("⏰ Auto scraper is disabled.");
     }
+
+    setupScheduledUpdate(config);
+};
+
+// Actualización planificada (update_scraper.py --schedule): el scraper elige el lote por antigüedad
+// y prioridad dentro de su presupuesto de tiempo. Se activa con `update: { enabled, interval, budgetSeconds }`
+// en scraper_config.json o a mano con POST /api/properties/update-scheduled.
+let scheduledUpdateInterval = null;
+let scheduledUpdateRunning = false;
+
+const runScheduledUpdate = async (budgetSeconds) => {
+    if (scheduledUpdateRunning) {
+        return { success: false, busy: true, error: 'Ya hay una actualización planificada en curso' };
+    }
+    scheduledUpdateRunning = true;
+    const scraperId = 'update_schedule';
+    console.log("🗓️ Ejecutando actualización planificada...");
+
+    try {
+        const args = ['--schedule'];
+        if (budgetSeconds) args.push(String(budgetSeconds));
+
+        const output = await new Promise((resolve) => {
+            const child = spawn(getPythonExecutable(), [UPDATE_SCRAPER, ...args], {
+                env: { ...process.env, PYTHONIOENCODING: 'utf-8', USER_DATA_PATH: BASE_PATH },
+                shell: false
+            });
+            // Registrado como los demás scrapers para poder detenerlo con /api/scraper/stop
+            activeScrapers.set(scraperId, { process: child, res: null });
+
+            let stdout = '';
+            child.stdout.on('data', (data) => stdout += data.toString());
+            child.stderr.on('data', (data) => {
+                const text = data.toString();
+                if (text.includes('Error') || text.includes('Procesando') || text.includes('Planificación')) {
+                    console.log(`      [Python] ${text.trim()}`);
+                }
+            });
+            child.on('error', (err) => {
+                console.error('❌ Error iniciando la actualización planificada:', err);
+                resolve(null);
+            });
+            child.on('close', (code) => {
+                activeScrapers.delete(scraperId);
+                if (code !== 0) console.error(`❌ Actualización planificada terminó con código ${code}`);
+                resolve(code === 0 ? stdout : null);
+            });
+        });
+
+        if (output === null) {
+            return { success: false, error: 'La actualización planificada no terminó correctamente' };
+        }
+
+        const jsonStartIndex = output.indexOf('[');
+        const jsonEndIndex = output.lastIndexOf(']');
+        const results = jsonStartIndex !== -1 && jsonEndIndex !== -1
+            ? JSON.parse(output.substring(jsonStartIndex, jsonEndIndex + 1))
+            : [];
+
+        const changed = applyUnchangedUpdates(results);
+        const dbStats = changed.length > 0 ? sqliteManager.bulkInsertProperties(changed) : { inserted: 0, updated: 0 };
+        console.log(`✅ Actualización planificada: ${results.length} revisadas, ${changed.length} con cambios (${dbStats.updated} actualizadas en SQLite)`);
+
+        return { success: true, checked: results.length, changed: changed.length, stats: dbStats };
+    } catch (error) {
+        console.error('❌ Error en la actualización planificada:', error);
+        return { success: false, error: error.message };
+    } finally {
+        scheduledUpdateRunning = false;
+    }
+};
+
+const setupScheduledUpdate = (config) => {
+    if (scheduledUpdateInterval) {
+        clearInterval(scheduledUpdateInterval);
+        scheduledUpdateInterval = null;
+    }
+
+    if (config.update && config.update.enabled) {
+        const minutes = parseInt(config.update.interval) || 60;
+        console.log(`🗓️ Actualización planificada cada ${minutes} minutos.`);
+
+        scheduledUpdateInterval = setInterval(() => {
+            runScheduledUpdate(config.update.budgetSeconds)
+                .catch(err => console.error('🔥 Error crítico en la actualización planificada:', err));
+        }, minutes * 60 * 1000);
+    }
 };
 
 // Initialize on startup
 setupAutoScraper();
 
+// Lanzar a mano una actualización planificada (body opcional: { budgetSeconds })
+app.post('/api/properties/update-scheduled', async (req, res) => {
+    const result = await runScheduledUpdate(req.body && req.body.budgetSeconds);
+    res.status(result.success ? 200 : result.busy ? 409 : 500).json(result);
+});
+
 // Routes
 app.get('/api/config/scraper', (req, res) => {
     res.json(loadScraperConfig());
@@ -3399,6 +3654,15 @@ setInterval(() => {
     }
 }, 30000);
 
+// Al detener el backend se detiene también el servicio residente de scraping (y sus navegadores)
+const shutdownBackend = async (signal) => {
+    console.log(`🛑 ${signal} recibido: cerrando servicio de scraping...`);
+    await scraperDaemon.stop();
+    process.exit(0);
+};
+process.once('SIGINT', () => shutdownBackend('SIGINT'));
+process.once('SIGTERM', () => shutdownBackend('SIGTERM'));
+
 // Iniciar servidor
 app.listen(PORT, () => {
     console.log(`🚀 Backend API corriendo en http://localhost:${PORT}`);
@@ -0,0 +1,204 @@
+const { spawn } = require('child_process');
+const readline = require('readline');
+
+// Cliente del servicio residente de scraping (scrapers/scraper_daemon.py).
+// Un único proceso Python atiende los trabajos por JSON-RPC sobre stdin/stdout,
+// manteniendo las importaciones y los navegadores abiertos entre peticiones.
+
+const READY_TIMEOUT_MS = 60000;
+const STOP_TIMEOUT_MS = 10000;
+
+let options = null;
+let proc = null;
+let readyPromise = null;
+let nextId = 1;
+const pending = new Map();
+
+function isEnabled() {
+    return process.env.SCRAPER_DAEMON !== '0';
+}
+
+function configure({ pythonExecutable, scriptPath, env }) {
+    options = { pythonExecutable, scriptPath, env };
+}
+
+function isRunning() {
+    return proc !== null;
+}
+
+function unavailable(message) {
+    const error = new Error(message);
+    error.daemonUnavailable = true;
+    return error;
+}
+
+function handleMessage(message, onReady) {
+    if (message.method === 'ready') {
+        onReady();
+        return;
+    }
+
+    // Respuesta a una petición
+    if (message.id !== undefined && message.id !== null && pending.has(message.id)) {
+        const request = pending.get(message.id);
+        pending.delete(message.id);
+        if (message.error) {
+            const error = new Error(message.error.message);
+            error.code = message.error.code;
+            request.reject(error);
+        } else {
+            request.resolve(message.result);
+        }
+        return;
+    }
+
+    // Notificación de progreso de un trabajo
+    const jobId = message.params && message.params.job;
+    if (message.method && pending.has(jobId)) {
+        const request = pending.get(jobId);
+        if (request.onNotification) request.onNotification(message.method, message.params);
+    }
+}
+
+function start() {
+    if (readyPromise) return readyPromise;
+    if (!options) return Promise.reject(unavailable('Servicio de scraping no configurado'));
+
+    console.log(`🛰️ Iniciando servicio residente de scraping: ${options.scriptPath}`);
+    const child = spawn(options.pythonExecutable, [options.scriptPath], {
+        env: { ...options.env, PYTHONIOENCODING: 'utf-8' },
+        shell: false
+    });
+    proc = child;
+    // Si el backend termina, cerrar stdin hace que el servicio cierre sus navegadores y salga
+    process.once('exit', () => {
+        try { child.stdin.end(); } catch (e) { }
+    });
+
+    readyPromise = new Promise((resolve, reject) => {
+        const timer = setTimeout(() => {
+            reject(unavailable('El servicio de scraping no respondió a tiempo'));
+            child.kill();
+        }, READY_TIMEOUT_MS);
+        const onReady = () => {
+            clearTimeout(timer);
+            console.log(`✅ Servicio de scraping listo (pid ${child.pid})`);
+            resolve();
+        };
+
+        readline.createInterface({ input: child.stdout }).on('line', (line) => {
+            if (!line.trim()) return;
+            try {
+                handleMessage(JSON.parse(line), onReady);
+            } catch (e) {
+                console.warn(`⚠️ Mensaje no válido del servicio de scraping: ${line.substring(0, 200)}`);
+            }
+        });
+
+        child.stderr.on('data', (data) => {
+            const text = data.toString();
+            for (const request of pending.values()) {
+                if (request.onLog) request.onLog(text);
+            }
+            if (text.includes('Error') || text.includes('Procesando') || text.includes('Trabajo')) {
+                console.log(`      [Python] ${text.trim()}`);
+            }
+        });
+
+        const onGone = (reason) => {
+            clearTimeout(timer);
+            if (proc === child) {
+                proc = null;
+                readyPromise = null;
+            }
+            reject(unavailable(reason));
+            for (const [id, request] of pending) {
+                request.reject(unavailable(reason));
+                pending.delete(id);
+            }
+        };
+        child.on('error', (err) => onGone(`No se pudo iniciar el servicio de scraping: ${err.message}`));
+        child.on('exit', (code) => {
+            console.warn(`⚠️ Servicio de scraping terminado (código ${code})`);
+            onGone(`Servicio de scraping terminado (código ${code})`);
+        });
+    });
+
+    return readyPromise;
+}
+
+/**
+ * Envía una petición al servicio y espera su respuesta.
+ * `onNotification(method, params)` recibe el progreso del trabajo y `onLog(text)` sus logs.
+ * Los errores con `daemonUnavailable` indican que el servicio no está disponible
+ * (el llamador puede recurrir a lanzar el script directamente).
+ */
+async function call(method, params = {}, { onNotification, onLog, name } = {}) {
+    await start();
+    if (!proc) throw unavailable('Servicio de scraping no disponible');
+
+    const id = nextId++;
+    return new Promise((resolve, reject) => {
+        pending.set(id, { method, name, resolve, reject, onNotification, onLog });
+        proc.stdin.write(JSON.stringify({ jsonrpc: '2.0', id, method, params }) + '\n');
+    });
+}
+
+function cancel(jobId) {
+    return call('cancel', { job: jobId });
+}
+
+/**
+ * Cancela los trabajos en curso con ese `name` (el que se pasó a call) o todos si no se indica.
+ * Retorna los ids cancelados.
+ */
+async function cancelJobs(name) {
+    if (!proc) return [];
+    const ids = [...pending.entries()]
+        .filter(([, request]) => request.name && (!name || request.name === name))
+        .map(([id]) => id);
+    const cancelled = [];
+    for (const id of ids) {
+        try {
+            await cancel(id);
+            cancelled.push(id);
+        } catch (e) {
+            console.warn(`⚠️ No se pudo cancelar el trabajo ${id}: ${e.message}`);
+        }
+    }
+    return cancelled;
+}
+
+/**
+ * Pide al servicio que se detenga (cierra sus navegadores) y espera a que salga;
+ * si no lo hace en STOP_TIMEOUT_MS se mata el proceso.
+ */
+function stop() {
+    if (!proc) return Promise.resolve();
+    const child = proc;
+    return new Promise((resolve) => {
+        const timer = setTimeout(() => {
+            console.warn('⚠️ El servicio de scraping no se detuvo a tiempo, forzando cierre');
+            try { child.kill(); } catch (e) { }
+            resolve();
+        }, STOP_TIMEOUT_MS);
+        child.once('exit', () => {
+            clearTimeout(timer);
+            resolve();
+        });
+        try {
+            child.stdin.write(JSON.stringify({ jsonrpc: '2.0', id: nextId++, method: 'shutdown' }) + '\n');
+            child.stdin.end();
+        } catch (e) { }
+    });
+}
+
+module.exports = {
+    isEnabled,
+    isRunning,
+    configure,
+    call,
+    cancel,
+    cancelJobs,
+    stop
+};
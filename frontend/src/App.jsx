@@ -1595,6 +1595,27 @@ function App() {
     }
   };
 
+  // Cancela la actualización en curso (trabajos 'update' del servicio de scraping)
+  const stopUpdate = async () => {
+    try {
+      const response = await fetch(`${API_URL}/scraper/stop`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ name: 'update' })
+      });
+      const data = await response.json();
+
+      if (data.success) {
+        setUpdateLog(prev => [...prev, '\n🛑 Actualización detenida.']);
+      } else {
+        showNotification('Error al detener la actualización: ' + data.error, 'error');
+      }
+    } catch (error) {
+      console.error('Error stopping update:', error);
+      showNotification('Error de conexión al detener la actualización.', 'error');
+    }
+  };
+
   const viewHistory = (client) => {
     setViewingClientHistory(client);
     setHistoryModalOpen(true);
@@ -1917,6 +1938,11 @@ function App() {
                     <button onClick={updateProperties} className="update-btn" disabled={updatingProperties || selectedProperties.length === 0}>
                       {updatingProperties ? 'Actualizando...' : 'Actualizar'}
                     </button>
+                    {updatingProperties && (
+                      <button onClick={stopUpdate} className="clear-selection">
+                        Detener
+                      </button>
+                    )}
                     {selectedProperties.length > 0 && (
                       <button onClick={() => setSelectedProperties([])} className="clear-selection">
                         Limpiar selección